@@ -39,10 +39,14 @@ setup(
     entry_points={
         'console_scripts': [
             'zato-deploy = zatodeploy.main:main',
+            'zato-adviseoutgoings = zatodeploy.adviseoutgoings:main',
+            'zato-benchchannels = zatodeploy.benchchannels:main',
             'zato-deleteservices = zatodeploy.deleteservices:main',
             'zato-createchannels = zatodeploy.createchannels:main',
             'zato-createoutgoings = zatodeploy.createoutgoings:main',
             'zato-createsecdefs = zatodeploy.createsecdefs:main',
+            'zato-exportobjects = zatodeploy.exportobjects:main',
+            'zato-pruneobjects = zatodeploy.pruneobjects:main',
             'zato-setpassword = zatodeploy.setpassword:main',
             'zato-storesettings = zatodeploy.storesettings:main',
             'zato-uploadmodules = zatodeploy.uploadmodules:main'
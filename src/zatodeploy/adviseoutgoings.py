@@ -0,0 +1,346 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/adviseoutgoings.py
+#
+"""Command line script to recommend pool sizes and timeouts of outgoings.
+
+Reads configuration file ``outgoings.conf`` by default.
+
+Each outgoing of the deployment targets is probed by sending requests with
+its ``ping_method`` to ``host`` + ``url_path``. The measured latency and the
+request rate the outgoing is expected to handle, given by the
+``expected_rate`` option (requests per second) in its definition, yield the
+recommended values by Little's law: the pool must hold as many connections
+as requests are in flight on average, i.e. rate times latency. The 95th
+percentile of the latency multiplied by ``--headroom`` is used for the pool
+size, the 99th percentile multiplied by ``--timeout-factor`` for the timeout.
+
+Without ``--apply`` the recommendations are only shown; with it, outgoings
+existing in the cluster are updated with the recommended values and the
+``pool_size`` and ``timeout`` options in the outgoing definitions file are
+changed accordingly (keeping comments and the layout of the file), so the next
+deployment does not revert them. An outgoing used by several targets is set to
+the largest pool size and timeout recommended for any of them. Outgoings
+defined in files included by the definitions file are not changed, but
+reported.
+
+Run ``zato-adviseoutgoings -h`` for usage help.
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import io
+import logging
+import math
+import os
+import re
+import sys
+
+from os.path import exists
+
+from bunch import Bunch
+
+# do not use relative import here, because this module should be executable
+# as a command line script
+from zatodeploy.common import get_http_soap_inventory, read_ini_config
+from zatodeploy.createoutgoings import create_or_update_outgoing
+from zatodeploy.executor import get_concurrency, run_concurrently
+
+
+log = logging.getLogger(__name__)
+
+DEFAULT_POOL_SIZE = 200
+DEFAULT_TIMEOUT = 10
+MIN_TIMEOUT = 1
+
+SECTION_RX = re.compile(r'\s*\[([^\]]+)\]')
+OPTION_RX = re.compile(r'([^:=\s;#][^:=]*?)\s*[:=]')
+
+
+def probe_outgoing(outgoing, count=10, timeout=None):
+    """Send count ping requests to outgoing and return ProbeResult."""
+    # requests is only needed when outgoings are actually probed
+    import requests
+
+    from zatodeploy.probe import ProbeResult, request_channel
+
+    url = outgoing.host.rstrip('/') + outgoing.url_path
+    result = ProbeResult(outgoing.name, url)
+    method = outgoing.get('ping_method') or 'HEAD'
+    timeout = timeout or float(outgoing.get('timeout') or DEFAULT_TIMEOUT)
+    session = requests.Session()
+
+    try:
+        for _ in range(count):
+            result.add(request_channel(session, url, method, timeout=timeout))
+    finally:
+        session.close()
+
+    log.debug("Probed outgoing %s", result)
+    return result
+
+
+def recommend(result, expected_rate=None, headroom=1.5, timeout_factor=4.0):
+    """Return recommended (pool_size, timeout) for probe result.
+
+    The pool size is None if expected_rate is not given. Returns None if no
+    probe request succeeded.
+
+    """
+    p95, p99 = result.percentile(95), result.percentile(99)
+    if p95 is None:
+        return None
+
+    pool_size = None
+    if expected_rate:
+        pool_size = max(1, int(math.ceil(expected_rate * p95 * headroom)))
+
+    timeout = max(MIN_TIMEOUT, int(math.ceil(p99 * timeout_factor)))
+    return pool_size, timeout
+
+
+def update_definitions(filename, updates):
+    """Set options of sections in an INI definitions file in place.
+
+    updates maps section names to dictionaries of option values. Existing
+    option lines are replaced, missing options are added at the end of their
+    section. All other lines, including comments, are kept as they are.
+
+    Returns the sorted list of the names of updated sections not found in
+    the file (e.g. because they are defined in an included file).
+
+    """
+    with io.open(filename, encoding='utf-8') as fp:
+        lines = fp.read().splitlines()
+
+    result = []
+    found = set()
+    pending = {}
+
+    def flush():
+        # insert options not found in section before trailing blank lines
+        pos = len(result)
+        while pos > 0 and not result[pos - 1].strip():
+            pos -= 1
+        result[pos:pos] = ['%s: %s' % item for item in sorted(pending.items())]
+        pending.clear()
+
+    for line in lines:
+        match = SECTION_RX.match(line)
+        if match:
+            flush()
+            section = match.group(1).strip()
+            if section in updates:
+                found.add(section)
+                pending.update(updates[section])
+        else:
+            match = OPTION_RX.match(line)
+            if match and match.group(1) in pending:
+                line = '%s: %s' % (match.group(1),
+                                   pending.pop(match.group(1)))
+        result.append(line)
+
+    flush()
+    tmpname = filename + '.tmp'
+    with open(tmpname, 'wb') as fp:
+        fp.write(('\n'.join(result) + '\n').encode('utf-8'))
+    os.rename(tmpname, filename)
+    return sorted(set(updates) - found)
+
+
+def get_target_outgoings(config, target, outgoings):
+    """Return (idents of the outgoings of target, error message or None)."""
+    if target not in config:
+        msg = ("Deployment target '{}' not defined in deployment "
+               "configuration.".format(target))
+        return [], msg
+
+    idents = [og.strip() for og in config[target].get('outgoings', '')
+              .split(',') if og.strip()]
+
+    if idents == ['*']:
+        idents = list(outgoings.keys())
+
+    for ident in idents:
+        if not outgoings.get(ident):
+            msg = ("Outgoing '{}' for target '{}' not found "
+                   "in outgoing definitions".format(ident, target))
+            return idents, msg
+
+    return idents, None
+
+
+def advise_target(config, outgoings, idents, args):
+    """Probe outgoings of a target, print and return recommendations.
+
+    Returns a dictionary mapping the idents of the outgoings with a
+    recommendation to (pool size, timeout) tuples.
+
+    """
+    results = run_concurrently(
+        lambda ident: probe_outgoing(outgoings[ident], args.probe_count),
+        idents, get_concurrency(config))
+    recommendations = {}
+    fmt = "  {:<40} {:>9} {:>8} {:>10} {:>10}"
+    print(fmt.format("Outgoing", "p95 [s]", "Errors", "Pool size", "Timeout"))
+
+    for ident, result in zip(idents, results):
+        outgoing = outgoings[ident]
+        expected_rate = float(outgoing.get('expected_rate') or 0) or None
+        rec = recommend(result, expected_rate, args.headroom,
+                        args.timeout_factor)
+        pool_size = outgoing.get('pool_size') or DEFAULT_POOL_SIZE
+        timeout = outgoing.get('timeout') or DEFAULT_TIMEOUT
+
+        if rec is None:
+            log.warning("No successful request to outgoing '%s' at %s. "
+                        "No recommendation possible.", outgoing.name,
+                        result.url)
+            continue
+
+        recommendations[ident] = (rec[0] or int(pool_size), rec[1])
+        print(fmt.format(outgoing.name[:40], '%.3f' % result.percentile(95),
+                         '%.1f%%' % (result.error_rate * 100),
+                         '%s -> %s' % (pool_size, recommendations[ident][0]),
+                         '%s -> %s' % (timeout, rec[1])))
+
+    return recommendations
+
+
+def merge_recommendations(updates, recommendations):
+    """Merge recommendations of a target into updates of all targets.
+
+    An outgoing used by several targets gets the largest recommended pool
+    size and timeout of all of them.
+
+    """
+    for ident, (pool_size, timeout) in recommendations.items():
+        update = updates.setdefault(ident, dict(pool_size=pool_size,
+                                                timeout=timeout))
+        update['pool_size'] = max(update['pool_size'], pool_size)
+        update['timeout'] = max(update['timeout'], timeout)
+
+
+def apply_updates(config, outgoings, updates):
+    """Update outgoings in the cluster of a target and return their idents.
+
+    Outgoings which do not exist in the cluster are skipped.
+
+    """
+    existing = get_http_soap_inventory(config, ('outgoing',))['outgoing']
+    applied = []
+
+    for ident, update in sorted(updates.items()):
+        outgoing = outgoings[ident]
+        if outgoing.name not in existing:
+            log.warning("Outgoing '%s' does not exist in cluster. "
+                        "Not updating it.", outgoing.name)
+            continue
+
+        create_or_update_outgoing(config, Bunch(outgoing, **update),
+                                  update=existing[outgoing.name].id)
+        applied.append(ident)
+
+    return applied
+
+
+def main(args=None):
+    """Main script entry point function.
+
+    Parses command line arguments and configuration file and loops through
+    the deployment targets, probing their outgoings and recommending (and
+    optionally applying) pool sizes and timeouts.
+
+    """
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-v', '--verbose', action="store_true",
+        help="Enable verbose output")
+    ap.add_argument('-c', '--config', default="deploy.conf",
+        help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('--outgoings', default="outgoings.conf",
+        help="Outgoing definition file (default: %(default)s)")
+    ap.add_argument('--probe-count', type=int, default=20,
+        help="Number of requests sent to each outgoing (default: "
+             "%(default)s)")
+    ap.add_argument('--headroom', type=float, default=1.5,
+        help="Factor applied to the pool size computed from expected rate "
+             "and latency (default: %(default)s)")
+    ap.add_argument('--timeout-factor', type=float, default=4.0,
+        help="Factor applied to the 99th percentile of the latency to get "
+             "the timeout (default: %(default)s)")
+    ap.add_argument('--apply', action="store_true",
+        help="Update outgoings in the cluster and the outgoing definitions "
+             "file with the recommended values")
+    ap.add_argument('targets', nargs="*",
+        help="Deployment targets (default: all)")
+
+    args = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    if args.verbose:
+        loglevel = logging.DEBUG
+    else:
+        loglevel = logging.INFO
+
+    logging.basicConfig(level=loglevel)
+
+    config = read_ini_config(args.config)
+    log.debug("Deployment configuration:\n%s", config)
+    if exists(args.outgoings):
+        outgoings = read_ini_config(args.outgoings)
+        log.debug("Outgoing definitions:\n%s", outgoings)
+    else:
+        log.warning("Outgoing definitions file '%s' not found. Nothing to do.",
+            args.outgoings)
+        return 0
+
+    targets = (args.targets if args.targets
+               else [k for k in config if k != 'zato'])
+    log.debug("Deployment targets: %s", ", ".join(targets))
+
+    if not targets:
+        msg = "No deployment targets defined in deployment configuration."
+        log.error(msg)
+        return msg
+
+    updates = {}
+    target_idents = []
+
+    for target in targets:
+        idents, msg = get_target_outgoings(config, target, outgoings)
+        if msg:
+            log.error(msg)
+            return msg
+
+        print("Target '{}':".format(target))
+        recommendations = advise_target(config[target], outgoings, idents,
+                                        args)
+        merge_recommendations(updates, recommendations)
+        target_idents.append((target, recommendations))
+
+    if not args.apply:
+        return
+
+    # apply the values merged for all targets to each of them
+    applied = set()
+    for target, idents in target_idents:
+        applied.update(apply_updates(config[target], outgoings,
+                       dict((ident, updates[ident]) for ident in idents)))
+
+    if applied:
+        not_found = update_definitions(args.outgoings,
+            dict((ident, updates[ident]) for ident in applied))
+        log.info("Updated %i outgoing(s) in '%s'.",
+                 len(applied) - len(not_found), args.outgoings)
+        if not_found:
+            log.warning("Outgoing(s) not defined in '%s' itself (e.g. in an "
+                        "included file), please update them manually: %s",
+                        args.outgoings, ", ".join(
+                            "%s (%s)" % (ident, updates[ident])
+                            for ident in not_found))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
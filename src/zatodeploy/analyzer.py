@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/analyzer.py
+#
+"""Static analysis of Zato service modules.
+
+Determines the names of the services a module will register when it is
+hot-deployed, without importing or executing it. A class is considered a
+service if it derives from ``zato.server.service.Service`` or from another
+service class defined earlier in the same module. The service name is taken
+from a string literal ``name`` class attribute or a ``get_name`` method
+returning a string literal. Otherwise the name Zato derives from the module
+and class name is used.
+
+Results are cached by module name and SHA-1 hash of the module source, in
+memory and, if a cache directory is given, on disk.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import ast
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+
+from os.path import basename, exists, join, splitext
+
+
+__all__ = (
+    'ServiceAnalyzer',
+    'default_service_name',
+    'find_service_names'
+)
+
+log = logging.getLogger(__name__)
+
+SERVICE_BASE = 'zato.server.service.Service'
+CACHE_FILENAME = 'service-names.json'
+
+# same as zato.common.util.uncamelify
+_uncamelify_re = re.compile(r'((?<=[a-z])[A-Z]|(?<!\A)[A-Z](?=[a-z]))')
+
+
+def default_service_name(module_name, class_name):
+    """Return the service name Zato derives from module and class name.
+
+    This mirrors ``zato.server.service.Service.convert_impl_name``.
+
+    """
+    impl_name = '%s.%s' % (module_name, class_name)
+    split = _uncamelify_re.sub(r'-\1', impl_name).lower().split('.')
+    path, class_name = split[:-1], split[-1]
+    path = [elem.replace('_', '-') for elem in path]
+    class_name = class_name[1:] if class_name.startswith('-') else class_name
+    class_name = class_name.replace('.-', '.').replace('_-', '_')
+    return '%s.%s' % ('.'.join(path), class_name)
+
+
+def _string_literal(node):
+    """Return value of a string literal AST node or None."""
+    if isinstance(node, getattr(ast, 'Str', ())):
+        return node.s
+    if (isinstance(node, getattr(ast, 'Constant', ())) and
+            isinstance(node.value, type(''))):
+        return node.value
+
+
+def _dotted_name(node):
+    """Return dotted name of a Name/Attribute AST node or None."""
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        base = _dotted_name(node.value)
+        return base and '%s.%s' % (base, node.attr)
+
+
+def _explicit_name(classdef):
+    """Return service name set in class body, False if none, None if unknown.
+
+    Unknown means the name is set, but not as a string literal.
+
+    """
+    for stmt in classdef.body:
+        if isinstance(stmt, ast.Assign):
+            targets = [_dotted_name(target) for target in stmt.targets]
+            if 'name' in targets:
+                return _string_literal(stmt.value)
+        elif isinstance(stmt, ast.FunctionDef) and stmt.name == 'get_name':
+            returns = [node for node in ast.walk(stmt)
+                       if isinstance(node, ast.Return)]
+            if len(returns) == 1 and returns[0].value is not None:
+                return _string_literal(returns[0].value)
+            return None
+
+    return False
+
+
+def _import_aliases(tree):
+    """Return mapping of local names bound by imports to the imported names."""
+    aliases = {}
+
+    for node in tree.body:
+        if isinstance(node, ast.ImportFrom) and node.module:
+            for alias in node.names:
+                aliases[alias.asname or alias.name] = '%s.%s' % (
+                    node.module, alias.name)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                if alias.asname:
+                    aliases[alias.asname] = alias.name
+
+    return aliases
+
+
+def _resolve(name, aliases):
+    """Return dotted name with its first component replaced by its import."""
+    head, sep, tail = name.partition('.')
+    if head in aliases:
+        return aliases[head] + sep + tail
+    return name
+
+
+def find_service_names(source, module_name, filename='<unknown>'):
+    """Return list of names of services defined in module source code.
+
+    Names which can not be determined statically are returned as None.
+
+    """
+    tree = ast.parse(source, filename)
+    # local names bound to the Zato service base class or modules on its path
+    aliases = _import_aliases(tree)
+
+    # explicit service name (or None if unknown) by service class name
+    services = {}
+    names = []
+
+    for node in tree.body:
+        if not isinstance(node, ast.ClassDef):
+            continue
+
+        bases = [_dotted_name(base) for base in node.bases]
+        service_bases = [base for base in bases if base and
+                         (base in services or
+                          _resolve(base, aliases) == SERVICE_BASE)]
+        if not service_bases:
+            continue
+
+        name = _explicit_name(node)
+        if name is False:
+            # inherit explicit name of service base class from this module
+            name = next((services[base] for base in service_bases
+                         if services.get(base)), False)
+
+        services[node.name] = name or None
+
+        if name is False:
+            name = default_service_name(module_name, node.name)
+        elif name is None:
+            log.warning("Name of service class '%s' in '%s' can not be "
+                        "determined statically.", node.name, filename)
+
+        names.append(name)
+
+    return names
+
+
+class ServiceAnalyzer(object):
+    """Predicts service names of module files with caching by file hash."""
+
+    def __init__(self, cache_dir=None):
+        """Set up analyzer, persisting results in cache_dir if given."""
+        self.cache_dir = cache_dir and os.path.expanduser(cache_dir)
+        self._lock = threading.Lock()
+        self._cache = {}
+
+        if self.cache_dir and exists(join(self.cache_dir, CACHE_FILENAME)):
+            try:
+                with open(join(self.cache_dir, CACHE_FILENAME)) as fp:
+                    self._cache = json.load(fp)
+            except (IOError, OSError, ValueError) as exc:
+                log.warning("Ignoring unreadable service name cache: %s", exc)
+
+        self._dirty = False
+
+    def get_service_names(self, filename):
+        """Return names of services defined in module file.
+
+        Returns None if the module can not be parsed.
+
+        """
+        with open(filename, 'rb') as fp:
+            source = fp.read()
+
+        module_name = splitext(basename(filename))[0]
+        # default service names depend on the module name, so a copied or
+        # renamed module must not share cached names with the original
+        key = '%s:%s' % (module_name, hashlib.sha1(source).hexdigest())
+
+        with self._lock:
+            if key in self._cache:
+                return self._cache[key]
+
+        try:
+            names = find_service_names(source, module_name, filename)
+        except SyntaxError as exc:
+            log.warning("Could not parse service module '%s': %s",
+                        filename, exc)
+            return None
+
+        with self._lock:
+            self._cache[key] = names
+            self._dirty = True
+
+        return names
+
+    def get_all_service_names(self, filenames):
+        """Return dictionary mapping module files to their service names."""
+        return dict((filename, self.get_service_names(filename))
+                    for filename in filenames)
+
+    def save(self):
+        """Write cached results to the cache directory, if one is set."""
+        with self._lock:
+            if not self.cache_dir or not self._dirty:
+                return
+
+            if not exists(self.cache_dir):
+                os.makedirs(self.cache_dir)
+
+            fd, tmpname = tempfile.mkstemp(dir=self.cache_dir)
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(self._cache, fp)
+            os.rename(tmpname, join(self.cache_dir, CACHE_FILENAME))
+            self._dirty = False
@@ -0,0 +1,284 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/benchchannels.py
+#
+"""Command line script to benchmark deployed Zato channels via HTTP.
+
+Reads configuration file ``channels.conf`` by default.
+
+Each channel of the deployment target is loaded for ``--duration`` seconds by
+``--concurrency`` parallel clients, optionally limited to ``--rate`` requests
+per second in total. Request bodies are read from ``<section>.tmpl`` files in
+the ``--payload-dir`` directory, where ``<section>`` is the name of the
+channel's section in ``channels.conf``. In the templates, ``$n`` is replaced
+by the request number and ``$channel`` by the channel name.
+
+Connection errors, timeouts and responses with an HTTP status other than 2xx
+or 3xx count as errors. Unlike the probes of rolling deployments, the
+benchmark ignores the ``probe_ok_status`` option of the channels.
+
+Results can be saved as a baseline (``--save-baseline``) and later runs
+compared against it (``--baseline``): a channel whose p95 latency or error
+rate is worse than the baseline by more than ``--tolerance`` is reported as a
+regression.
+
+Run ``zato-benchchannels -h`` for usage help.
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import logging
+import sys
+import threading
+import time
+
+from os.path import exists, join
+from string import Template
+
+# do not use relative import here, because this module should be executable
+# as a command line script
+from zatodeploy.common import read_ini_config
+from zatodeploy.probe import (ProbeResult, channel_headers, channel_url,
+    make_session, request_channel)
+
+
+log = logging.getLogger(__name__)
+
+PERCENTILES = (50, 95, 99)
+
+
+class BenchResult(ProbeResult):
+    """Result of a benchmark run against one channel."""
+
+    def __init__(self, name, url):
+        """Set up empty result for channel name at url."""
+        super(BenchResult, self).__init__(name, url)
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Return successful requests per second."""
+        return len(self.latencies) / self.elapsed if self.elapsed else 0.0
+
+    def as_dict(self):
+        """Return result summary as dictionary."""
+        res = dict(requests=self.requests, error_rate=self.error_rate,
+                   throughput=self.throughput)
+        for pct in PERCENTILES:
+            res['p%i' % pct] = self.percentile(pct)
+        return res
+
+
+def read_payload_template(payload_dir, ident):
+    """Return payload template for channel section ident or None."""
+    if payload_dir:
+        filename = join(payload_dir, '%s.tmpl' % ident)
+        if exists(filename):
+            with open(filename) as fp:
+                return Template(fp.read())
+
+
+def bench_channel(config, channel, template=None, duration=10.0,
+                  concurrency=1, rate=None, timeout=None):
+    """Load channel with concurrent requests and return BenchResult."""
+    url = channel_url(config, channel)
+    result = BenchResult(channel.name, url)
+    method = channel.get('method') or 'GET'
+    headers = channel_headers(channel)
+    lock = threading.Lock()
+    counter = [0]
+    start = time.time()
+    deadline = start + duration
+
+    def next_request():
+        """Return number of next request and time to send it or None."""
+        with lock:
+            n = counter[0]
+            counter[0] += 1
+
+        at = start + float(n) / rate if rate else time.time()
+        return (n, at) if at < deadline else None
+
+    def worker():
+        session = make_session(config)
+        try:
+            while True:
+                req = next_request()
+                if req is None:
+                    break
+
+                n, at = req
+                delay = at - time.time()
+                if delay > 0:
+                    time.sleep(delay)
+
+                data = (template.safe_substitute(n=n, channel=channel.name)
+                        if template else None)
+                latency = request_channel(session, url, method, data, timeout,
+                                          headers)
+
+                with lock:
+                    result.add(latency)
+        finally:
+            session.close()
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    result.elapsed = time.time() - start
+    return result
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Return list of regressions of results compared to baseline data."""
+    regressions = []
+
+    for result in results:
+        base = baseline.get(result.name)
+        if not base:
+            continue
+
+        p95 = result.percentile(95)
+        if (p95 is not None and base.get('p95') and
+                p95 > base['p95'] * (1 + tolerance)):
+            regressions.append(
+                "Channel '{}' p95 latency {:.3f} s, baseline {:.3f} s".format(
+                    result.name, p95, base['p95']))
+
+        base_error_rate = base.get('error_rate', 0.0)
+        if result.error_rate > base_error_rate + tolerance:
+            regressions.append(
+                "Channel '{}' error rate {:.1%}, baseline {:.1%}".format(
+                    result.name, result.error_rate, base_error_rate))
+
+    return regressions
+
+
+def print_report(results):
+    """Print table of benchmark results."""
+    fmt = "{:<40} {:>8} {:>7} {:>9} {:>8} {:>8} {:>8}"
+    print(fmt.format("Channel", "Requests", "Errors", "Req/s", "p50 [s]",
+                     "p95 [s]", "p99 [s]"))
+
+    for result in results:
+        pcts = ['n/a' if result.percentile(pct) is None else
+                '%.3f' % result.percentile(pct) for pct in PERCENTILES]
+        print(fmt.format(result.name[:40], result.requests,
+                         '%.1f%%' % (result.error_rate * 100),
+                         '%.1f' % result.throughput, *pcts))
+
+
+def main(args=None):
+    """Main script entry point function.
+
+    Parses command line arguments and configuration file, benchmarks all
+    channels of the requested deployment target and reports the results.
+
+    """
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-v', '--verbose', action="store_true",
+        help="Enable verbose output")
+    ap.add_argument('-c', '--config', default="deploy.conf",
+        help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('--channels', default="channels.conf",
+        help="Channel definition file (default: %(default)s)")
+    ap.add_argument('-d', '--duration', type=float, default=10.0,
+        help="Seconds to load each channel (default: %(default)s)")
+    ap.add_argument('-n', '--concurrency', type=int, default=4,
+        help="Number of concurrent clients per channel (default: "
+             "%(default)s)")
+    ap.add_argument('-r', '--rate', type=float,
+        help="Requests per second per channel (default: unlimited)")
+    ap.add_argument('--timeout', type=float,
+        help="Request timeout in seconds")
+    ap.add_argument('--payload-dir',
+        help="Directory with request payload templates")
+    ap.add_argument('--baseline',
+        help="Compare results with baseline from this JSON file")
+    ap.add_argument('--save-baseline',
+        help="Save results as baseline to this JSON file")
+    ap.add_argument('--tolerance', type=float, default=0.2,
+        help="Tolerated relative increase of p95 latency and absolute "
+             "increase of error rate over the baseline (default: "
+             "%(default)s)")
+    ap.add_argument('target', nargs="?",
+        help="Deployment target (default: first target)")
+
+    args = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    if args.verbose:
+        loglevel = logging.DEBUG
+    else:
+        loglevel = logging.INFO
+
+    logging.basicConfig(level=loglevel)
+
+    config = read_ini_config(args.config)
+    log.debug("Deployment configuration:\n%s", config)
+    if exists(args.channels):
+        channels = read_ini_config(args.channels)
+        log.debug("Channel definitions:\n%s", channels)
+    else:
+        log.warning("Channel definitions file '%s' not found. Nothing to do.",
+            args.channels)
+        return 0
+
+    target = args.target or next((k for k in config if k != 'zato'), None)
+
+    if target not in config:
+        msg = ("Deployment target '{}' not defined in deployment "
+               "configuration.".format(target))
+        log.error(msg)
+        return msg
+
+    target_channels = [ch.strip()
+        for ch in config[target].get('channels', '').split(',')
+            if ch.strip()]
+
+    if target_channels == ['*']:
+        target_channels = list(channels.keys())
+
+    results = []
+    for ident in target_channels:
+        channel = channels.get(ident)
+        if not channel:
+            msg = ("Channel '{}' for target '{}' not found "
+                "in channel definitions".format(ident, target))
+            log.error(msg)
+            return msg
+
+        log.info("Benchmarking channel '%s' for %s seconds.", channel.name,
+                 args.duration)
+        results.append(bench_channel(config[target], channel,
+            read_payload_template(args.payload_dir, ident), args.duration,
+            max(1, args.concurrency), args.rate, args.timeout))
+
+    print_report(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as fp:
+            json.dump(dict((res.name, res.as_dict()) for res in results), fp,
+                      indent=2, sort_keys=True)
+        log.info("Baseline saved to '%s'.", args.save_baseline)
+
+    if args.baseline:
+        with open(args.baseline) as fp:
+            regressions = compare_to_baseline(results, json.load(fp),
+                                              args.tolerance)
+        if regressions:
+            for regression in regressions:
+                log.error("Regression: %s", regression)
+            return "{} regression(s) compared to baseline.".format(
+                len(regressions))
+        log.info("No regressions compared to baseline.")
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
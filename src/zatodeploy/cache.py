@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/cache.py
+#
+"""On-disk cache for Zato cluster inventory listings.
+
+The cache is shared by all deployment scripts and is enabled by setting
+``cache_dir`` in the deployment configuration. Each cluster (identified by
+load balancer address and cluster ID) gets its own cache file, which holds
+the decoded responses of the listing services for ``inventory_cache_ttl``
+seconds. Any mutating service call drops the cache file of the cluster and
+records the time of the invalidation, so listings fetched while the cluster
+was modified are not stored afterwards.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+
+from os.path import exists, join
+
+
+__all__ = (
+    'DEFAULT_TTL',
+    'InventoryCache',
+    'get_inventory_cache'
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 300
+
+_lock = threading.RLock()
+
+
+class InventoryCache(object):
+    """Cache of listing service responses for one Zato cluster."""
+
+    def __init__(self, directory, cluster_key, ttl=DEFAULT_TTL):
+        """Set up cache for cluster identified by cluster_key in directory."""
+        self.directory = directory
+        self.ttl = ttl
+        self.filename = join(directory, 'inventory-%s.json' %
+                             re.sub(r'[^\w.-]', '_', cluster_key))
+        self.marker = self.filename + '.invalidated'
+
+    @staticmethod
+    def make_key(service, data):
+        """Return cache key for a call to service with given request data."""
+        return '%s %s' % (service, json.dumps(data, sort_keys=True))
+
+    def _load(self):
+        if not exists(self.filename):
+            return {}
+
+        try:
+            with open(self.filename) as fp:
+                return json.load(fp)
+        except (IOError, OSError, ValueError) as exc:
+            log.warning("Ignoring unreadable inventory cache '%s': %s",
+                        self.filename, exc)
+            return {}
+
+    def get(self, service, data):
+        """Return cached response data or None if missing or expired."""
+        key = self.make_key(service, data)
+
+        with _lock:
+            entry = self._load().get(key)
+
+        if entry and time.time() - entry['time'] < self.ttl:
+            log.debug("Inventory cache hit for '%s'.", key)
+            return entry['data']
+
+    def invalidated(self):
+        """Return time of the last invalidation or 0 if not known."""
+        try:
+            with open(self.marker) as fp:
+                return float(fp.read())
+        except (IOError, OSError, ValueError):
+            return 0
+
+    def put(self, service, data, response, since=None):
+        """Store response data for a call to service in the cache.
+
+        since is the time the call was started. If the cache was invalidated
+        since, the response may be outdated and is not stored.
+
+        """
+        key = self.make_key(service, data)
+
+        with _lock:
+            if since is not None and self.invalidated() >= since:
+                log.debug("Inventory cache invalidated during call, not "
+                          "storing '%s'.", key)
+                return
+
+            entries = self._load()
+            now = time.time()
+            entries = dict((k, v) for k, v in entries.items()
+                           if now - v['time'] < self.ttl)
+            entries[key] = dict(time=now, data=response)
+
+            if not exists(self.directory):
+                os.makedirs(self.directory)
+
+            # write to temporary file first and rename it, so concurrently
+            # running scripts never read a partially written cache file
+            fd, tmpname = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(fd, 'w') as fp:
+                json.dump(entries, fp)
+            os.rename(tmpname, self.filename)
+
+    def invalidate(self):
+        """Remove all cached responses for this cluster."""
+        with _lock:
+            if exists(self.directory):
+                with open(self.marker, 'w') as fp:
+                    fp.write(repr(time.time()))
+
+            if exists(self.filename):
+                log.debug("Invalidating inventory cache '%s'.", self.filename)
+                os.remove(self.filename)
+
+
+def get_inventory_cache(config):
+    """Return InventoryCache for cluster given by config or None if disabled.
+
+    The cache is only enabled when the ``cache_dir`` option is set.
+
+    """
+    directory = config.get('cache_dir')
+
+    if not directory:
+        return None
+
+    cluster_key = '%s-%s-%s' % (config.lb_host, config.lb_port,
+                                config.cluster)
+    ttl = float(config.get('inventory_cache_ttl') or DEFAULT_TTL)
+    return InventoryCache(os.path.expanduser(directory), cluster_key, ttl)
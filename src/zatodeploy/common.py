@@ -8,9 +8,12 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 # standard library
+import json
 import logging
+import threading
 
 from collections import OrderedDict
+from multiprocessing.pool import ThreadPool
 from os.path import exists
 
 try:
@@ -19,20 +22,29 @@ except ImportError:
     # Python 3
     from configparser import SafeConfigParser
 
-# zato
-from bunch import bunchify
-from zato.client import JSONClient
+# third-party
+from bunch import Bunch, bunchify
+
+# local modules
+from .cache import get_inventory_cache
+from .jsonstream import JSONArrayStream
+from .limiter import get_limiter
+from .records import HTTPSOAPRecord, SecDefRecord, ServiceRecord
 
 
 __all__ = (
+    'HTTPSOAPIndex',
     'JSONCallResponseError',
     'find_security_id',
     'get_basic_auth_list',
     'get_channel_list',
+    'get_http_soap_inventory',
     'get_http_soap_list',
     'get_outgoing_list',
     'get_security_list',
     'get_service_list',
+    'iter_http_soap_list',
+    'iter_service_list',
     'json_call',
     'read_ini_config'
 )
@@ -45,16 +57,37 @@ SERVICE_URLS = {
     'zato.service.upload-package': "/zato/json/zato.service.upload-package",
     'zato.http-soap.get-list': "/zato/json/zato.http-soap.get-list",
     'zato.http-soap.edit': "/zato/json/zato.http-soap.edit",
+    'zato.http-soap.delete': "/zato/json/zato.http-soap.delete",
     'zato.security.basic-auth.create':
         "/zato/json/zato.security.basic-auth.create",
     'zato.security.basic-auth.edit':
         "/zato/json/zato.security.basic-auth.edit",
     'zato.security.basic-auth.change-password':
         "/zato/json/zato.security.basic-auth.change-password",
+    'zato.security.basic-auth.delete':
+        "/zato/json/zato.security.basic-auth.delete",
     'zato.service.delete': "/zato/json/zato.service.delete",
     'zato.service.get-list': "/zato/json/zato.service.get-list"
 }
 
+HTTP_SOAP_CONNECTIONS = ('channel', 'outgoing')
+HTTP_SOAP_TRANSPORTS = ('plain_http', 'soap')
+# size of the chunks listing responses are read and decoded in
+STREAM_CHUNK_SIZE = 64 * 1024
+# maximum number of kept-alive connections per Zato API endpoint
+SESSION_POOL_SIZE = 32
+
+# HTTP sessions shared by all calls to the same Zato API endpoint
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+# services which only read from the cluster and whose responses may be cached
+LISTING_SERVICES = (
+    'zato.http-soap.get-list',
+    'zato.security.get-list',
+    'zato.service.get-list'
+)
+
 
 class JSONCallResponseError(Exception):
     """Raised if a JSON service call does not return a proper Zato response.
@@ -64,18 +97,104 @@ class JSONCallResponseError(Exception):
     """
 
 
-def json_call(service, data, config):
-    """Make a call to a Zato service from a set list with JSON POST data.
+class HTTPSOAPIndex(object):
+    """Zato HTTP/SOAP objects indexed by name, URL path and service name.
 
-    The service URLs are configured in the SERVICE_URL module global
-    dictionary with the service name as written in the header of the Zato
-    service documentation page as the key.
+    Names are unique per connection type, so ``by_name`` maps a name to a
+    single object, while ``by_url_path`` and ``by_service`` map to lists.
 
-    @params service: service name
-    @param data: dictionary of data to send a JSON post data
-    @param config: configuration dictionary as read from 'deploy.conf'
+    """
+
+    def __init__(self, items=()):
+        """Build indexes over given HTTP/SOAP objects."""
+        self.items = []
+        self.by_name = {}
+        self.by_url_path = {}
+        self.by_service = {}
+
+        for item in items:
+            self.add(item)
+
+    def add(self, item):
+        """Add a HTTP/SOAP object to the indexes."""
+        self.items.append(item)
+        self.by_name[item.name] = item
+        self.by_url_path.setdefault(item.get('url_path'), []).append(item)
+        self.by_service.setdefault(item.get('service_name'), []).append(item)
+
+    def get(self, name, default=None):
+        """Return object with given name or default if there is none."""
+        return self.by_name.get(name, default)
+
+    def __contains__(self, name):
+        return name in self.by_name
+
+    def __getitem__(self, name):
+        return self.by_name[name]
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def _get_session(address, auth):
+    """Return HTTP session shared by all calls to address with given auth.
+
+    Reusing the session keeps connections to the cluster alive between
+    calls, so successive calls (e.g. in watch mode) do not pay for setting
+    up a new connection each time.
+
+    """
+    # imported here, because it is only needed when a request is made
+    import requests
+
+    with _sessions_lock:
+        session = _sessions.get((address, auth))
+
+        if session is None:
+            session = _sessions[(address, auth)] = requests.Session()
+            session.auth = auth
+            session.mount(address, requests.adapters.HTTPAdapter(
+                pool_maxsize=SESSION_POOL_SIZE))
+
+        return session
+
+
+def _release(limiter, started, service, exc=None, status=None):
+    """Release limiter slot of call to service, reporting its outcome.
+
+    Timeouts and 5xx responses count as overload, other errors are ignored.
 
     """
+    import requests
+
+    if exc is not None and not isinstance(exc, requests.Timeout):
+        limiter.discard(started)
+    else:
+        limiter.release(started, service, overload=exc is not None or
+                        (status is not None and status >= 500))
+
+
+def _invoke(service, data, config, use_cache=True):
+    """Call Zato service and return the decoded response data.
+
+    See ``json_call`` for the description of the arguments.
+
+    """
+    cache = get_inventory_cache(config)
+
+    if cache and use_cache and service in LISTING_SERVICES:
+        cached = cache.get(service, data)
+
+        if cached is not None:
+            return cached
+
+    # zato.client pulls in large parts of zato, so import it only when a
+    # request is actually made
+    from zato.client import JSONClient
+
     address = 'http://%s:%s' % (config.lb_host, config.lb_port)
     try:
         path = SERVICE_URLS[service]
@@ -84,26 +203,169 @@ def json_call(service, data, config):
         raise
 
     auth = (config.http_user, config.http_password)
-    client = JSONClient(address, path, auth)
+    client = JSONClient(address, path, auth,
+                        session=_get_session(address, auth))
     log.debug("Invoking service at '%s' with data: %s", path, data)
-    res = client.invoke(data)
+    limiter = get_limiter(config)
+    started = limiter.acquire()
+
+    try:
+        res = client.invoke(data)
+    except Exception as exc:
+        _release(limiter, started, service, exc)
+        raise
+    else:
+        _release(limiter, started, service,
+                 status=getattr(getattr(res, 'inner', None), 'status_code',
+                                None))
+    finally:
+        if cache and service not in LISTING_SERVICES:
+            cache.invalidate()
 
     if not res.ok:
         raise JSONCallResponseError(
             "Zato non-successful result code: {}".format(res))
 
-    return bunchify(res.data)
+    if cache and service in LISTING_SERVICES:
+        cache.put(service, data, res.data, since=started)
+
+    return res.data
+
+
+def json_call(service, data, config, use_cache=True):
+    """Make a call to a Zato service from a set list with JSON POST data.
+
+    The service URLs are configured in the SERVICE_URL module global
+    dictionary with the service name as written in the header of the Zato
+    service documentation page as the key.
+
+    @params service: service name
+    @param data: dictionary of data to send a JSON post data
+    @param config: configuration dictionary as read from 'deploy.conf'
+
+    If the ``cache_dir`` option is set in the configuration, responses of
+    listing services are served from the on-disk inventory cache while they
+    are fresh and calls to any other service invalidate the cache. Pass
+    ``use_cache=False`` to always fetch a fresh listing.
+
+    The number of concurrent calls to a cluster is bounded by its adaptive
+    limiter (see ``zatodeploy.limiter``), so the call may wait for a slot.
+
+    """
+    return bunchify(_invoke(service, data, config, use_cache))
+
+
+def _response_key(service):
+    """Return key of the response data member for service."""
+    return service.replace('.', '_').replace('-', '_') + '_response'
+
+
+def _post_listing(service, data, config):
+    """Make listing request with streamed response.
+
+    Returns (response, time the limiter slot was acquired).
+
+    """
+    address = 'http://%s:%s' % (config.lb_host, config.lb_port)
+    url = address + SERVICE_URLS[service]
+    session = _get_session(address, (config.http_user, config.http_password))
+    log.debug("Streaming service at '%s' with data: %s", url, data)
+    limiter = get_limiter(config)
+    started = limiter.acquire()
+
+    # the slot is released once the response headers are received, i.e. the
+    # cluster has done its work, so consumers may make calls while iterating
+    try:
+        resp = session.post(url, data=json.dumps(data), stream=True)
+    except Exception as exc:
+        _release(limiter, started, service, exc)
+        raise
+
+    _release(limiter, started, service, status=resp.status_code)
+    return resp, started
+
+
+def _open_stream(resp, key):
+    """Return JSONArrayStream of the objects in member key of response."""
+    if resp.status_code != 200:
+        raise JSONCallResponseError("Zato HTTP error: {} {}".format(
+            resp.status_code, resp.reason))
+
+    resp.encoding = resp.encoding or 'utf-8'
+    return JSONArrayStream(
+        resp.iter_content(STREAM_CHUNK_SIZE, decode_unicode=True), key)
+
+
+def _stream_list(service, data, config, use_cache=True):
+    """Call listing service and yield the listed objects as they arrive.
+
+    The response is read in chunks and the listed objects are decoded one by
+    one, so the whole response is never held in memory and consumers can
+    work on the first objects while the rest is still being transferred.
+
+    Fresh listings are served from the inventory cache like in ``json_call``.
+    A non-successful Zato result code is only known at the end of the
+    response, so JSONCallResponseError is raised after the last object.
+
+    """
+    key = _response_key(service)
+    cache = get_inventory_cache(config)
+    cached = cache.get(service, data) if cache and use_cache else None
+
+    if cached is not None:
+        for item in cached[key]:
+            yield item
+        return
+
+    resp, started = _post_listing(service, data, config)
+    # keep decoded items for the cache only if it is enabled
+    items = [] if cache else None
+
+    try:
+        stream = _open_stream(resp, key)
+
+        try:
+            for item in stream:
+                if items is not None:
+                    items.append(item)
+                yield item
+        except ValueError as exc:
+            raise JSONCallResponseError(
+                "Could not decode Zato response: {}".format(exc))
+    finally:
+        resp.close()
+
+    env = stream.find_member('zato_env') or {}
+    if env.get('result') != 'ZATO_OK':
+        raise JSONCallResponseError(
+            "Zato non-successful result code: {}".format(env.get('result')))
+
+    if cache:
+        cache.put(service, data, {key: items, 'zato_env': env},
+                  since=started)
 
 
-def find_security_id(name, config):
+def find_security_id(name, config, secdefs=None):
     """Look up ID of security definition matching name.
 
-    Does a simple substring match. Raises ValueError if there are multiple
-    matches. Raises KeyError when no match is found.
+    A security definition with exactly the given name is returned even if
+    the name is also a substring of other names (e.g. the exported names).
+    Otherwise does a simple substring match. Raises ValueError if there are
+    multiple matches. Raises KeyError when no match is found.
+
+    If secdefs is given, it is used as the list of security definitions to
+    search instead of fetching it from the cluster.
 
     """
+    if secdefs is None:
+        secdefs = get_security_list(config)
+
+    for secdef in secdefs:
+        if secdef.name == name:
+            return secdef.id
+
     result = None
-    for secdef in get_security_list(config):
+    for secdef in secdefs:
         if name in secdef.name:
             if result is not None:
                 raise ValueError("Ambiguous security definition name '{}'. "
@@ -118,50 +380,86 @@ def find_security_id(name, config):
     return result
 
 
-def get_security_list(config):
-    """Return zato security definitions as a list of Bunch objects."""
+def get_security_list(config, use_cache=True):
+    """Return zato security definitions as a list of SecDefRecord objects."""
     data = {'cluster_id': config.cluster}
-    res = json_call('zato.security.get-list', data, config)
-    return res.zato_security_get_list_response
+    return [SecDefRecord(item) for item in
+            _stream_list('zato.security.get-list', data, config, use_cache)]
 
 
-def get_basic_auth_list(config):
-    """Return zato HTTP Basic Auth security defs as a list of Bunch objects."""
-    return [auth for auth in get_security_list(config)
+def get_basic_auth_list(config, use_cache=True):
+    """Return zato HTTP Basic Auth secdefs as a list of SecDefRecords."""
+    return [auth for auth in get_security_list(config, use_cache)
         if auth.get('sec_type') == 'basic_auth']
 
 
-def get_http_soap_list(config, connection, transport):
-    """Return zato HTTP/SOAP objects as list of Bunch objects."""
+def iter_http_soap_list(config, connection, transport, use_cache=True):
+    """Yield zato HTTP/SOAP objects as HTTPSOAPRecords as they are received."""
     data = dict(cluster_id=int(config.cluster), connection=connection,
                 transport=transport)
-    res = json_call('zato.http-soap.get-list', data, config)
-    return res.zato_http_soap_get_list_response
+    for item in _stream_list('zato.http-soap.get-list', data, config,
+                             use_cache):
+        yield HTTPSOAPRecord(item)
+
+
+def get_http_soap_list(config, connection, transport):
+    """Return zato HTTP/SOAP objects as list of HTTPSOAPRecord objects."""
+    return list(iter_http_soap_list(config, connection, transport))
+
+
+def get_http_soap_inventory(config, connections=HTTP_SOAP_CONNECTIONS,
+                            use_cache=True):
+    """Return zato channels and/or outgoings indexed by connection type.
+
+    All listings (each connection type for both transports) are fetched
+    concurrently and objects are added to the indexes as they are received.
+    Returns a dictionary mapping each connection type to a ``HTTPSOAPIndex``.
+    Pass ``use_cache=False`` to bypass the inventory cache.
+
+    """
+    combinations = [(conn, transport) for conn in connections
+                    for transport in HTTP_SOAP_TRANSPORTS]
+    indexes = dict((conn, HTTPSOAPIndex()) for conn in connections)
+    lock = threading.Lock()
+
+    def fetch(comb):
+        for item in iter_http_soap_list(config, comb[0], comb[1], use_cache):
+            with lock:
+                indexes[comb[0]].add(item)
+
+    pool = ThreadPool(len(combinations))
+
+    try:
+        pool.map(fetch, combinations)
+    finally:
+        pool.close()
+
+    return indexes
 
 
 def get_channel_list(config):
-    """Return zato channels as list of Bunch objects."""
-    res = []
-    for transport in ('plain_http', 'soap'):
-        res.extend(get_http_soap_list(config, 'channel', transport))
-    return res
+    """Return zato channels as list of HTTPSOAPRecord objects."""
+    return get_http_soap_inventory(config, ('channel',))['channel'].items
 
 
 def get_outgoing_list(config):
-    """Return zato channels as list of Bunch objects."""
-    res = []
-    for transport in ('plain_http', 'soap'):
-        res.extend(get_http_soap_list(config, 'outgoing', transport))
-    return res
+    """Return zato outgoings as list of HTTPSOAPRecord objects."""
+    return get_http_soap_inventory(config, ('outgoing',))['outgoing'].items
 
 
-def get_service_list(config, filter=None):
-    """Return zato services as list of Bunch objects."""
+def iter_service_list(config, filter=None, use_cache=True):
+    """Yield zato services as ServiceRecord objects as they are received."""
     data = dict(
         cluster_id=int(config.cluster),
         name_filter=filter or '*')
-    res = json_call('zato.service.get-list', data, config)
-    return res.zato_service_get_list_response
+    for item in _stream_list('zato.service.get-list', data, config,
+                             use_cache):
+        yield ServiceRecord(item)
+
+
+def get_service_list(config, filter=None, use_cache=True):
+    """Return zato services as list of ServiceRecord objects."""
+    return list(iter_service_list(config, filter, use_cache))
 
 
 def _read_includes(cp):
@@ -218,6 +516,7 @@ def read_ini_config(filename):
                 s[option] = cp.get('zato', option)
         for option in cp.options(section):
             s[option] = cp.get(section, option)
-        config[section] = bunchify(s)
+        # option values are strings, no need to bunchify recursively
+        config[section] = Bunch(s)
 
     return config
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/compilecheck.py
+#
+"""Offline syntax check of service modules before upload.
+
+Modules are byte-compiled in parallel in a pool of worker processes. The
+workers are started with the "spawn" method, since the check runs in a
+deployment stage thread and forking a multi-threaded process is unsafe.
+Python 2 has no such start method, so modules are compiled in-process there.
+
+The hashes of module sources which compiled successfully with the running
+interpreter are remembered in the cache directory (if given), so unchanged
+modules are not compiled again.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import tempfile
+
+from os.path import exists, join
+
+
+__all__ = (
+    'check_modules',
+    'compile_module'
+)
+
+log = logging.getLogger(__name__)
+
+CACHE_FILENAME = 'compiled-modules.json'
+
+
+def compile_module(filename):
+    """Compile module source and return (filename, error message or None)."""
+    try:
+        with open(filename, 'rb') as fp:
+            source = fp.read()
+        # do not let the __future__ imports of this module leak into the code
+        compile(source, filename, 'exec', 0, True)
+    except (SyntaxError, TypeError, ValueError) as exc:
+        return filename, "{}: {}".format(type(exc).__name__, exc)
+    except (IOError, OSError) as exc:
+        return filename, str(exc)
+
+    return filename, None
+
+
+def _source_hash(source):
+    # modules compiled by one Python version may not compile with another
+    interpreter = '%s %s\0' % (sys.executable,
+                               '.'.join(str(v) for v in sys.version_info))
+    return hashlib.sha1(interpreter.encode('utf-8') + source).hexdigest()
+
+
+def _compile_all(filenames, processes=None):
+    """Return list of compile_module results for filenames."""
+    if len(filenames) < 2 or not hasattr(multiprocessing, 'get_context'):
+        return [compile_module(filename) for filename in filenames]
+
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(
+        min(processes or multiprocessing.cpu_count(), len(filenames)))
+    try:
+        return pool.map(compile_module, filenames)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def _read_cache(cache_dir):
+    if not cache_dir or not exists(join(cache_dir, CACHE_FILENAME)):
+        return set()
+
+    try:
+        with open(join(cache_dir, CACHE_FILENAME)) as fp:
+            return set(json.load(fp))
+    except (IOError, OSError, ValueError) as exc:
+        log.warning("Ignoring unreadable compile check cache: %s", exc)
+        return set()
+
+
+def _write_cache(cache_dir, hashes):
+    if not exists(cache_dir):
+        os.makedirs(cache_dir)
+
+    fd, tmpname = tempfile.mkstemp(dir=cache_dir)
+    with os.fdopen(fd, 'w') as fp:
+        json.dump(sorted(hashes), fp)
+    os.rename(tmpname, join(cache_dir, CACHE_FILENAME))
+
+
+def check_modules(filenames, cache_dir=None, processes=None):
+    """Compile modules in parallel and return dict of errors by filename.
+
+    Modules whose source hash (including the interpreter version) is found
+    in the cache are skipped. The number of worker processes defaults to the
+    number of CPUs.
+
+    """
+    cache_dir = cache_dir and os.path.expanduser(cache_dir)
+    compiled = _read_cache(cache_dir)
+    hashes = {}
+
+    for filename in set(filenames):
+        with open(filename, 'rb') as fp:
+            hashes[filename] = _source_hash(fp.read())
+
+    pending = sorted(filename for filename, digest in hashes.items()
+                     if digest not in compiled)
+    log.debug("Compiling %i of %i service module(s).", len(pending),
+              len(hashes))
+
+    results = _compile_all(pending, processes)
+    errors = dict((filename, error) for filename, error in results if error)
+
+    if cache_dir and len(errors) < len(pending):
+        compiled.update(hashes[filename] for filename in pending
+                        if filename not in errors)
+        _write_cache(cache_dir, compiled)
+
+    return errors
@@ -18,12 +18,17 @@ import logging
 import re
 import sys
 
+from functools import partial
 from os.path import exists
 
+from bunch import Bunch
+
 # do not use relative import here, because this module should be executable
 # as a command line script
-from zatodeploy.common import (find_security_id, get_channel_list,
-    get_service_list, json_call, read_ini_config)
+from zatodeploy.common import (HTTPSOAPIndex, find_security_id,
+    get_http_soap_inventory, get_security_list, get_service_list, json_call,
+    read_ini_config)
+from zatodeploy.executor import get_concurrency, run_concurrently
 
 
 log = logging.getLogger(__name__)
@@ -36,8 +41,13 @@ REQUIRED_FIELDS = {
 }
 
 
-def create_or_update_channel(config, channel, update=False):
-    """Make a JSON-HTTP call to Zato to create/update an incoming channel."""
+def prepare_channel_data(config, channel, update=False, secdefs=None):
+    """Return validated POST data to create/update an incoming channel.
+
+    Raises ValueError if the channel data is invalid and KeyError if the
+    security definition referenced by the channel does not exist.
+
+    """
     # create POST data
     data = dict(
         connection='channel',
@@ -46,14 +56,24 @@ def create_or_update_channel(config, channel, update=False):
         is_internal=False,
         security_id=None
     )
-    # updating possibly overwrites defaults
-    data.update(channel)
+    # updating possibly overwrites defaults, probe options are not sent
+    data.update((key, value) for key, value in channel.items()
+                if not key.startswith('probe_'))
     if update:
         data['id'] = update
 
     log.debug("Channel data: %r", data)
+    check_channel_data(data)
+    resolve_security_id(data, config, secdefs)
+    return data
+
+
+def check_channel_data(data):
+    """Validate and complete channel data in place.
+
+    Raises ValueError if the channel data is invalid.
 
-    # validate channel data
+    """
     if data['connection'] != 'channel':
         raise ValueError("'connection' field of channel data must be set to "
                          "'channel'.")
@@ -77,16 +97,28 @@ def create_or_update_channel(config, channel, update=False):
         raise ValueError("'transport' field of channel data must be either "
                          "'plain_http' or 'soap'.")
 
-    # check dependencies
+
+def resolve_security_id(data, config, secdefs=None):
+    """Replace security definition name in channel data with its ID.
+
+    Raises KeyError if the security definition does not exist.
+
+    """
     # is security_id a name?
     if isinstance(data.get('security_id'), basestring):
         data['security_id'] = data['security_id'].strip()
     if data.get('security_id') and not re.match(r'\d+', data['security_id']):
-        data['security_id'] = find_security_id(data['security_id'], config)
+        data['security_id'] = find_security_id(data['security_id'], config,
+                                               secdefs)
     # Fix empty value
     if not data.get('security_id'):
         data['security_id'] = None
 
+
+def create_or_update_channel(config, channel, update=False, secdefs=None):
+    """Make a JSON-HTTP call to Zato to create/update an incoming channel."""
+    data = prepare_channel_data(config, channel, update, secdefs)
+
     # do JSON call
     method = 'edit' if update else 'create'
     method_name = 'zato.http-soap.%s' % method
@@ -96,6 +128,167 @@ def create_or_update_channel(config, channel, update=False):
         channel['name'], res[response_name].id, method))
 
 
+def _methods_overlap(method1, method2):
+    """Return True if two channel HTTP methods may match the same request.
+
+    An empty method matches requests with any method.
+
+    """
+    return not method1 or not method2 or method1 == method2
+
+
+def validate_channels(config, channels, existing_channels, existing_services,
+                      secdefs=None):
+    """Check channels to be deployed before making any changes.
+
+    Validates the data of each channel and checks that referenced services
+    and security definitions exist, that no two channels share a name and
+    that no channel URL path and method collides with another channel to be
+    deployed or with an existing channel not being replaced.
+
+    Returns a list of all problems found (empty if there are none).
+
+    """
+    problems = []
+    names = set()
+    url_paths = {}
+
+    for channel in channels:
+        name = channel.get('name')
+        if name in names:
+            problems.append("Channel name '{}' is used by more than one "
+                            "channel definition.".format(name))
+        names.add(name)
+
+        try:
+            data = prepare_channel_data(config, channel, secdefs=secdefs)
+        except (KeyError, ValueError) as exc:
+            problems.append("Channel '{}': {}".format(
+                name, exc.args[0] if exc.args else exc))
+            continue
+
+        if data['service'] not in existing_services:
+            problems.append("Channel '{}' references unknown service "
+                            "'{}'".format(name, data['service']))
+
+        url_path, method = data['url_path'], data.get('method')
+        for other in url_paths.get(url_path, []):
+            if _methods_overlap(method, other.get('method')):
+                problems.append("Channels '{}' and '{}' both use URL path "
+                                "'{}'.".format(other['name'], data['name'],
+                                               url_path))
+        url_paths.setdefault(url_path, []).append(data)
+
+    for channel in channels:
+        url_path = channel.get('url_path')
+        for other in existing_channels.by_url_path.get(url_path, []):
+            if (other.name not in names and
+                    _methods_overlap(channel.get('method'),
+                                     other.get('method'))):
+                problems.append("Channel '{}' URL path '{}' is already used "
+                                "by existing channel '{}'.".format(
+                                    channel.get('name'), url_path, other.name))
+
+    return problems
+
+
+def deploy_channel(config, existing_channels, secdefs, channel):
+    """Create channel or update it if it is in existing_channels."""
+    if channel.name in existing_channels:
+        log.info("Channel '{}' already exists in zato cluster. "
+                 "Updating.".format(channel.name))
+        create_or_update_channel(config, channel,
+            update=existing_channels[channel.name].id, secdefs=secdefs)
+    else:
+        create_or_update_channel(config, channel, secdefs=secdefs)
+
+
+def get_offline_inventory(config, secdefs_file):
+    """Return inventory for validating channels without a cluster.
+
+    Returns a tuple of an empty channel index, the set of service names
+    predicted from the target's service modules and the security
+    definitions from secdefs_file (None if that file does not exist).
+
+    """
+    # only needed for offline validation
+    from zatodeploy.analyzer import ServiceAnalyzer
+    from zatodeploy.discovery import ModuleFinder
+
+    modules = ModuleFinder().find(config.get('modules', ''))
+    analyzer = ServiceAnalyzer(config.get('cache_dir'))
+    services = set()
+
+    for module, names in analyzer.get_all_service_names(modules).items():
+        if names is None:
+            log.warning("Services of module '%s' are unknown.", module)
+        services.update(name for name in names or () if name)
+
+    analyzer.save()
+    log.debug("Services defined in service modules: %s",
+              ", ".join(sorted(services)))
+
+    if exists(secdefs_file):
+        secdefs = [Bunch(name=secdef.get('name', ident), id=ident)
+                   for ident, secdef in read_ini_config(secdefs_file).items()]
+    else:
+        log.warning("Security definitions file '%s' not found. Security "
+                    "definitions of channels are not checked.", secdefs_file)
+        secdefs = None
+
+    return HTTPSOAPIndex(), services, secdefs
+
+
+def get_cluster_inventory(config):
+    """Return inventory of the cluster for validating channels.
+
+    Returns a tuple of the index of existing channels, the set of names of
+    existing (non-internal) services and the security definitions.
+
+    """
+    existing_channels = get_http_soap_inventory(
+        config, ('channel',))['channel']
+    log.debug("Existing channels on zato cluster: %s",
+              ", ".join(existing_channels.by_name))
+
+    existing_services = set(srv.name for srv in
+                            get_service_list(config, '*'))
+    log.debug("Existing (non-internal) services on zato cluster: %s",
+              ", ".join(existing_services))
+
+    # fetch the security definitions only once for all channels
+    return existing_channels, existing_services, get_security_list(config)
+
+
+def select_channels(config, channels):
+    """Return identifiers of the channels to deploy to a target."""
+    idents = [ch.strip() for ch in config.get('channels', '').split(',')
+              if ch.strip()]
+    return list(channels.keys()) if idents == ['*'] else idents
+
+
+def plan_target(config, target_channels, args):
+    """Validate channels of a target against the cluster or offline.
+
+    Returns a tuple of the deployment plan (channels, existing channels and
+    security definitions) and the list of problems found.
+
+    """
+    if args.offline:
+        existing_channels, existing_services, secdefs = (
+            get_offline_inventory(config, args.secdefs))
+        if secdefs is None:
+            target_channels = [Bunch(channel, security_id=None)
+                               for channel in target_channels]
+    else:
+        existing_channels, existing_services, secdefs = (
+            get_cluster_inventory(config))
+
+    problems = validate_channels(config, target_channels, existing_channels,
+                                 existing_services, secdefs)
+    return (target_channels, existing_channels, secdefs), problems
+
+
 def main(args=None):
     """Main script entry point function.
 
@@ -111,6 +304,12 @@ def main(args=None):
         help="Deployment configuration settings file (default: %(default)s)")
     ap.add_argument('--channels', default="channels.conf",
         help="Channel definition file (default: %(default)s)")
+    ap.add_argument('--offline', action="store_true",
+        help="Only validate channels without contacting the cluster. "
+             "Services are predicted from the target's service modules.")
+    ap.add_argument('--secdefs', default="secdefs.conf",
+        help="Security definitions file used to check channel security "
+             "definitions with --offline (default: %(default)s)")
     ap.add_argument('targets', nargs="*",
         help="Deployment targets (default: all)")
 
@@ -143,6 +342,10 @@ def main(args=None):
         log.error(msg)
         return msg
 
+    # validate channels of all targets before making any changes
+    plans = []
+    problems = []
+
     for target in targets:
         if target not in config:
             msg = ("Deployment target '{}' not defined in deployment "
@@ -150,51 +353,44 @@ def main(args=None):
             log.error(msg)
             return msg
 
-        target_channels = [ch.strip()
-            for ch in config[target].get('channels', '').split(',')
-                if ch.strip()]
-
-        if target_channels == ['*']:
-            target_channels = list(channels.keys())
-
+        idents = select_channels(config[target], channels)
         log.debug("Channels for target '{}': {}".format(
-            target, ", ".join(target_channels)))
+            target, ", ".join(idents)))
+
+        if not idents:
+            log.info("No channels to create for target '{}'.".format(target))
+            continue
 
-        existing_channels = dict((ch.name, ch)
-                                 for ch in get_channel_list(config[target]))
-        log.debug("Existing channels on zato cluster: %s",
-                  ", ".join(existing_channels))
+        problems.extend("Channel '{}' for target '{}' not found in channel "
+                        "definitions".format(ident, target)
+                        for ident in idents if not channels.get(ident))
 
         config[target].setdefault('verbose', args.verbose)
+        plan, target_problems = plan_target(
+            config[target],
+            [channels[ident] for ident in idents if channels.get(ident)],
+            args)
+        problems.extend("Target '{}': {}".format(target, problem)
+                        for problem in target_problems)
+        plans.append((target,) + plan)
+
+    if problems:
+        for problem in problems:
+            log.error(problem)
+        msg = ("Validation of channels failed with {} problem(s). No changes "
+               "made.".format(len(problems)))
+        log.error(msg)
+        return msg
 
-        existing_services = [srv.name for srv in
-                             get_service_list(config[target], '*')]
-        log.debug("Existing (non-internal) services on zato cluster: %s",
-                  ", ".join(existing_services))
-
-        if target_channels:
-            for ident in target_channels:
-                channel = channels.get(ident)
-                if channel:
-                    service = channel.get('service')
-                    if service not in existing_services:
-                        raise ValueError("Channel '{}' references unknown "
-                            "service '{}'".format(channel.name, service))
-
-                    if channel.name in existing_channels:
-                        log.info("Channel '{}' already exists in zato "
-                                 "cluster. Updating.".format(channel.name))
-                        create_or_update_channel(config[target], channel,
-                            update=existing_channels[channel.name].id)
-                    else:
-                        create_or_update_channel(config[target], channel)
-                else:
-                    msg = ("Channel '{}' for target '{}' not found "
-                        "in channel definitions".format(ident, target))
-                    log.error(msg)
-                    return msg
-        else:
-            log.info("No channels to create for target '{}'.".format(target))
+    if args.offline:
+        log.info("Validation of channels successful.")
+        return
+
+    for target, target_channels, existing_channels, secdefs in plans:
+        run_concurrently(
+            partial(deploy_channel, config[target], existing_channels,
+                    secdefs),
+            target_channels, get_concurrency(config[target]))
 
 
 if __name__ == '__main__':
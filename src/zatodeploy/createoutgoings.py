@@ -18,12 +18,14 @@ import logging
 import re
 import sys
 
+from functools import partial
 from os.path import exists
 
 # do not use relative import here, because this module should be executable
 # as a command line script
-from zatodeploy.common import (find_security_id, get_outgoing_list,
+from zatodeploy.common import (find_security_id, get_http_soap_inventory,
     json_call, read_ini_config)
+from zatodeploy.executor import get_concurrency, run_concurrently
 
 
 log = logging.getLogger(__name__)
@@ -34,6 +36,9 @@ REQUIRED_FIELDS = {
         'transport', 'url_path'),
 }
 
+# options in outgoing definitions used only by the deployment scripts
+LOCAL_FIELDS = ('expected_rate',)
+
 
 def create_or_update_outgoing(config, outgoing, update=False):
     """Make a JSON-HTTP call to Zato to create/update an outgoing channel."""
@@ -52,6 +57,9 @@ def create_or_update_outgoing(config, outgoing, update=False):
     if update:
         data['id'] = update
 
+    for field in LOCAL_FIELDS:
+        data.pop(field, None)
+
     log.debug("Outgoing data: %r", data)
 
     # validate outgoing data
@@ -94,6 +102,17 @@ def create_or_update_outgoing(config, outgoing, update=False):
         outgoing['name'], res[response_name].id, method))
 
 
+def deploy_outgoing(config, existing_outgoings, outgoing):
+    """Create outgoing or update it if it is in existing_outgoings."""
+    if outgoing.name in existing_outgoings:
+        log.info("Outgoing '{}' already exists in zato cluster. "
+                 "Updating.".format(outgoing.name))
+        create_or_update_outgoing(config, outgoing,
+            update=existing_outgoings[outgoing.name].id)
+    else:
+        create_or_update_outgoing(config, outgoing)
+
+
 def main(args=None):
     """Main script entry point function.
 
@@ -157,29 +176,25 @@ def main(args=None):
         log.debug("Outgoings for target '{}': {}".format(
             target, ", ".join(target_outgoings)))
 
-        existing_outgoings = dict((ch.name, ch)
-                                 for ch in get_outgoing_list(config[target]))
+        existing_outgoings = get_http_soap_inventory(
+            config[target], ('outgoing',))['outgoing']
         log.debug("Existing outgoings on zato cluster: %s",
-                  ", ".join(existing_outgoings))
+                  ", ".join(existing_outgoings.by_name))
 
         config[target].setdefault('verbose', args.verbose)
 
         if target_outgoings:
             for ident in target_outgoings:
-                outgoing = outgoings.get(ident)
-                if outgoing:
-                    if outgoing.name in existing_outgoings:
-                        log.info("Outgoing '{}' already exists in zato "
-                                 "cluster. Updating.".format(outgoing.name))
-                        create_or_update_outgoing(config[target], outgoing,
-                            update=existing_outgoings[outgoing.name].id)
-                    else:
-                        create_or_update_outgoing(config[target], outgoing)
-                else:
+                if not outgoings.get(ident):
                     msg = ("Outgoing '{}' for target '{}' not found "
                         "in outgoing definitions".format(ident, target))
                     log.error(msg)
                     return msg
+
+            run_concurrently(
+                partial(deploy_outgoing, config[target], existing_outgoings),
+                [outgoings[ident] for ident in target_outgoings],
+                get_concurrency(config[target]))
         else:
             log.info("No outgoings to create for target '{}'.".format(target))
 
@@ -17,12 +17,14 @@ import argparse
 import logging
 import sys
 
+from functools import partial
 from os.path import exists
 
 # do not use relative import here, because this module should be executable
 # as a command line script
 from zatodeploy.common import (get_security_list, json_call,
     read_ini_config)
+from zatodeploy.executor import get_concurrency, run_concurrently
 
 
 log = logging.getLogger(__name__)
@@ -65,6 +67,17 @@ def create_or_update_secdef(config, secdef, update=False):
         log.info("Security definition '%s' password updated.", secdef['name'])
 
 
+def deploy_secdef(config, existing_secdefs, secdef):
+    """Create secdef or update it if it is in existing_secdefs."""
+    if secdef.name in existing_secdefs:
+        log.info("Security definition '%s' already exists in zato cluster. "
+                 "Updating.", secdef.name)
+        create_or_update_secdef(config, secdef,
+            update=existing_secdefs[secdef.name].id)
+    else:
+        create_or_update_secdef(config, secdef)
+
+
 def main(args=None):
     """Main script entry point function.
 
@@ -138,20 +151,16 @@ def main(args=None):
 
         if target_secdefs:
             for ident in target_secdefs:
-                secdef = secdefs.get(ident)
-                if secdef:
-                    if secdef.name in existing_secdefs:
-                        log.info("Security definition '%s' already exists in "
-                                 "zato cluster. Updating.", secdef.name)
-                        create_or_update_secdef(config[target], secdef,
-                            update=existing_secdefs[secdef.name].id)
-                    else:
-                        create_or_update_secdef(config[target], secdef)
-                else:
+                if not secdefs.get(ident):
                     msg = ("Security definition '{}' for target '{}' not found"
                            " in definitions".format(ident, target))
                     log.error(msg)
                     return msg
+
+            run_concurrently(
+                partial(deploy_secdef, config[target], existing_secdefs),
+                [secdefs[ident] for ident in target_secdefs],
+                get_concurrency(config[target]))
         else:
             log.info("No security definitions to create for target '%s'.",
                      target)
@@ -41,9 +41,12 @@ import fnmatch
 import logging
 import sys
 
+from functools import partial
+
 # do not use relative import here, because this module should be executable
 # as a command line script
-from zatodeploy.common import (get_service_list, json_call, read_ini_config)
+from zatodeploy.common import iter_service_list, json_call, read_ini_config
+from zatodeploy.executor import get_concurrency, run_concurrently
 
 
 log = logging.getLogger(__name__)
@@ -112,10 +115,6 @@ def main(args=None):
             log.error(msg)
             return msg
 
-        existing_services = get_service_list(config[target])
-        log.debug("Existing (non-internal) services on zato cluster: %s",
-                  ", ".join(srv.name for srv in existing_services))
-
         patterns = [ptn.strip()
             for ptn in config[target].get('services', '').split(',')
                 if ptn.strip()]
@@ -123,11 +122,14 @@ def main(args=None):
         log.debug("Service patterns for target '{}': {}".format(
             target, ", ".join(patterns)))
 
+        # match services while the listing is still being received
         target_services = set()
-        for service in existing_services:
+        for service in iter_service_list(config[target]):
+            log.debug("Existing service on zato cluster: %s", service.name)
             for ptn in patterns:
                 if fnmatch.fnmatch(service.name, ptn):
                     target_services.add((service.name, service.id))
+                    break
 
         log.debug("Services matching patterns for target '{}': {}".format(
             target, ", ".join(srv[0] for srv in target_services)))
@@ -135,8 +137,9 @@ def main(args=None):
         config[target].setdefault('verbose', args.verbose)
 
         if target_services:
-            for name, id_ in target_services:
-                delete_service(config[target], id_)
+            run_concurrently(partial(delete_service, config[target]),
+                             [srv[1] for srv in target_services],
+                             get_concurrency(config[target]))
         else:
             log.info("No services to delete for target '{}'.".format(target))
 
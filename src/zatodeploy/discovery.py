@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/discovery.py
+#
+"""Discovery of service module files matching glob patterns.
+
+Patterns support the usual shell wildcards (``*``, ``?``, ``[...]``) and in
+addition ``**``, which matches any number of directory levels. A pattern
+starting with ``!`` excludes files matching the rest of the pattern from the
+result.
+
+As with ``glob``, wildcards do not match names starting with a dot, and
+symlinked directories are followed (except links back to a directory
+containing them).
+
+Each directory tree is walked only once per ``ModuleFinder`` instance, no
+matter how many patterns or deployment targets refer to it.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import os
+import re
+
+from os.path import isfile, join, normpath, realpath
+
+try:
+    basestring_types = basestring
+except NameError:
+    # Python 3
+    basestring_types = str
+
+
+__all__ = (
+    'ModuleFinder',
+    'pattern_root',
+    'split_patterns'
+)
+
+log = logging.getLogger(__name__)
+
+MAGIC_CHARS = re.compile(r'[*?[]')
+# regex matching a file or directory name not starting with a dot
+VISIBLE_NAME = r'(?!\.)[^/]+'
+
+
+def split_patterns(value):
+    """Split comma-separated list of patterns and remove empty entries."""
+    return [ptn.strip() for ptn in value.split(',') if ptn.strip()]
+
+
+def _translate_name(part):
+    """Translate a glob pattern for a single path component into a regex."""
+    res = []
+    i, n = 0, len(part)
+
+    while i < n:
+        c = part[i]
+        if c == '*':
+            res.append('[^/]*')
+        elif c == '?':
+            res.append('[^/]')
+        elif c == '[':
+            j = part.find(']', i + 2 if part[i + 1:i + 2] in '!]' else i + 1)
+            if j == -1:
+                res.append(re.escape(c))
+            else:
+                chars = part[i + 1:j].replace('\\', '\\\\')
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                res.append('[%s]' % chars)
+                i = j
+        else:
+            res.append(re.escape(c))
+        i += 1
+
+    # like glob, wildcards do not match the leading dot of hidden names
+    if MAGIC_CHARS.match(part):
+        res.insert(0, '(?!\\.)')
+
+    return ''.join(res)
+
+
+def _translate(pattern):
+    """Translate a glob pattern with '**' support into a compiled regex.
+
+    As with glob, hidden files and directories (names starting with a dot)
+    are only matched by pattern components starting with a dot, so neither
+    ``*`` nor ``**`` descend into them.
+
+    """
+    parts = pattern.split('/')
+    res = []
+
+    for i, part in enumerate(parts):
+        last = i == len(parts) - 1
+
+        if part == '**' and last:
+            res.append('%s(?:/%s)*' % (VISIBLE_NAME, VISIBLE_NAME))
+        elif part == '**':
+            # any number of directory levels, including none
+            res.append('(?:%s/)*' % VISIBLE_NAME)
+        else:
+            res.append(_translate_name(part) + ('' if last else '/'))
+
+    return re.compile('(?s)%s\\Z' % ''.join(res))
+
+
+def _split_root(pattern):
+    """Split pattern into leading directory without wildcards and the rest.
+
+    Returns (root, rest, depth), where depth is the number of directory
+    levels below root the rest of the pattern can match or None for any.
+
+    """
+    parts = normpath(pattern).lstrip('/').split('/')
+    root = []
+
+    while len(parts) > 1 and not MAGIC_CHARS.search(parts[0]):
+        root.append(parts.pop(0))
+
+    root = '/'.join(root)
+    if pattern.startswith('/'):
+        root = '/' + root
+
+    rest = '/'.join(parts)
+    depth = None if '**' in rest else len(parts) - 1
+    return root, rest, depth
+
+
+def pattern_root(pattern):
+    """Return the directory below which all files matching pattern are."""
+    pattern = pattern.lstrip('!')
+
+    if not MAGIC_CHARS.search(pattern):
+        return os.path.dirname(pattern) or '.'
+
+    return _split_root(pattern)[0] or '.'
+
+
+class ModuleFinder(object):
+    """Find files matching glob patterns with cached directory walks."""
+
+    def __init__(self):
+        """Set up empty cache of directory listings."""
+        self._trees = {}
+
+    def clear(self):
+        """Discard cached directory listings, e.g. after files changed."""
+        self._trees.clear()
+
+    def _list_files(self, root, depth):
+        """Return paths of files below root (relative to root).
+
+        Only descends depth directory levels, or all levels if depth is None.
+        Listings are cached and reused for requests of the same or a lower
+        depth.
+
+        """
+        cached = self._trees.get(root)
+        if cached and (cached[0] is None or
+                       (depth is not None and depth <= cached[0])):
+            return cached[1]
+
+        log.debug("Scanning directory '%s'.", root or '.')
+        files = []
+        top = root or '.'
+        # follow symlinked directories like glob, except links to a
+        # directory containing them, which would make the walk loop forever
+        for dirpath, dirnames, filenames in os.walk(top, followlinks=True):
+            rel = os.path.relpath(dirpath, top)
+            rel = '' if rel == '.' else rel + '/'
+            files.extend(rel + name for name in filenames)
+
+            if depth is not None and rel.count('/') >= depth:
+                del dirnames[:]
+
+            current = join(realpath(dirpath), '')
+            dirnames[:] = [name for name in dirnames if not current.startswith(
+                join(realpath(join(dirpath, name)), ''))]
+
+        self._trees[root] = (depth, files)
+        return files
+
+    def _match(self, pattern):
+        """Return set of file paths matching a single pattern."""
+        if not MAGIC_CHARS.search(pattern):
+            return set([pattern]) if isfile(pattern) else set()
+
+        root, rest, depth = _split_root(pattern)
+        regex = _translate(rest)
+        return set(join(root, path) if root else path
+                   for path in self._list_files(root, depth)
+                   if regex.match(path))
+
+    def find(self, patterns):
+        """Return sorted list of files matching any of the patterns.
+
+        Patterns starting with '!' exclude matching files. Each file is
+        contained in the result only once.
+
+        """
+        if isinstance(patterns, basestring_types):
+            patterns = split_patterns(patterns)
+
+        included = set()
+        excluded = set()
+
+        for pattern in patterns:
+            if pattern.startswith('!'):
+                excluded.update(self._match(pattern[1:]))
+            else:
+                included.update(self._match(pattern))
+
+        return sorted(included - excluded)
@@ -0,0 +1,234 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/executor.py
+#
+"""Shared execution core for the deployment stages.
+
+Provides bounded concurrent execution of per-object operations (e.g. creating
+channels or uploading modules) and execution of deployment stages as a
+dependency graph, where independent stages run in parallel.
+
+The number of operations run in parallel is set with the ``concurrency``
+option in the deployment configuration (default: 1, i.e. objects are
+processed one after another in the order listed). The calls to the Zato admin
+API of all operations and stages are only limited by the cluster's adaptive
+limiter once the cluster gets overloaded. With ``concurrency: auto``, up to
+``max_concurrency`` operations are run in parallel and the number of calls
+actually in flight is adapted to the load of the cluster from the start (see
+``zatodeploy.limiter``).
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import threading
+
+from multiprocessing.pool import ThreadPool
+
+try:
+    import Queue as queue
+except ImportError:
+    # Python 3
+    import queue
+
+
+__all__ = (
+    'DEFAULT_CONCURRENCY',
+    'DEFAULT_MAX_CONCURRENCY',
+    'Stage',
+    'StageError',
+    'get_concurrency',
+    'order_stages',
+    'run_concurrently',
+    'run_stages'
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 1
+# upper bound of concurrent operations with 'concurrency: auto'
+DEFAULT_MAX_CONCURRENCY = 32
+
+
+class StageError(Exception):
+    """Raised when a deployment stage fails or stages can not be ordered."""
+
+
+class Stage(object):
+    """A deployment stage with the names of the stages it depends on."""
+
+    def __init__(self, name, func, requires=()):
+        """Set up stage, which runs func(args) when executed."""
+        self.name = name
+        self.func = func
+        self.requires = tuple(requires)
+
+    def __repr__(self):
+        return "Stage(%r, requires=%r)" % (self.name, self.requires)
+
+    def run(self, args):
+        """Execute stage function and raise StageError if it fails.
+
+        Stage functions follow the convention of the script entry points and
+        return a true value (usually an error message) on failure.
+
+        """
+        log.debug("Running stage '%s'.", self.name)
+        try:
+            res = self.func(args)
+        except Exception as exc:
+            log.exception("Stage '%s' raised an exception.", self.name)
+            raise StageError("Stage '{}' failed: {}".format(self.name, exc))
+
+        if res:
+            raise StageError("Stage '{}' failed: {}".format(self.name, res))
+
+
+def get_concurrency(config):
+    """Return number of concurrent operations configured for a target."""
+    concurrency = config.get('concurrency') or DEFAULT_CONCURRENCY
+
+    if concurrency == 'auto':
+        concurrency = (config.get('max_concurrency') or
+                       DEFAULT_MAX_CONCURRENCY)
+
+    return max(1, int(concurrency))
+
+
+def run_concurrently(func, items, concurrency=DEFAULT_CONCURRENCY):
+    """Call func for each item with at most concurrency calls in flight.
+
+    Returns the list of results in the order of items. If any call raises an
+    exception, it is re-raised in the calling thread.
+
+    """
+    items = list(items)
+
+    if concurrency <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+
+    pool = ThreadPool(min(concurrency, len(items)))
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def order_stages(stages):
+    """Return stages sorted so that each stage follows its dependencies.
+
+    Raises StageError on unknown dependencies or dependency cycles.
+
+    """
+    by_name = dict((stage.name, stage) for stage in stages)
+    ordered = []
+    done = set()
+    visiting = set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise StageError(
+                "Dependency cycle involving stage '{}'.".format(stage.name))
+
+        visiting.add(stage.name)
+        for name in stage.requires:
+            if name not in by_name:
+                raise StageError("Stage '{}' requires unknown stage "
+                                 "'{}'.".format(stage.name, name))
+            visit(by_name[name])
+        visiting.remove(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+
+    return ordered
+
+
+def _run_stage(stage, args, results):
+    """Run stage and put (stage, error or None) on results queue."""
+    # a result must be put on the queue for every stage, even if it exits
+    # (e.g. argparse calling sys.exit), or run_stages waits forever
+    try:
+        stage.run(args)
+    except StageError as exc:
+        results.put((stage, exc))
+    except BaseException as exc:
+        log.exception("Stage '%s' raised an exception.", stage.name)
+        results.put((stage, StageError("Stage '{}' failed: {!r}".format(
+            stage.name, exc))))
+    else:
+        results.put((stage, None))
+
+
+def _start_ready_stages(pending, done, args, results):
+    """Start pending stages whose dependencies are done in threads.
+
+    Removes the started stages from pending and returns their names.
+
+    """
+    started = []
+
+    for stage in [stage for stage in pending
+                  if done.issuperset(stage.requires)]:
+        pending.remove(stage)
+        thread = threading.Thread(target=_run_stage,
+                                  args=(stage, args, results),
+                                  name='stage-%s' % stage.name)
+        thread.daemon = True
+        thread.start()
+        started.append(stage.name)
+
+    return started
+
+
+def run_stages(stages, args):
+    """Run deployment stages as soon as the stages they require have finished.
+
+    Stages whose dependencies are satisfied run in parallel. After a stage
+    fails no further stages are started, but stages already running are
+    allowed to finish.
+
+    Returns None on success or an error message.
+
+    """
+    try:
+        pending = order_stages(stages)
+    except StageError as exc:
+        log.error("%s", exc)
+        return str(exc)
+
+    results = queue.Queue()
+    done = set()
+    running = set()
+    errors = []
+
+    while pending or running:
+        if not errors:
+            running.update(_start_ready_stages(pending, done, args, results))
+
+        if not running:
+            break
+
+        stage, error = results.get()
+        running.remove(stage.name)
+
+        if error:
+            log.error("%s", error)
+            errors.append(str(error))
+        else:
+            log.debug("Stage '%s' finished.", stage.name)
+            done.add(stage.name)
+
+    if errors:
+        skipped = [stage.name for stage in pending]
+        if skipped:
+            log.error("Skipped stages: %s", ", ".join(skipped))
+        return "\n".join(errors)
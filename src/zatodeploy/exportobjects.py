@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/exportobjects.py
+#
+"""Command line script to export Zato cluster objects to definition files.
+
+Writes the channels, outgoings and HTTP Basic Auth security definitions of
+the cluster of a deployment target to ``channels.conf``, ``outgoings.conf``
+and ``secdefs.conf`` in the output directory, in the format read by the other
+deployment scripts. The names of the deployed services are written to
+``services.txt``. With ``--format jsonl``, one JSON object per line is written
+to ``.jsonl`` files instead.
+
+Objects and options are sorted by name, so exports of different clusters or
+points in time can be compared with ``diff``. Passwords of security
+definitions can not be exported and must be added before the files are used
+for deployment.
+
+In INI files, '%' in values is written as '%%'. Section names are derived
+from the object names, which are kept in the ``name`` option, with ']'
+replaced. Objects with line breaks in a value can only be exported with
+``--format jsonl``.
+
+Run ``zato-exportobjects -h`` for usage help.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+
+from os.path import exists, join
+
+# do not use relative import here, because this module should be executable
+# as a command line script
+from zatodeploy.common import (get_basic_auth_list, get_http_soap_inventory,
+    get_service_list, read_ini_config)
+from zatodeploy.executor import run_concurrently
+
+
+log = logging.getLogger(__name__)
+
+# fields of listed objects to export and the option names to export them as
+CHANNEL_FIELDS = (
+    ('name', 'name'),
+    ('connection', 'connection'),
+    ('transport', 'transport'),
+    ('service_name', 'service'),
+    ('url_path', 'url_path'),
+    ('method', 'method'),
+    ('data_format', 'data_format'),
+    ('soap_action', 'soap_action'),
+    ('soap_version', 'soap_version'),
+    ('security_name', 'security_id'),
+    ('is_active', 'is_active'),
+)
+OUTGOING_FIELDS = (
+    ('name', 'name'),
+    ('connection', 'connection'),
+    ('transport', 'transport'),
+    ('host', 'host'),
+    ('url_path', 'url_path'),
+    ('ping_method', 'ping_method'),
+    ('pool_size', 'pool_size'),
+    ('timeout', 'timeout'),
+    ('soap_action', 'soap_action'),
+    ('soap_version', 'soap_version'),
+    ('security_name', 'security_id'),
+    ('is_active', 'is_active'),
+)
+SECDEF_FIELDS = (
+    ('name', 'name'),
+    ('username', 'username'),
+    ('realm', 'realm'),
+    ('is_active', 'is_active'),
+)
+# sections with a special meaning in the INI files read by read_ini_config
+RESERVED_SECTIONS = ('DEFAULT', 'include')
+
+
+def to_definition(obj, fields):
+    """Return dictionary of exported options of a listed object."""
+    res = {}
+    for field, option in fields:
+        value = obj.get(field)
+        if value is None or value == '':
+            continue
+        if isinstance(value, bool):
+            value = 'true' if value else 'false'
+        res[option] = '%s' % value
+    return res
+
+
+def get_inventory(config):
+    """Fetch all objects of the cluster concurrently.
+
+    Returns a dictionary with lists of channels, outgoings, security
+    definitions and services.
+
+    """
+    fetchers = (
+        ('http_soap', lambda: get_http_soap_inventory(config)),
+        ('secdefs', lambda: get_basic_auth_list(config)),
+        ('services', lambda: get_service_list(config)),
+    )
+    results = dict(zip([name for name, _ in fetchers],
+        run_concurrently(lambda fetcher: fetcher[1](), fetchers, 3)))
+    http_soap = results.pop('http_soap')
+    results['channels'] = list(http_soap['channel'])
+    results['outgoings'] = list(http_soap['outgoing'])
+    return results
+
+
+def ini_value(value):
+    """Return value escaped for the INI files read by ``read_ini_config``.
+
+    Raises ValueError if the value contains a line break, which the INI
+    format can not represent.
+
+    """
+    if '\n' in value or '\r' in value:
+        raise ValueError("Value {!r} contains a line break.".format(value))
+    # values are read with interpolation, so a literal '%' must be doubled
+    return value.replace('%', '%%')
+
+
+def ini_sections(names):
+    """Return list of unique INI section names for the object names.
+
+    The name of an object is also written in its 'name' option, so the
+    section name does not need to be the same. Characters not allowed in
+    section names are replaced and names clashing with special sections or
+    other section names get a numeric suffix.
+
+    """
+    taken = set(RESERVED_SECTIONS)
+    sections = []
+
+    for name in names:
+        section = name.replace(']', '_')
+        candidate, n = section, 1
+        while candidate in taken:
+            n += 1
+            candidate = '%s-%i' % (section, n)
+        taken.add(candidate)
+        sections.append(candidate)
+
+    return sections
+
+
+def write_ini(filename, definitions):
+    """Write definitions sorted by name to INI file.
+
+    Raises ValueError if a definition can not be written (see ``ini_value``).
+
+    """
+    definitions = sorted(definitions, key=lambda d: d['name'])
+    sections = ini_sections([definition['name'] for definition in definitions])
+
+    with io.open(filename, 'w', encoding='utf-8') as fp:
+        for i, (section, definition) in enumerate(zip(sections,
+                                                      definitions)):
+            if i:
+                fp.write('\n')
+            fp.write('[%s]\n' % section)
+            for option in sorted(definition):
+                try:
+                    value = ini_value(definition[option])
+                except ValueError as exc:
+                    raise ValueError("Can not export option '{}' of '{}': {}"
+                                     .format(option, definition['name'], exc))
+                fp.write('%s: %s\n' % (option, value))
+
+
+def write_jsonl(filename, definitions):
+    """Write definitions sorted by name to file as JSON lines."""
+    with io.open(filename, 'w', encoding='utf-8') as fp:
+        for definition in sorted(definitions, key=lambda d: d['name']):
+            fp.write('%s\n' % json.dumps(definition, sort_keys=True))
+
+
+def export_objects(inventory, output_dir, fmt='ini', include_internal=False):
+    """Write definition files for inventory to output_dir.
+
+    Returns list of the written filenames.
+
+    """
+    def public(objs):
+        return [obj for obj in objs
+                if include_internal or not obj.get('is_internal')]
+
+    files = (
+        ('channels', [to_definition(obj, CHANNEL_FIELDS)
+                      for obj in public(inventory['channels'])]),
+        ('outgoings', [to_definition(obj, OUTGOING_FIELDS)
+                       for obj in public(inventory['outgoings'])]),
+        ('secdefs', [to_definition(obj, SECDEF_FIELDS)
+                     for obj in inventory['secdefs']]),
+    )
+
+    if not exists(output_dir):
+        os.makedirs(output_dir)
+
+    filenames = []
+    for name, definitions in files:
+        if fmt == 'jsonl':
+            filename = join(output_dir, '%s.jsonl' % name)
+            write_jsonl(filename, definitions)
+        else:
+            filename = join(output_dir, '%s.conf' % name)
+            write_ini(filename, definitions)
+        filenames.append(filename)
+
+    services = sorted(srv.name for srv in public(inventory['services']))
+    filename = join(output_dir,
+                    'services.jsonl' if fmt == 'jsonl' else 'services.txt')
+    with io.open(filename, 'w', encoding='utf-8') as fp:
+        for name in services:
+            fp.write('%s\n' % (json.dumps(dict(name=name))
+                               if fmt == 'jsonl' else name))
+    filenames.append(filename)
+
+    return filenames
+
+
+def main(args=None):
+    """Main script entry point function.
+
+    Parses command line arguments and configuration file and exports the
+    objects of the cluster of the requested deployment target.
+
+    """
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-v', '--verbose', action="store_true",
+        help="Enable verbose output")
+    ap.add_argument('-c', '--config', default="deploy.conf",
+        help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('-o', '--output-dir', default="export",
+        help="Directory to write definition files to (default: %(default)s)")
+    ap.add_argument('-f', '--format', choices=('ini', 'jsonl'), default='ini',
+        help="Format of definition files (default: %(default)s)")
+    ap.add_argument('--include-internal', action="store_true",
+        help="Also export internal Zato channels, outgoings and services")
+    ap.add_argument('target', nargs="?",
+        help="Deployment target (default: first target)")
+
+    args = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    if args.verbose:
+        loglevel = logging.DEBUG
+    else:
+        loglevel = logging.INFO
+
+    logging.basicConfig(level=loglevel)
+
+    config = read_ini_config(args.config)
+    log.debug("Deployment configuration:\n%s", config)
+    target = args.target or next((k for k in config if k != 'zato'), None)
+
+    if target not in config:
+        msg = ("Deployment target '{}' not defined in deployment "
+               "configuration.".format(target))
+        log.error(msg)
+        return msg
+
+    inventory = get_inventory(config[target])
+    try:
+        filenames = export_objects(inventory, args.output_dir, args.format,
+                                   args.include_internal)
+    except ValueError as exc:
+        log.error("%s", exc)
+        return str(exc)
+
+    for filename in filenames:
+        log.info("Wrote '%s'.", filename)
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
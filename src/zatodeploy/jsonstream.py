@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/jsonstream.py
+#
+"""Incremental decoding of JSON arrays in large service responses.
+
+Listing services of the Zato admin API return a JSON object with the listed
+objects in an array, e.g.::
+
+    {"zato_env": {...}, "zato_service_get_list_response": [{...}, {...}]}
+
+``JSONArrayStream`` decodes the items of such an array one after another
+while the response text is still being received, so consumers can process
+items as they arrive and the complete response is never held in memory.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import json
+import re
+
+
+__all__ = (
+    'JSONArrayStream',
+)
+
+_WS = re.compile(r'[\s,]*')
+# separator following a complete array item
+_SEP = re.compile(r'\s*[,\]]')
+
+
+class JSONArrayStream(object):
+    """Iterate over the items of the array under key in a JSON text stream.
+
+    chunks is an iterable of text chunks forming a JSON object. After the
+    iteration is complete, ``rest`` contains the text of the object with the
+    array left out, i.e. the other members, which can be searched with
+    ``find_member``.
+
+    Raises ValueError if the text is not valid JSON or the array is not found.
+
+    """
+
+    def __init__(self, chunks, key):
+        """Set up stream of array items under key in chunks of JSON text."""
+        self.chunks = iter(chunks)
+        self.key = key
+        self.rest = ''
+        self._start = re.compile(r'"%s"\s*:\s*\[' % re.escape(key))
+        self._decoder = json.JSONDecoder()
+
+    def _read(self):
+        for chunk in self.chunks:
+            if chunk:
+                return chunk
+        return None
+
+    def __iter__(self):
+        buf = ''
+
+        # read up to the opening bracket of the array
+        while True:
+            match = self._start.search(buf)
+            if match:
+                break
+            chunk = self._read()
+            if chunk is None:
+                self.rest = buf
+                raise ValueError("No array '{}' found in JSON response".format(
+                    self.key))
+            buf += chunk
+
+        head = buf[:match.start()]
+        # items are decoded at offset pos; the decoded text is only cut off
+        # the buffer when the next chunk is appended, not after every item
+        pos = match.end()
+
+        while True:
+            pos = _WS.match(buf, pos).end()
+
+            if pos < len(buf) and buf[pos] == ']':
+                pos += 1
+                break
+
+            try:
+                item, end = self._decoder.raw_decode(buf, pos)
+            except ValueError:
+                end = None
+
+            # item incomplete or not yet followed by a separator, e.g. a
+            # number, which may continue in the next chunk
+            if end is None or not _SEP.match(buf, end):
+                chunk = self._read()
+                if chunk is None:
+                    # raises ValueError if the item is malformed
+                    self._decoder.raw_decode(buf, pos)
+                    raise ValueError("Array '{}' malformed or not terminated "
+                                     "in JSON response".format(self.key))
+                buf = buf[pos:] + chunk
+                pos = 0
+                continue
+
+            pos = end
+            yield item
+
+        tail = [buf[pos:]]
+        while True:
+            chunk = self._read()
+            if chunk is None:
+                break
+            tail.append(chunk)
+
+        self.rest = head + '"%s": null' % self.key + ''.join(tail)
+
+    def find_member(self, name):
+        """Return value of object member name outside of the array or None."""
+        match = re.search(r'"%s"\s*:\s*' % re.escape(name), self.rest)
+        if match:
+            try:
+                return self._decoder.raw_decode(self.rest, match.end())[0]
+            except ValueError:
+                return None
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/limiter.py
+#
+"""Adaptive limit of concurrent calls to the Zato admin API.
+
+All calls to the admin API of a Zato cluster (identified by load balancer
+address and cluster ID) share one ``AdaptiveLimiter``. It bounds the number
+of calls in flight and adjusts the bound with AIMD (additive increase,
+multiplicative decrease):
+
+* while the latency of the calls stays flat, the limit grows by one for
+  about every ``limit`` successful calls made with all slots in use;
+* when the latency rises above ``tolerance`` times the no-load latency of
+  the service called, or a call times out or gets a 5xx response, the limit
+  is multiplied by ``backoff``. Calls started before the last decrease do
+  not decrease the limit again, so one overload only backs off once.
+
+The no-load latency is tracked per service, since e.g. uploading a package
+takes much longer than deleting a channel. It is the lowest latency seen,
+slowly following higher latencies of calls made while not all slots were in
+use, so a cluster which got slower for other reasons does not stay throttled.
+
+With a numeric ``concurrency`` option, each script already runs at most that
+many operations per target, but stages running in parallel and the
+concurrent listings of ``get_http_soap_inventory`` add up. So the limiter
+does not bound the calls at first. On the first overload, the limit is set
+to the most calls seen in flight times ``backoff`` and from then on adapted as
+above. With ``concurrency: auto``, the limit starts at
+``DEFAULT_INITIAL_LIMIT`` and grows up to ``max_concurrency``.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import threading
+import time
+
+# local modules
+from .executor import get_concurrency
+
+
+__all__ = (
+    'AdaptiveLimiter',
+    'get_limiter'
+)
+
+log = logging.getLogger(__name__)
+
+# initial limit with 'concurrency: auto', enough for the concurrent listings
+# of common.get_http_soap_inventory
+DEFAULT_INITIAL_LIMIT = 4
+DEFAULT_BACKOFF = 0.5
+DEFAULT_TOLERANCE = 2.0
+# latency increases below this many seconds are never taken as overload
+LATENCY_SLACK = 0.02
+# weight of a new sample in the smoothed latency
+SMOOTHING = 0.2
+# rate at which the no-load latency follows higher latencies of calls made
+# while not all slots were in use
+BASELINE_DRIFT = 0.001
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class _Latency(object):
+    """Smoothed and no-load latency of calls to one service."""
+
+    __slots__ = ('baseline', 'smoothed')
+
+    def __init__(self, sample):
+        self.baseline = sample
+        self.smoothed = sample
+
+    def update(self, sample, drift=True):
+        self.smoothed += SMOOTHING * (sample - self.smoothed)
+
+        if sample < self.baseline:
+            self.baseline = sample
+        elif drift:
+            self.baseline += BASELINE_DRIFT * (sample - self.baseline)
+
+
+class AdaptiveLimiter(object):
+    """Bound number of concurrent calls and adapt it to the latency."""
+
+    def __init__(self, initial=DEFAULT_INITIAL_LIMIT, min_limit=1,
+                 max_limit=None, backoff=DEFAULT_BACKOFF,
+                 tolerance=DEFAULT_TOLERANCE, name='limiter'):
+        """Set up limiter starting with initial concurrent calls.
+
+        If initial is None, calls are not limited until the first overload.
+        If max_limit is None, the limit can grow without bound.
+
+        """
+        self.min_limit = min_limit
+        self.max_limit = (None if max_limit is None
+                          else max(max_limit, min_limit))
+        self.limit = None
+
+        if initial is not None:
+            self.limit = float(max(initial, min_limit))
+            if self.max_limit is not None:
+                self.limit = min(self.limit, self.max_limit)
+
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.name = name
+        self.in_flight = 0
+        self.peak = 0
+        self._latencies = {}
+        self._last_decrease = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot and return the time the call started."""
+        with self._cond:
+            while self._saturated():
+                self._cond.wait()
+
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return time.time()
+
+    def release(self, started, kind=None, latency=None, overload=False):
+        """Free slot of call started at given time and adapt the limit.
+
+        kind names the service called. latency defaults to the time since
+        started. Pass overload=True for calls which timed out or got a 5xx
+        response.
+
+        """
+        now = time.time()
+
+        if latency is None:
+            latency = now - started
+
+        with self._cond:
+            saturated = self._saturated()
+            self.in_flight -= 1
+
+            if not overload:
+                stats = self._latencies.get(kind)
+
+                if stats is None:
+                    self._latencies[kind] = _Latency(latency)
+                else:
+                    stats.update(latency, drift=not saturated)
+                    overload = (stats.smoothed > stats.baseline *
+                                self.tolerance + LATENCY_SLACK)
+
+            if overload:
+                if started >= self._last_decrease:
+                    self._decrease(now)
+            elif saturated:
+                limit = self.limit + 1 / self.limit
+                self.limit = (limit if self.max_limit is None
+                              else min(self.max_limit, limit))
+
+            self._cond.notify_all()
+
+    def _saturated(self):
+        return self.limit is not None and self.in_flight >= int(self.limit)
+
+    def _decrease(self, now):
+        # without a limit yet, start from the most calls seen in flight
+        current = self.peak if self.limit is None else self.limit
+        limit = max(self.min_limit, current * self.backoff)
+
+        if int(limit) < int(current):
+            log.debug("Overload of %s, reducing concurrent calls to %i.",
+                      self.name, int(limit))
+
+        self.limit = limit
+        self._last_decrease = now
+
+    def discard(self, started):
+        """Free slot of call started at given time without adapting limit.
+
+        For calls which failed for reasons not related to load.
+
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+
+def get_limiter(config):
+    """Return AdaptiveLimiter shared by all calls to cluster given by config.
+
+    The limiter is set up from the options of the first configuration it is
+    requested for. With ``concurrency: auto``, it starts at
+    DEFAULT_INITIAL_LIMIT calls and grows up to ``max_concurrency``.
+    Otherwise calls are not limited until the cluster gets overloaded.
+
+    """
+    key = '%s:%s/%s' % (config.lb_host, config.lb_port, config.cluster)
+
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+
+        if limiter is None:
+            if config.get('concurrency') == 'auto':
+                max_limit = get_concurrency(config)
+                initial = min(DEFAULT_INITIAL_LIMIT, max_limit)
+            else:
+                # the scripts bound the operations in parallel themselves
+                initial = max_limit = None
+
+            limiter = _limiters[key] = AdaptiveLimiter(
+                initial, max_limit=max_limit, name='cluster %s' % key)
+
+        return limiter
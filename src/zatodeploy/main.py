@@ -12,56 +12,420 @@
 from __future__ import absolute_import, print_function, unicode_literals
 
 # standard library
+import argparse
+import importlib
+import json
 import logging
 import os
 import sys
-import time
 
-from os.path import basename, exists, expanduser, join
+from os.path import abspath, basename, exists, expanduser, islink, join
 
 # local modules
-from .createchannels import main as create_channels
-from .createoutgoings import main as create_outgoings
-from .createsecdefs import main as create_secdefs
-from .storesettings import main as store_settings
-from .uploadmodules import main as upload_modules
+from .common import read_ini_config
+from .executor import Stage, get_concurrency, run_concurrently, run_stages
 
 # EXTRA_PATH
 ZATO_EXTRA_PATHS = "/opt/zato/1.1/zato_extra_paths/"
 EXTRA_PATHS_FILE = "extra_paths.txt"
 log = logging.getLogger(__name__)
 
+# defaults for rolling deployment health gates
+PROBE_COUNT = 10
+MAX_ERROR_RATE = 0.0
+MAX_LATENCY = 1.0
 
-def add_extra_paths_from_file():
-    """Link all modules listed in extra_paths.txt into zato_extra_paths."""
-    if exists(EXTRA_PATHS_FILE):
-        with open(EXTRA_PATHS_FILE, 'r') as fp:
-            for filepath in fp:
-                filepath = expanduser(filepath.rstrip())
-                symlink = join(ZATO_EXTRA_PATHS, basename(filepath))
-                if not exists(filepath):
-                    log.warning("Path listed in '%s' does not exist: %s "
-                        "Skipping it.", EXTRA_PATHS_FILE, filepath)
-                    continue
-                if not exists(symlink):
-                    os.symlink(filepath, symlink)
-                else:
-                    log.warning("Symlink '%s' already exists. Skipping it.",
-                        symlink)
+
+def read_extra_paths(filename=EXTRA_PATHS_FILE):
+    """Return dictionary mapping symlink names to paths listed in filename.
+
+    Paths are made absolute. Paths which do not exist are included, so their
+    symlinks are kept while they are temporarily missing.
+
+    """
+    paths = {}
+
+    with open(filename, 'r') as fp:
+        for filepath in fp:
+            filepath = expanduser(filepath.strip()).rstrip('/')
+            if not filepath:
+                continue
+            filepath = abspath(filepath)
+
+            name = basename(filepath)
+            if name in paths:
+                log.warning("Path '%s' listed in '%s' has the same name as "
+                    "'%s'. Skipping it.", filepath, filename, paths[name])
+                continue
+            paths[name] = filepath
+
+    return paths
+
+
+def get_manifest_path(directory=ZATO_EXTRA_PATHS):
+    """Return path of the manifest of symlinks created in directory.
+
+    The manifest is kept next to the directory, so Zato does not see it.
+
+    """
+    return directory.rstrip(os.sep) + '.zato-deploy.json'
+
+
+def read_manifest(filename):
+    """Return manifest mapping projects to the symlinks created for them.
+
+    Each project directory maps to a dictionary of symlink names and their
+    targets. Returns an empty dictionary if the file does not exist.
+
+    """
+    if not exists(filename):
+        return {}
+
+    with open(filename, 'r') as fp:
+        return json.load(fp)
+
+
+def write_manifest(filename, manifest):
+    """Atomically replace manifest file with the given manifest."""
+    tmpname = filename + '.tmp'
+
+    with open(tmpname, 'w') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+
+    os.rename(tmpname, filename)
+
+
+def _scan_extra_paths_dir(directory, dry_run=False):
+    """Return symlinks (name -> target) and other entry names in directory.
+
+    Creates the directory if it does not exist.
+
+    """
+    existing = {}
+    others = set()
+
+    if not exists(directory):
+        log.info("%s directory '%s'.",
+                 "Would create" if dry_run else "Creating", directory)
+        if not dry_run:
+            os.makedirs(directory)
+        return existing, others
+
+    for name in os.listdir(directory):
+        path = join(directory, name)
+        if islink(path):
+            existing[name] = os.readlink(path)
+        else:
+            others.add(name)
+
+    return existing, others
+
+
+def _remove_stale_links(directory, existing, owned, desired, dry_run=False):
+    """Remove symlinks created by the project which are no longer desired.
+
+    Only symlinks recorded in owned, which still point to the recorded
+    target, are removed.
+
+    """
+    for name in sorted(set(owned) - set(desired)):
+        if existing.get(name) != owned[name]:
+            log.debug("Symlink '%s' was changed or removed since it was "
+                      "created. Keeping it.", name)
+            continue
+
+        log.info("%s stale symlink '%s' -> '%s'.",
+                 "Would remove" if dry_run else "Removing", name,
+                 existing[name])
+        if not dry_run:
+            os.remove(join(directory, name))
+
+
+def _update_link(directory, name, filepath, existing, others, dry_run=False):
+    """Create or re-target symlink name in directory pointing to filepath.
+
+    Returns True if the symlink points to filepath afterwards.
+
+    """
+    symlink = join(directory, name)
+
+    if not exists(filepath):
+        log.warning("Path listed in '%s' does not exist: %s "
+            "Skipping it.", EXTRA_PATHS_FILE, filepath)
+        return existing.get(name) == filepath
+    elif name in others:
+        log.warning("'%s' exists and is not a symlink. Skipping it.",
+                    symlink)
+        return False
+    elif name not in existing:
+        log.info("%s symlink '%s' -> '%s'.",
+                 "Would create" if dry_run else "Creating", name,
+                 filepath)
+        if not dry_run:
+            os.symlink(filepath, symlink)
+    elif existing[name] != filepath:
+        log.info("%s symlink '%s' from '%s' to '%s'.",
+                 "Would re-target" if dry_run else "Re-targeting",
+                 name, existing[name], filepath)
+        if not dry_run:
+            os.remove(symlink)
+            os.symlink(filepath, symlink)
+
+    return True
+
+
+def sync_extra_paths(dry_run=False, directory=ZATO_EXTRA_PATHS):
+    """Sync symlinks in zato_extra_paths with the paths in extra_paths.txt.
+
+    Scans the directory once (creating it if it does not exist), then
+    creates missing links, re-targets links pointing elsewhere and removes
+    links which are no longer listed. The links pointing to the listed paths
+    are recorded per project (the directory of extra_paths.txt) in a
+    manifest next to the directory (see ``get_manifest_path``) and only
+    links recorded there for this project are ever removed. Links of listed
+    paths which do not exist at the moment and entries which are not
+    symlinks are never touched. With dry_run, the changes are only logged.
+
+    """
+    if not exists(EXTRA_PATHS_FILE):
+        return
+
+    desired = read_extra_paths()
+    project = os.path.dirname(abspath(EXTRA_PATHS_FILE))
+    manifest_file = get_manifest_path(directory)
+    manifest = read_manifest(manifest_file)
+    existing, others = _scan_extra_paths_dir(directory, dry_run)
+
+    _remove_stale_links(directory, existing, manifest.get(project, {}),
+                        desired, dry_run)
+
+    links = dict((name, filepath) for name, filepath in desired.items()
+                 if _update_link(directory, name, filepath, existing, others,
+                                 dry_run))
+
+    if not dry_run:
+        manifest[project] = links
+        write_manifest(manifest_file, manifest)
+
+
+# options of the deployment scripts accepted by this script and the stages
+# they are passed on to
+STAGE_OPTIONS = (
+    ('--secdefs', dict(default="secdefs.conf",
+        help="Security definitions file (default: %(default)s)"),
+     ('secdefs',)),
+    ('--outgoings', dict(default="outgoings.conf",
+        help="Outgoing definition file (default: %(default)s)"),
+     ('outgoings',)),
+    ('--channels', dict(default="channels.conf",
+        help="Channel definition file (default: %(default)s)"),
+     ('channels',)),
+    ('--no-check', dict(action="store_true",
+        help="Do not check modules for syntax errors before uploading"),
+     ('modules',)),
+)
+
+
+def stage_argv(stage, opts):
+    """Return command line arguments for the script of stage from opts."""
+    argv = ['-c', opts.config] + (['-v'] if opts.verbose else [])
+
+    for option, kwargs, stages in STAGE_OPTIONS:
+        if stage not in stages:
+            continue
+
+        value = getattr(opts, option.lstrip('-').replace('-', '_'))
+        if kwargs.get('action') == 'store_true':
+            argv.extend([option] if value else [])
+        else:
+            argv.extend([option, value])
+
+    return argv + list(opts.targets)
+
+
+def script_main(stage, name, extra_args=()):
+    """Return function running the main function of a deployment script.
+
+    The function is called with the options parsed by ``main`` and passes
+    the ones accepted by the script on to it, after extra_args. The script
+    module is only imported when the stage actually runs, so the startup of
+    this script does not pay for the dependencies of all stages.
+
+    """
+    def run(opts):
+        module = importlib.import_module('.' + name, __package__)
+        return module.main(list(extra_args) + stage_argv(stage, opts))
+
+    run.__name__ = str(name)
+    return run
+
+
+def link_extra_paths(opts):
+    """Run sync_extra_paths as a deployment stage."""
+    sync_extra_paths()
+
+
+# Deployment stages and the stages they depend on. Independent stages (e.g.
+# settings and security definitions) run in parallel.
+STAGES = (
+    Stage('extra-paths', link_extra_paths),
+    Stage('secdefs', script_main('secdefs', 'createsecdefs')),
+    Stage('settings', script_main('settings', 'storesettings')),
+    # outgoings may reference security definitions
+    Stage('outgoings', script_main('outgoings', 'createoutgoings'),
+          requires=('secdefs',)),
+    # service modules may import libraries from the extra paths; wait until
+    # their services are registered
+    Stage('modules', script_main('modules', 'uploadmodules', ['--wait']),
+          requires=('extra-paths',)),
+    # channels reference services and security definitions
+    Stage('channels', script_main('channels', 'createchannels'),
+          requires=('secdefs', 'modules')),
+)
+
+
+def probe_targets(config, channels, targets, count):
+    """Probe all channels of the given targets and return ProbeResults."""
+    # requests is only needed for rolling deployments
+    from .probe import probe_channel
+
+    probes = []
+
+    for target in targets:
+        idents = [ch.strip() for ch in
+                  config[target].get('channels', '').split(',') if ch.strip()]
+        if idents == ['*']:
+            idents = list(channels.keys())
+        probes.extend((config[target], channels[ident]) for ident in idents
+                      if ident in channels)
+
+    return run_concurrently(
+        lambda probe: probe_channel(probe[0], probe[1], count), probes,
+        max([get_concurrency(config[t]) for t in targets] or [1]))
+
+
+def check_health(results, max_error_rate, max_latency):
+    """Return list of problems for probe results exceeding the thresholds.
+
+    The latency threshold applies to the 95th percentile.
+
+    """
+    problems = []
+
+    for result in results:
+        p95 = result.percentile(95)
+        if result.error_rate > max_error_rate:
+            problems.append("Channel '{}' error rate {:.1%} exceeds "
+                            "{:.1%}.".format(result.name, result.error_rate,
+                                             max_error_rate))
+        if p95 is not None and p95 > max_latency:
+            problems.append("Channel '{}' p95 latency {:.3f} s exceeds "
+                            "{:.3f} s.".format(result.name, p95, max_latency))
+
+    return problems
+
+
+def rolling_deploy(opts):
+    """Deploy to a canary target first, then to the others in batches.
+
+    After each deployment step, the channels of the targets just deployed
+    to are probed and the rollout stops if the health thresholds given in
+    opts are not met.
+
+    """
+    config = read_ini_config(opts.config)
+    channels = (read_ini_config(opts.channels) if exists(opts.channels)
+                else {})
+    targets = opts.targets or [k for k in config if k != 'zato']
+    batch_size = max(1, opts.batch_size)
+
+    for target in targets:
+        if target not in config:
+            msg = ("Deployment target '{}' not defined in deployment "
+                   "configuration.".format(target))
+            log.error(msg)
+            return msg
+
+    steps = [targets[:1]] + [targets[i:i + batch_size]
+                             for i in range(1, len(targets), batch_size)]
+
+    for step, step_targets in enumerate(steps):
+        log.info("Deploying to %s target(s): %s",
+                 "canary" if step == 0 else "batch of",
+                 ", ".join(step_targets))
+
+        step_opts = argparse.Namespace(**vars(opts))
+        step_opts.targets = step_targets
+        res = run_stages(STAGES, step_opts)
+        if res:
+            return res
+
+        results = probe_targets(config, channels, step_targets,
+                                opts.probe_count)
+        problems = check_health(results, opts.max_error_rate,
+                                opts.max_latency)
+
+        if problems:
+            for problem in problems:
+                log.error(problem)
+            remaining = [t for targets_ in steps[step + 1:] for t in targets_]
+            msg = "Health check failed after deploying to {}.".format(
+                ", ".join(step_targets))
+            if remaining:
+                msg += " Targets not deployed: {}".format(", ".join(remaining))
+            log.error(msg)
+            return msg
 
 
 def main(args=None):
-    """Execute all deployment tasks in the right order."""
-    logging.basicConfig(level=logging.INFO)
-
-    add_extra_paths_from_file()
-    create_secdefs(args)
-    create_outgoings(args)
-    store_settings(args)
-    upload_modules(args)
-    # give asynchronous upload operation some time to finish
-    time.sleep(2)
-    create_channels(args)
+    """Execute all deployment tasks, each once its dependencies are done.
+
+    Command line arguments are parsed and validated here, before any stage
+    is started, and the options of the deployment scripts are passed on to
+    the scripts accepting them.
+
+    """
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-v', '--verbose', action="store_true",
+        help="Enable verbose output")
+    ap.add_argument('-c', '--config', default="deploy.conf",
+        help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('--extra-paths-dry-run', action="store_true",
+        help="Only show changes to the extra paths symlinks and exit")
+    ap.add_argument('--rolling', action="store_true",
+        help="Deploy to the first target (canary), then to the other targets "
+             "in batches, probing the deployed channels after each step")
+    ap.add_argument('--batch-size', type=int, default=1,
+        help="Number of targets per batch after the canary (default: "
+             "%(default)s)")
+    ap.add_argument('--probe-count', type=int, default=PROBE_COUNT,
+        help="Number of requests made to each channel (default: "
+             "%(default)s)")
+    ap.add_argument('--max-error-rate', type=float, default=MAX_ERROR_RATE,
+        help="Highest acceptable fraction of failed probe requests "
+             "(default: %(default)s)")
+    ap.add_argument('--max-latency', type=float, default=MAX_LATENCY,
+        help="Highest acceptable 95th percentile of probe latency in "
+             "seconds (default: %(default)s)")
+
+    for option, kwargs, _ in STAGE_OPTIONS:
+        ap.add_argument(option, **kwargs)
+
+    ap.add_argument('targets', nargs="*",
+        help="Deployment targets (default: all)")
+
+    opts = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    logging.basicConfig(level=logging.DEBUG if opts.verbose else logging.INFO)
+
+    if opts.extra_paths_dry_run:
+        sync_extra_paths(dry_run=True)
+        return
+
+    if opts.rolling:
+        return rolling_deploy(opts)
+
+    return run_stages(STAGES, opts)
 
 
 if __name__ == '__main__':
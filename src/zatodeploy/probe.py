@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/probe.py
+#
+"""HTTP probing of deployed Zato channels.
+
+Channels are called at their ``url_path`` on the address given by the
+``probe_url`` option of the deployment target or, if not set, on the load
+balancer (``lb_host``/``lb_port``). Credentials for channels protected by
+HTTP Basic Auth can be given with ``probe_user`` and ``probe_password``.
+
+Channels are called with their ``method`` (default: GET) and without a body,
+unless the channel definition sets ``probe_method`` and ``probe_data``. SOAP
+channels are called with their ``soap_action`` as SOAPAction header.
+
+Connection errors, timeouts and responses with an HTTP status other than 2xx
+or 3xx count as errors. Channels which answer probe requests with another
+status when they work (e.g. 400 for a missing request body) can list the
+statuses to accept in their ``probe_ok_status`` option, e.g. ``400, 404``.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import math
+import time
+
+
+__all__ = (
+    'ProbeResult',
+    'channel_headers',
+    'channel_ok_status',
+    'channel_url',
+    'is_ok_status',
+    'percentile',
+    'probe_channel'
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TIMEOUT = 10
+
+
+def percentile(values, pct):
+    """Return the pct-th percentile of values (nearest-rank method)."""
+    if not values:
+        return None
+
+    values = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[max(rank, 1) - 1]
+
+
+class ProbeResult(object):
+    """Latencies and error count of a series of requests to a channel."""
+
+    def __init__(self, name, url):
+        """Set up empty result for channel name at url."""
+        self.name = name
+        self.url = url
+        self.latencies = []
+        self.errors = 0
+
+    @property
+    def requests(self):
+        """Return total number of requests made."""
+        return len(self.latencies) + self.errors
+
+    @property
+    def error_rate(self):
+        """Return fraction of failed requests."""
+        return float(self.errors) / self.requests if self.requests else 0.0
+
+    def percentile(self, pct):
+        """Return the pct-th percentile of successful request latencies."""
+        return percentile(self.latencies, pct)
+
+    def add(self, latency=None):
+        """Record a successful request or, if latency is None, an error."""
+        if latency is None:
+            self.errors += 1
+        else:
+            self.latencies.append(latency)
+
+    def __str__(self):
+        return ("{}: {} requests, {:.1%} errors, p50 {} s, p95 {} s".format(
+            self.name, self.requests, self.error_rate,
+            _fmt(self.percentile(50)), _fmt(self.percentile(95))))
+
+
+def _fmt(value):
+    return 'n/a' if value is None else '%.3f' % value
+
+
+def channel_url(config, channel):
+    """Return URL to call channel of deployment target config at."""
+    base = (config.get('probe_url') or
+            'http://%s:%s' % (config.lb_host, config.lb_port))
+    return base.rstrip('/') + channel.url_path
+
+
+def channel_headers(channel):
+    """Return HTTP headers to send with requests to channel."""
+    if channel.get('transport') == 'soap' and channel.get('soap_action'):
+        return {'SOAPAction': channel.soap_action,
+                'Content-Type': 'text/xml; charset=utf-8'}
+    return {}
+
+
+def channel_ok_status(channel):
+    """Return set of statuses besides 2xx and 3xx accepted from channel.
+
+    Raises ValueError if the ``probe_ok_status`` option of the channel is not
+    a list of HTTP statuses.
+
+    """
+    value = channel.get('probe_ok_status') or ''
+
+    try:
+        return frozenset(int(status)
+                         for status in value.replace(',', ' ').split())
+    except ValueError:
+        raise ValueError("Invalid probe_ok_status '{}' of channel '{}'."
+                         .format(value, channel.get('name')))
+
+
+def is_ok_status(status, ok_status=()):
+    """Return True if status is 2xx or 3xx or one of ok_status."""
+    return 200 <= status < 400 or status in ok_status
+
+
+def request_channel(session, url, method='GET', data=None, timeout=None,
+                    headers=None, ok_status=()):
+    """Make one request to a channel and return latency or None on error.
+
+    Responses with a status other than 2xx or 3xx count as errors, unless
+    the status is one of ok_status.
+
+    """
+    # imported here, because it is only needed when a request is made
+    import requests
+
+    start = time.time()
+
+    try:
+        resp = session.request(method, url, data=data, headers=headers,
+                               timeout=timeout or DEFAULT_TIMEOUT)
+    except requests.RequestException as exc:
+        log.debug("Request to %s failed: %s", url, exc)
+        return None
+
+    latency = time.time() - start
+
+    if not is_ok_status(resp.status_code, ok_status):
+        log.debug("Request to %s failed with status %s.", url,
+                  resp.status_code)
+        return None
+
+    return latency
+
+
+def make_session(config):
+    """Return a requests session with the target's probe credentials."""
+    import requests
+
+    session = requests.Session()
+
+    if config.get('probe_user'):
+        session.auth = (config.probe_user, config.get('probe_password', ''))
+
+    return session
+
+
+def probe_channel(config, channel, count=10, timeout=None):
+    """Call channel count times one after another and return ProbeResult."""
+    url = channel_url(config, channel)
+    result = ProbeResult(channel.name, url)
+    session = make_session(config)
+    method = channel.get('probe_method') or channel.get('method') or 'GET'
+    data = channel.get('probe_data')
+    headers = channel_headers(channel)
+    ok_status = channel_ok_status(channel)
+
+    try:
+        for _ in range(count):
+            result.add(request_channel(session, url, method, data, timeout,
+                                       headers, ok_status))
+    finally:
+        session.close()
+
+    log.info("Probed channel %s", result)
+    return result
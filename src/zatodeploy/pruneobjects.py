@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/pruneobjects.py
+#
+"""Command line script to delete orphaned zato objects via JSON-HTTP.
+
+Finds channels, outgoings and HTTP Basic Auth security definitions in the
+Zato cluster, which are owned by a deployment target but no longer listed in
+its ``channels``, ``outgoings`` or ``secdefs`` settings, and deletes them.
+
+Which objects a target owns is given by the ``prune`` setting in its section
+of the deployment configuration: a comma-separated list of name patterns,
+e.g. ``myapp.*``. Objects with names not matching any pattern are never
+touched. Internal Zato objects are always ignored.
+
+By default, the orphaned objects are only listed. Pass ``--apply`` to delete
+them. The objects are always listed from the cluster, bypassing the inventory
+cache.
+
+Orphaned security definitions not used by any remaining channel or outgoing
+are listed, but never deleted: they may still be used by other kinds of
+connections, which this script does not check. Delete them manually after
+making sure they are no longer used.
+
+Run ``zato-pruneobjects -h`` for usage help.
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import fnmatch
+import logging
+import sys
+
+from functools import partial
+from os.path import exists
+
+# do not use relative import here, because this module should be executable
+# as a command line script
+from zatodeploy.common import (get_basic_auth_list, get_http_soap_inventory,
+    json_call, read_ini_config)
+from zatodeploy.executor import get_concurrency, run_concurrently
+
+
+log = logging.getLogger(__name__)
+
+# object kind -> (deployment target setting, zato delete service or None)
+OBJECT_KINDS = (
+    ('channel', 'channels', 'zato.http-soap.delete'),
+    ('outgoing', 'outgoings', 'zato.http-soap.delete'),
+    # only HTTP/SOAP objects are checked for references to security
+    # definitions, so they are only listed
+    ('secdef', 'secdefs', None),
+)
+
+
+def get_snapshot(config):
+    """Fetch channels, outgoings and security definitions concurrently.
+
+    The inventory cache is bypassed, since objects must not be deleted
+    based on stale listings. Returns a dictionary mapping object kinds to
+    lists of non-internal objects.
+
+    """
+    res = run_concurrently(lambda fetch: fetch(), (
+        lambda: get_http_soap_inventory(config, use_cache=False),
+        lambda: get_basic_auth_list(config, use_cache=False)), 2)
+    http_soap, secdefs = res
+    return dict(
+        channel=[ch for ch in http_soap['channel']
+                 if not ch.get('is_internal')],
+        outgoing=[og for og in http_soap['outgoing']
+                  if not og.get('is_internal')],
+        secdef=list(secdefs))
+
+
+def get_desired_names(config, definitions, setting):
+    """Return set of object names a target is configured to deploy.
+
+    definitions is the parsed definitions file (or None, if it does not
+    exist) and setting the name of the target setting listing its sections.
+
+    Raises KeyError if a listed section is not found in the definitions, as
+    every owned object would otherwise be taken for an orphan.
+
+    """
+    idents = [ident.strip()
+        for ident in config.get(setting, '').split(',') if ident.strip()]
+
+    if not idents:
+        return set()
+
+    if definitions is None:
+        raise KeyError("'{}' listed for target, but definitions file not "
+                       "found.".format(setting))
+
+    if idents == ['*']:
+        idents = list(definitions.keys())
+
+    for ident in idents:
+        if ident not in definitions:
+            raise KeyError("'{}' not found in {} definitions.".format(
+                ident, setting))
+
+    return set(definitions[ident].get('name', ident) for ident in idents)
+
+
+def find_orphans(snapshot, desired, patterns):
+    """Return dictionary of objects owned by a target but not desired.
+
+    snapshot and desired map object kinds to lists of existing objects and
+    sets of desired names respectively. Objects are owned if their name
+    matches one of patterns.
+
+    """
+    def owned(name):
+        return any(fnmatch.fnmatch(name, ptn) for ptn in patterns)
+
+    orphans = dict(
+        (kind, sorted((obj for obj in objs
+                       if owned(obj.name) and obj.name not in desired[kind]),
+                      key=lambda obj: obj.name))
+        for kind, objs in snapshot.items())
+
+    # keep security definitions still referenced by remaining objects
+    deleted = set(id(obj) for obj in orphans['channel'] + orphans['outgoing'])
+    used = set(obj.get('security_id')
+               for obj in snapshot['channel'] + snapshot['outgoing']
+               if id(obj) not in deleted)
+    for secdef in list(orphans['secdef']):
+        if secdef.id in used:
+            log.warning("Security definition '%s' is still in use. Not "
+                        "deleting it.", secdef.name)
+            orphans['secdef'].remove(secdef)
+
+    return orphans
+
+
+def delete_object(config, service, obj):
+    """Delete a zato object via JSON call."""
+    json_call(service, dict(id=obj.id), config)
+    log.info("Deleted '%s' (ID %s).", obj.name, obj.id)
+
+
+def prune_target(config, target, definitions, apply=False):
+    """List and, if apply is true, delete orphaned objects of a target.
+
+    Returns None on success or an error message.
+
+    """
+    patterns = [ptn.strip() for ptn in config.get('prune', '').split(',')
+                if ptn.strip()]
+
+    if not patterns:
+        log.info("No 'prune' patterns for target '%s'. Skipping it.", target)
+        return
+
+    try:
+        desired = dict((kind, get_desired_names(config, definitions[kind],
+                                                setting))
+                       for kind, setting, _ in OBJECT_KINDS)
+    except KeyError as exc:
+        return "Target '{}': {}".format(target, exc.args[0])
+
+    orphans = find_orphans(get_snapshot(config), desired, patterns)
+
+    if not any(orphans.values()):
+        log.info("No orphaned objects for target '%s'.", target)
+        return
+
+    print("Orphaned objects of target '{}':".format(target))
+    for kind, _, service in OBJECT_KINDS:
+        for obj in orphans[kind]:
+            print("  {:<9} {}{}".format(kind, obj.name,
+                                        '' if service else ' (not deleted)'))
+
+    if not apply:
+        log.info("Dry run. Use --apply to delete the objects listed.")
+        return
+
+    for kind, _, service in OBJECT_KINDS:
+        if service:
+            run_concurrently(partial(delete_object, config, service),
+                             orphans[kind], get_concurrency(config))
+
+
+def main(args=None):
+    """Main script entry point function.
+
+    Parses command line arguments and configuration files and loops through
+    the deployment targets, listing and optionally deleting the orphaned
+    objects of each requested target.
+
+    """
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('-v', '--verbose', action="store_true",
+        help="Enable verbose output")
+    ap.add_argument('-c', '--config', default="deploy.conf",
+        help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('--channels', default="channels.conf",
+        help="Channel definition file (default: %(default)s)")
+    ap.add_argument('--outgoings', default="outgoings.conf",
+        help="Outgoing definition file (default: %(default)s)")
+    ap.add_argument('--secdefs', default="secdefs.conf",
+        help="Security definitions file (default: %(default)s)")
+    ap.add_argument('--apply', action="store_true",
+        help="Delete orphaned objects (default: only list them)")
+    ap.add_argument('targets', nargs="*",
+        help="Deployment targets (default: all)")
+
+    args = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    if args.verbose:
+        loglevel = logging.DEBUG
+    else:
+        loglevel = logging.INFO
+
+    logging.basicConfig(level=loglevel)
+
+    config = read_ini_config(args.config)
+    log.debug("Deployment configuration:\n%s", config)
+
+    definitions = {}
+    for kind, setting, _ in OBJECT_KINDS:
+        filename = getattr(args, setting)
+        definitions[kind] = (read_ini_config(filename) if exists(filename)
+                             else None)
+
+    targets = (args.targets if args.targets
+               else [k for k in config if k != 'zato'])
+    log.debug("Deployment targets: %s", ", ".join(targets))
+
+    if not targets:
+        msg = "No deployment targets defined in deployment configuration."
+        log.error(msg)
+        return msg
+
+    for target in targets:
+        if target not in config:
+            msg = ("Deployment target '{}' not defined in deployment "
+                   "configuration.".format(target))
+            log.error(msg)
+            return msg
+
+        msg = prune_target(config[target], target, definitions, args.apply)
+        if msg:
+            log.error(msg)
+            return msg
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)
@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/records.py
+#
+"""Compact record classes for objects listed by the Zato admin API.
+
+Listings of large clusters contain tens of thousands of objects. Instead of
+wrapping each object's dictionary in a ``Bunch``, the records store the
+commonly used fields in ``__slots__`` and only keep the remaining fields of
+an object, if any, in a separate dictionary.
+
+Records support the same access as ``Bunch`` objects for reading: attribute
+access, ``record[key]``, ``record.get(key, default)``, ``key in record`` and
+``dict(record)``. Fields not present in the listed object raise
+``AttributeError`` or ``KeyError`` respectively.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+
+__all__ = (
+    'HTTPSOAPRecord',
+    'Record',
+    'SecDefRecord',
+    'ServiceRecord'
+)
+
+
+class Record(object):
+    """Base class for records with fields given by ``__slots__``.
+
+    Sub-classes must set ``_fields`` to a frozenset of their slot names.
+
+    """
+
+    __slots__ = ('_extra',)
+    _fields = frozenset()
+
+    def __init__(self, data=(), **kwargs):
+        """Set fields from dictionary data and keyword arguments."""
+        extra = None
+
+        for items in (data.items() if data else (), kwargs.items()):
+            for key, value in items:
+                if key in self._fields:
+                    setattr(self, key, value)
+                else:
+                    if extra is None:
+                        extra = {}
+                    extra[key] = value
+
+        self._extra = extra
+
+    def __getattr__(self, name):
+        # only called for unset slots and names which are not slots
+        if name in self._fields or name.startswith('_'):
+            raise AttributeError(name)
+
+        try:
+            return self._extra[name]
+        except (KeyError, TypeError):
+            raise AttributeError(name)
+
+    def __getitem__(self, key):
+        try:
+            if key in self._fields:
+                return getattr(self, key)
+            return self._extra[key]
+        except (AttributeError, KeyError, TypeError):
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        try:
+            self[key]
+        except KeyError:
+            return False
+        return True
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            other = other.as_dict()
+        return self.as_dict() == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+    def __repr__(self):
+        return "%s(%r)" % (type(self).__name__, self.as_dict())
+
+    def get(self, key, default=None):
+        """Return value of field key or default if it is not set."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        """Return list of the names of all set fields."""
+        keys = [field for field in self.__slots__ if hasattr(self, field)]
+        if self._extra:
+            keys.extend(self._extra)
+        return keys
+
+    def items(self):
+        """Return list of (name, value) tuples of all set fields."""
+        return [(key, self[key]) for key in self.keys()]
+
+    def as_dict(self):
+        """Return all set fields as a dictionary."""
+        return dict(self.items())
+
+
+class ServiceRecord(Record):
+    """A Zato service as listed by ``zato.service.get-list``."""
+
+    __slots__ = ('id', 'name', 'impl_name', 'is_active', 'is_internal',
+                 'slow_threshold')
+    _fields = frozenset(__slots__)
+
+
+class HTTPSOAPRecord(Record):
+    """A Zato channel or outgoing as listed by ``zato.http-soap.get-list``."""
+
+    __slots__ = ('id', 'name', 'connection', 'transport', 'is_active',
+                 'is_internal', 'host', 'url_path', 'method', 'data_format',
+                 'soap_action', 'soap_version', 'ping_method', 'pool_size',
+                 'timeout', 'service_id', 'service_name', 'security_id',
+                 'security_name', 'sec_type')
+    _fields = frozenset(__slots__)
+
+
+class SecDefRecord(Record):
+    """A security definition as listed by ``zato.security.get-list``."""
+
+    __slots__ = ('id', 'name', 'sec_type', 'is_active', 'username', 'realm')
+    _fields = frozenset(__slots__)
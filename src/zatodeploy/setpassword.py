@@ -6,36 +6,75 @@ This works by calling the service to change the password through the
 "zato service invoke" command line interface. That way one doesn't need to
 know the current password protecting the internal zato services.
 
+Alternatively, when a deployment configuration file and target are given,
+the passwords are changed through the Zato admin API (JSON-HTTP) as
+configured for the target.
+
+Passwords of many security definitions can be changed in one run by passing a
+file with one ``username:password`` pair per line. The list of security
+definitions is then loaded only once.
+
 """
 
 from __future__ import print_function, unicode_literals
 
 import argparse
+import ast
+import io
 import sys
 
-from json import dumps
+from json import dumps, loads
 from subprocess import check_output, CalledProcessError, STDOUT
 
 
-def set_password(server_path, cluster_id, username, password):
-    """Call zato command client to set password for a securizty definition."""
-    requestdata = dumps(dict(cluster_id=int(cluster_id)))
+def parse_invoke_output(output):
+    """Safely parse the response printed by "zato service invoke".
+
+    The output is either JSON or the representation of a Python literal.
+
+    """
+    output = output.decode('utf-8') if isinstance(output, bytes) else output
 
     try:
-        secdefs = check_output(["zato", "service", "invoke", "--payload",
-            requestdata, server_path, "zato.security.get-list"], stderr=STDOUT)
+        return loads(output)
+    except ValueError:
+        return ast.literal_eval(output.strip())
+
+
+def zato_invoke(server_path, service, payload):
+    """Invoke a Zato service via the zato command line client."""
+    return check_output(["zato", "service", "invoke", "--payload",
+        dumps(payload), server_path, service], stderr=STDOUT)
+
+
+def get_secdefs(server_path, cluster_id):
+    """Return security definitions via the zato CLI, keyed by username."""
+    try:
+        secdefs = zato_invoke(server_path, "zato.security.get-list",
+                              dict(cluster_id=int(cluster_id)))
     except CalledProcessError as exc:
         raise IOError("Could not get list of security definitions: %s" % exc)
     else:
-        secdefs = dict((s['username'], s) for s in eval(secdefs))
+        return dict((s['username'], s) for s in parse_invoke_output(secdefs)
+                    if s.get('username'))
+
+
+def set_password(server_path, cluster_id, username, password, secdefs=None):
+    """Call zato command client to set password for a securizty definition.
+
+    If secdefs is given, it is used as the mapping of usernames to security
+    definitions instead of fetching the list of security definitions.
+
+    """
+    if secdefs is None:
+        secdefs = get_secdefs(server_path, cluster_id)
 
     if username in secdefs:
-        requestdata = dumps(dict(id=secdefs[username]["id"],
-            password1=password, password2=password))
+        requestdata = dict(id=secdefs[username]["id"],
+            password1=password, password2=password)
         try:
-            check_output(["zato", "service", "invoke", "--payload",
-                requestdata, server_path,
-                "zato.security.basic-auth.change-password"], stderr=STDOUT)
+            zato_invoke(server_path,
+                "zato.security.basic-auth.change-password", requestdata)
         except CalledProcessError as exc:
             raise IOError("Error setting password for user '%s': %s" %
                           (username, exc))
@@ -46,7 +85,93 @@ def set_password(server_path, cluster_id, username, password):
                        username)
 
 
-def main(args):
+def set_passwords(server_path, cluster_id, passwords):
+    """Set passwords for a list of (username, password) pairs via zato CLI.
+
+    The list of security definitions is fetched only once. Returns a list of
+    error messages for the passwords which could not be set.
+
+    """
+    secdefs = get_secdefs(server_path, cluster_id)
+    errors = []
+
+    for username, password in passwords:
+        try:
+            set_password(server_path, cluster_id, username, password, secdefs)
+        except (IOError, KeyError) as exc:
+            errors.append(exc.args[0])
+
+    return errors
+
+
+def set_passwords_api(config, passwords):
+    """Set passwords for (username, password) pairs via the Zato admin API.
+
+    The list of security definitions is fetched only once and the passwords
+    are changed with the configured number of concurrent calls. Returns a
+    list of error messages for the passwords which could not be set.
+
+    """
+    from zatodeploy.common import get_basic_auth_list, json_call
+    from zatodeploy.executor import get_concurrency, run_concurrently
+
+    secdefs = dict((s.username, s) for s in get_basic_auth_list(config))
+    errors = []
+
+    def change_password(pair):
+        username, password = pair
+        if username not in secdefs:
+            errors.append("No security definition with username '%s' found." %
+                          username)
+            return
+
+        data = dict(id=secdefs[username].id, password1=password,
+                    password2=password)
+        try:
+            json_call('zato.security.basic-auth.change-password', data,
+                      config)
+        except Exception as exc:
+            errors.append("Error setting password for user '%s': %s" %
+                          (username, exc))
+        else:
+            print("Password updated sucessfully for user '%s'." % username)
+
+    run_concurrently(change_password, passwords, get_concurrency(config))
+    return errors
+
+
+def read_passwords(filename, unique=False):
+    """Read (username, password) pairs from a file.
+
+    Each non-empty line not starting with '#' must have the form
+    ``username:password``. If unique is true, a username occurring on more
+    than one line raises ``ValueError``.
+
+    """
+    passwords = []
+    seen = set()
+
+    with io.open(filename, encoding='utf-8') as fp:
+        for lineno, line in enumerate(fp, 1):
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+
+            username, sep, password = line.partition(':')
+            if not sep or not username.strip():
+                raise ValueError("Invalid line %i in password file '%s'." %
+                                 (lineno, filename))
+            username = username.strip()
+            if unique and username in seen:
+                raise ValueError("Duplicate name '%s' on line %i in password "
+                                 "file '%s'." % (username, lineno, filename))
+            seen.add(username)
+            passwords.append((username, password))
+
+    return passwords
+
+
+def main(args=None):
     """Main script entry point function.
 
     Parses command line arguments and calls the ``set_password`` function.
@@ -55,20 +180,59 @@ def main(args):
     ap = argparse.ArgumentParser()
     ap.add_argument("--cluster", default=1,
         help="ID of zato cluster (default: %(default)s)")
-    ap.add_argument("serverpath", metavar="PATH",
+    ap.add_argument("-f", "--file",
+        help="File with one 'username:password' pair per line")
+    ap.add_argument("-c", "--config",
+        help="Deployment configuration settings file. If given, passwords "
+             "are set via the Zato admin API of the target instead of the "
+             "zato command line client.")
+    ap.add_argument("-t", "--target",
+        help="Deployment target to use with --config (default: first "
+             "target)")
+    ap.add_argument("serverpath", metavar="PATH", nargs="?",
         help="Path to zato server component")
-    ap.add_argument("username", metavar="USERNAME",
+    ap.add_argument("username", metavar="USERNAME", nargs="?",
         help="Username of HTTP basic auth security definition")
-    ap.add_argument("password", metavar="PASSWD",
+    ap.add_argument("password", metavar="PASSWD", nargs="?",
         help="New password to set")
 
     args = ap.parse_args(args if args is not None else sys.argv[1:])
 
+    if args.config and args.password is None:
+        # PATH is not needed when using the admin API, so the positional
+        # arguments are shifted if it was left out
+        args.username, args.password = args.serverpath, args.username
+
     try:
-        set_password(
-            args.serverpath, args.cluster, args.username, args.password)
+        if args.file:
+            passwords = read_passwords(args.file)
+        elif args.username is not None and args.password is not None:
+            passwords = [(args.username, args.password)]
+        else:
+            ap.error("USERNAME and PASSWD or --file are required.")
+
+        if args.config:
+            from zatodeploy.common import read_ini_config
+
+            config = read_ini_config(args.config)
+            target = args.target or next(
+                (k for k in config if k != 'zato'), None)
+            if target not in config:
+                raise KeyError("Deployment target '%s' not defined in "
+                               "deployment configuration." % target)
+            errors = set_passwords_api(config[target], passwords)
+        elif args.serverpath:
+            errors = set_passwords(args.serverpath, args.cluster, passwords)
+        else:
+            ap.error("PATH is required unless --config is given.")
     except Exception as exc:
-        print(exc.message)
+        print(exc.args[0] if exc.args else exc)
+        return 1
+
+    for error in errors:
+        print(error)
+
+    return 1 if errors else 0
 
 
 if __name__ == '__main__':
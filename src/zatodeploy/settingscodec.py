@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/settingscodec.py
+#
+"""Encoding of settings documents stored in Redis.
+
+Settings are stored either as plain JSON text, as written by earlier
+versions of ``zato-storesettings``, or as a binary payload starting with a
+header::
+
+    MAGIC (3 bytes) | format version (1 byte) | flags (1 byte) | data
+
+The low four bits of the flags give the encoding of the document (JSON or
+msgpack), the high four bits the compression of the encoded document (none,
+zlib or zstd). ``decode_settings`` detects the format automatically.
+
+msgpack and zstd require the optional ``msgpack`` and ``zstandard``
+packages.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import json
+import struct
+import zlib
+
+# optional third-party
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+__all__ = (
+    'COMPRESSIONS',
+    'ENCODINGS',
+    'check_codec',
+    'decode_settings',
+    'encode_settings'
+)
+
+# the NUL byte can not start a JSON text, so headers are never ambiguous
+MAGIC = b'\x00ZS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct(str('!3sBB'))
+
+ENCODINGS = ('json', 'msgpack')
+COMPRESSIONS = ('none', 'zlib', 'zstd')
+# documents smaller than this many bytes (after encoding) are not compressed
+DEFAULT_THRESHOLD = 1024
+
+
+def check_codec(encoding='json', compression='none'):
+    """Raise ValueError if encoding or compression is not available."""
+    if encoding not in ENCODINGS:
+        raise ValueError("Unknown settings encoding '%s'." % encoding)
+    if compression not in COMPRESSIONS:
+        raise ValueError("Unknown settings compression '%s'." % compression)
+    if encoding == 'msgpack' and msgpack is None:
+        raise ValueError("Settings encoding 'msgpack' requires the msgpack "
+                         "package.")
+    if compression == 'zstd' and zstandard is None:
+        raise ValueError("Settings compression 'zstd' requires the "
+                         "zstandard package.")
+
+
+def encode_settings(settings, encoding='json', compression='none',
+                    threshold=DEFAULT_THRESHOLD):
+    """Encode settings and return payload to store in Redis.
+
+    The encoded document is only compressed if it is at least threshold
+    bytes long. Plain JSON documents are stored without a header, so readers
+    unaware of the header can still read them.
+
+    """
+    check_codec(encoding, compression or 'none')
+
+    if encoding == 'msgpack':
+        data = msgpack.packb(settings, use_bin_type=True)
+    else:
+        data = json.dumps(settings, separators=(',', ':')).encode('utf-8')
+
+    if not compression or len(data) < threshold:
+        compression = 'none'
+
+    if compression == 'zlib':
+        data = zlib.compress(data)
+    elif compression == 'zstd':
+        data = zstandard.ZstdCompressor().compress(data)
+
+    if encoding == 'json' and compression == 'none':
+        return data
+
+    flags = ENCODINGS.index(encoding) | COMPRESSIONS.index(compression) << 4
+    return HEADER.pack(MAGIC, FORMAT_VERSION, flags) + data
+
+
+def decode_settings(payload):
+    """Decode settings payload stored in Redis in any supported format."""
+    if isinstance(payload, bytes) and payload.startswith(MAGIC):
+        _, version, flags = HEADER.unpack(payload[:HEADER.size])
+
+        if version != FORMAT_VERSION:
+            raise ValueError("Unsupported settings format version %i." %
+                             version)
+
+        try:
+            encoding = ENCODINGS[flags & 0x0f]
+            compression = COMPRESSIONS[flags >> 4]
+        except IndexError:
+            raise ValueError("Unsupported settings format flags %i." % flags)
+
+        check_codec(encoding, compression)
+        data = payload[HEADER.size:]
+
+        if compression == 'zlib':
+            data = zlib.decompress(data)
+        elif compression == 'zstd':
+            data = zstandard.ZstdDecompressor().decompress(data)
+
+        if encoding == 'msgpack':
+            return msgpack.unpackb(data, raw=False)
+        payload = data
+
+    if isinstance(payload, bytes):
+        payload = payload.decode('utf-8')
+
+    return json.loads(payload)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/settingskeys.py
+#
+"""Names of the Redis keys and channels used for versioned settings.
+
+For settings published under a URN, the following keys are used:
+
+``<urn>``
+    the current settings document (for readers unaware of versions)
+``<urn>:v<N>``
+    the settings document of version N
+``<urn>:current``
+    the number of the current version
+``<urn>:version``
+    counter the version numbers are taken from
+``<urn>:versions``
+    list of the kept version numbers, newest first
+
+Whenever the current version changes, its number is published on the channel
+``<urn>:changes``.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+
+__all__ = (
+    'changes_channel',
+    'counter_key',
+    'current_key',
+    'version_key',
+    'versions_key'
+)
+
+
+def version_key(urn, version):
+    """Return key of the settings document of given version."""
+    return '%s:v%s' % (urn, version)
+
+
+def current_key(urn):
+    """Return key holding the number of the current version."""
+    return urn + ':current'
+
+
+def counter_key(urn):
+    """Return key of the counter version numbers are taken from."""
+    return urn + ':version'
+
+
+def versions_key(urn):
+    """Return key of the list of kept version numbers, newest first."""
+    return urn + ':versions'
+
+
+def changes_channel(urn):
+    """Return pub/sub channel on which changes of the version are published."""
+    return urn + ':changes'
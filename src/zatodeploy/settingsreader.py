@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/settingsreader.py
+#
+"""In-process cache for settings stored by ``zato-storesettings``.
+
+Services create one ``SettingsReader`` per process (e.g. at module level)
+for a Redis client and call ``get(urn)`` on every request::
+
+    from zatodeploy.settingsreader import SettingsReader
+
+    reader = SettingsReader(redis_client, ttl=30)
+    reader.start_listener()
+
+    settings = reader.get('urn:myorg:myproject:myservice:settings')
+
+Settings are served from the local cache for ``ttl`` seconds. After that, only
+the current version number is read from Redis and the document is fetched
+and parsed again only if the version changed, so each version is parsed
+once. With ``start_listener()``, a background thread listens for the change
+notifications published by ``zato-storesettings`` and makes the next ``get``
+check the version at once, so changes are picked up without waiting for the
+TTL. The cache holds at most ``max_entries`` URNs and evicts the least
+recently used one when full.
+
+Returned settings are shared between callers and must not be modified.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import threading
+import time
+
+from collections import OrderedDict
+
+# local modules
+from .settingscodec import decode_settings
+from .settingskeys import changes_channel, current_key, version_key
+
+
+__all__ = (
+    'SettingsReader',
+    'decode_settings'
+)
+
+log = logging.getLogger(__name__)
+
+DEFAULT_TTL = 60
+DEFAULT_MAX_ENTRIES = 128
+# seconds to wait before reconnecting the notification listener
+RECONNECT_DELAY = 5
+
+
+def _text(value):
+    return value.decode('utf-8') if isinstance(value, bytes) else value
+
+
+class _Entry(object):
+    """Cached settings of one URN."""
+
+    __slots__ = ('version', 'settings', 'checked')
+
+    def __init__(self, version, settings, checked):
+        self.version = version
+        self.settings = settings
+        self.checked = checked
+
+
+class SettingsReader(object):
+    """Read settings from Redis and cache them in the process."""
+
+    def __init__(self, redis, ttl=DEFAULT_TTL,
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        """Set up reader with a (StrictRedis compatible) Redis client."""
+        self.redis = redis
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def _lookup(self, urn):
+        """Return cached entry for urn and mark it as recently used."""
+        with self._lock:
+            entry = self._cache.pop(urn, None)
+            if entry is not None:
+                self._cache[urn] = entry
+            return entry
+
+    def _store(self, urn, entry):
+        with self._lock:
+            self._cache.pop(urn, None)
+            self._cache[urn] = entry
+
+            while len(self._cache) > self.max_entries:
+                evicted, _ = self._cache.popitem(last=False)
+                log.debug("Evicted settings '%s' from cache.", evicted)
+
+    def get(self, urn, default=None):
+        """Return settings stored under urn or default if there are none."""
+        now = time.time()
+        entry = self._lookup(urn)
+
+        if entry is not None and now - entry.checked < self.ttl:
+            return entry.settings
+
+        version = self.redis.get(current_key(urn))
+        version = int(_text(version)) if version is not None else None
+
+        if (entry is not None and version is not None and
+                entry.version == version):
+            entry.checked = now
+            return entry.settings
+
+        payload = None
+        if version is not None:
+            payload = self.redis.get(version_key(urn, version))
+        if payload is None:
+            # settings stored without versions or version removed meanwhile
+            payload = self.redis.get(urn)
+        if payload is None:
+            return default
+
+        settings = decode_settings(payload)
+        self._store(urn, _Entry(version, settings, now))
+        log.debug("Loaded settings '%s' version %s.", urn, version)
+        return settings
+
+    def invalidate(self, urn=None):
+        """Make the next get of urn (or of all URNs) check the version."""
+        with self._lock:
+            if urn is None:
+                entries = list(self._cache.values())
+            else:
+                entries = [self._cache[urn]] if urn in self._cache else []
+
+            for entry in entries:
+                entry.checked = 0
+
+    def _listen(self):
+        pattern = changes_channel('*')
+
+        while True:
+            try:
+                pubsub = self.redis.pubsub()
+                pubsub.psubscribe(pattern)
+                # notifications may have been missed while not subscribed
+                self.invalidate()
+
+                for message in pubsub.listen():
+                    if message.get('type') != 'pmessage':
+                        continue
+
+                    channel = _text(message['channel'])
+                    urn = channel[:-len(changes_channel(''))]
+                    log.debug("Settings '%s' changed to version %s.", urn,
+                              _text(message['data']))
+                    self.invalidate(urn)
+            except Exception as exc:
+                log.warning("Settings change listener failed: %s. "
+                            "Reconnecting in %s seconds.", exc,
+                            RECONNECT_DELAY)
+                time.sleep(RECONNECT_DELAY)
+
+    def start_listener(self):
+        """Start background thread listening for settings changes."""
+        if self._listener is None:
+            self._listener = threading.Thread(target=self._listen,
+                                              name='settings-listener')
+            self._listener.daemon = True
+            self._listener.start()
@@ -3,29 +3,67 @@
 #
 # zatodeploy/storesettings.py
 #
-"""Read service settings from JSON file and load them into a Redis DB."""
+"""Read service settings from JSON file and load them into a Redis DB.
+
+Each write stores a new version of the settings and makes it the current one
+in a single transaction. The number of the new version is then published on
+the URN's changes channel, so services caching the settings know when to
+re-read them. The last versions are kept (``settings_keep`` option, default:
+5) and ``--rollback`` switches back to an older one. See
+``zatodeploy.settingskeys`` for the keys used.
+
+Settings of a target can be written to several Redis DBs at once: list them
+as ``host:port[/db]`` in the ``kvdb_endpoints`` option and/or name masters to
+discover via Redis Sentinel in ``kvdb_sentinel_masters`` (with the Sentinel
+addresses in ``kvdb_sentinels``). All endpoints are written to concurrently,
+each with a timeout of ``kvdb_timeout`` seconds. The run fails if fewer than
+``kvdb_write_quorum`` endpoints (a number, ``majority`` or ``all``, the
+default) of a target were written successfully.
+
+Version numbers are assigned once for all endpoints: the new version is one
+more than the highest version counter of the reachable endpoints, so a
+version number denotes the same settings in every Redis DB. The version to
+roll back to is also chosen once: the newest version older than the current
+one kept in all endpoints. A rollback is refused if the endpoints disagree
+on the current version or the settings of the version rolled back to, e.g.
+because they were written by an older release numbering them per endpoint.
+For the same reason, all targets storing settings under the same URN must
+have the same settings and settings options.
+
+"""
 
 from __future__ import absolute_import, print_function, unicode_literals
 
 # standard library
 import argparse
+import hashlib
 import json
 import logging
 import sys
+import time
 
+from collections import OrderedDict
+from functools import partial
 from os.path import exists
 
-# third-party
-import redis
-
 # do not use relative import here, because this module should be executable
 # as a command line script
 from zatodeploy.common import read_ini_config
+from zatodeploy.executor import run_concurrently
+from zatodeploy.settingscodec import (DEFAULT_THRESHOLD, check_codec,
+    encode_settings)
+from zatodeploy.settingskeys import (changes_channel, counter_key,
+    current_key, version_key, versions_key)
 
 
 REDIS_HOST = 'localhost'
 REDIS_PORT = 6379
+SENTINEL_PORT = 26379
+# seconds to wait for connecting to and responses from a Redis endpoint
+DEFAULT_TIMEOUT = 5.0
 SETTINGS_VERSION = "1.0"
+# number of settings versions kept for rollbacks
+KEEP_VERSIONS = 5
 
 log = logging.getLogger(__name__)
 
@@ -47,15 +85,497 @@ def read_settings(filename):
                                 filename)
 
 
-def write_settings_to_db(settings, urn, host, port, db=0, password=None):
-    """Write given settings dictionary to Redis on specified host and port."""
-    redisc = redis.StrictRedis(host=host, port=port, db=db, password=password)
+def _get_redis(host, port, db=0, password=None, timeout=None):
+    # import the Redis client only when settings are actually written
+    import redis
+
+    return redis.StrictRedis(host=host, port=port, db=db, password=password,
+                             socket_timeout=timeout,
+                             socket_connect_timeout=timeout)
+
+
+def _split(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+
+def _parse_address(address, default_port):
+    host, _, port = address.rpartition(':')
+    if not host:
+        host, port = port, ''
+    return host, int(port or default_port)
+
+
+def get_endpoints(config):
+    """Return list of the Redis endpoints of a deployment target.
+
+    Each endpoint is a dictionary with the keys ``host``, ``port``, ``db``
+    and ``password`` or, for masters discovered via Sentinel, ``master`` and
+    ``sentinels`` instead of ``host`` and ``port``. Raises SettingsError if
+    the options are invalid.
+
+    """
+    password = config.get('kvdb_password') or None
+    default_db = int(config.get('kvdb_db') or 0)
+    endpoints = []
+
+    try:
+        for entry in _split(config.get('kvdb_endpoints')):
+            address, _, db = entry.partition('/')
+            host, port = _parse_address(address, REDIS_PORT)
+            endpoints.append(dict(host=host, port=port, password=password,
+                                  db=int(db) if db else default_db))
+
+        sentinels = [_parse_address(address, SENTINEL_PORT)
+                     for address in _split(config.get('kvdb_sentinels'))]
+    except ValueError as exc:
+        raise SettingsError("Invalid Redis endpoint: %s" % exc)
+
+    masters = _split(config.get('kvdb_sentinel_masters'))
+    if masters and not sentinels:
+        raise SettingsError("'kvdb_sentinel_masters' given without "
+                            "'kvdb_sentinels'.")
+
+    for master in masters:
+        endpoints.append(dict(master=master, sentinels=sentinels,
+                              db=default_db, password=password))
+
+    if not endpoints:
+        endpoints.append(dict(host=config.get('kvdb_host') or REDIS_HOST,
+                              port=int(config.get('kvdb_port') or REDIS_PORT),
+                              db=default_db, password=password))
+
+    return endpoints
+
+
+def endpoint_label(endpoint):
+    """Return name of Redis endpoint for messages."""
+    if endpoint.get('master'):
+        return 'sentinel:%s/%i' % (endpoint['master'], endpoint['db'])
+    return '%s:%s/%i' % (endpoint['host'], endpoint['port'], endpoint['db'])
+
+
+def resolve_endpoint(endpoint, timeout=None):
+    """Return (host, port) of endpoint, asking Sentinel for masters."""
+    if not endpoint.get('master'):
+        return endpoint['host'], endpoint['port']
+
+    from redis.sentinel import MasterNotFoundError, Sentinel
+
+    sentinel = Sentinel(endpoint['sentinels'], sentinel_kwargs=dict(
+        socket_timeout=timeout, socket_connect_timeout=timeout))
+    try:
+        return sentinel.discover_master(endpoint['master'])
+    except MasterNotFoundError:
+        raise SettingsError("No master '%s' found via Sentinel." %
+                            endpoint['master'])
+
+
+def get_quorum(config, count):
+    """Return number of count endpoints which must be written successfully.
+    """
+    value = (config.get('kvdb_write_quorum') or 'all').strip().lower()
+
+    if value == 'all':
+        return count
+    elif value == 'majority':
+        return count // 2 + 1
+
+    try:
+        return min(max(int(value), 1), count)
+    except ValueError:
+        raise SettingsError("Invalid 'kvdb_write_quorum': %s" % value)
+
+
+def print_report(results):
+    """Print table of the results of writes to Redis endpoints."""
+    fmt = "{:<30} {:<30} {:<7} {:>7} {:>10}  {}"
+    print(fmt.format("Redis endpoint", "Settings", "Status", "Version",
+                     "Time [ms]", "Error"))
+
+    for res in results:
+        print(fmt.format(
+            res['label'][:30], res['urn'][-30:],
+            'failed' if res['error'] else 'ok',
+            '-' if res['version'] is None else res['version'],
+            '%.1f' % (res['elapsed'] * 1000), res['error'] or ''))
+
+
+def _to_int(value):
+    return int(value.decode() if isinstance(value, bytes) else value)
+
 
+def read_versions(urn, host, port, db=0, password=None, timeout=None):
+    """Return version counter, current version and kept versions of urn.
+
+    The kept versions are returned as a dictionary mapping version numbers
+    to the SHA-1 digest of their settings. The counter is 0 and the current
+    version None if no settings were stored yet.
+
+    """
+    redisc = _get_redis(host, port, db, password, timeout)
+    counter, current = redisc.mget(counter_key(urn), current_key(urn))
+    versions = [_to_int(v) for v in redisc.lrange(versions_key(urn), 0, -1)]
+    payloads = (redisc.mget([version_key(urn, v) for v in versions])
+                if versions else [])
+    kept = dict((version, hashlib.sha1(payload).hexdigest())
+                for version, payload in zip(versions, payloads)
+                if payload is not None)
+    return (0 if counter is None else _to_int(counter),
+            None if current is None else _to_int(current), kept)
+
+
+def select_rollback_version(urn, states, version=None):
+    """Return the version of urn to roll back to in all Redis endpoints.
+
+    states are the results of ``read_versions`` for the endpoints. If
+    version is None, the newest version older than the current one and kept
+    in all endpoints is selected. Raises SettingsError if there is no such
+    version, the endpoints disagree on the current version or the settings
+    of the version differ between endpoints.
+
+    """
+    states = list(states)
+
+    if version is None:
+        currents = set(current for _, current, _ in states)
+        if len(currents) > 1:
+            raise SettingsError("Current versions of settings '%s' differ "
+                                "between Redis endpoints." % urn)
+
+        current = currents.pop()
+        kept = set.intersection(*[set(kept) for _, _, kept in states])
+        older = [v for v in kept if current is not None and v < current]
+        if not older:
+            raise SettingsError("No version of settings '%s' older than the "
+                                "current one kept in all Redis endpoints." %
+                                urn)
+        version = max(older)
+
+    digests = set(kept.get(version) for _, _, kept in states)
+    if None in digests:
+        raise SettingsError("Version %s of settings '%s' not kept in all "
+                            "Redis endpoints." % (version, urn))
+    if len(digests) > 1:
+        raise SettingsError("Version %s of settings '%s' differs between "
+                            "Redis endpoints." % (version, urn))
+
+    return version
+
+
+def write_settings_to_db(settings, urn, host, port, db=0, password=None,
+                         keep=KEEP_VERSIONS, encoding='json',
+                         compression='none', threshold=DEFAULT_THRESHOLD,
+                         timeout=None, version=None):
+    """Write given settings dictionary to Redis on specified host and port.
+
+    Stores the settings as a new version, makes it the current version and
+    publishes its number. Versions beyond the newest keep versions are
+    removed. The settings are encoded and, if at least threshold bytes long,
+    compressed as given (see ``zatodeploy.settingscodec``). Returns the new
+    version number.
+
+    The version number is taken from the version counter of the DB, unless
+    given (to store the same version in several DBs), in which case the
+    counter is set to it.
+
+    """
+    redisc = _get_redis(host, port, db, password, timeout)
+    if version is None:
+        version = redisc.incr(counter_key(urn))
+    payload = encode_settings(settings, encoding, compression, threshold)
+
+    # MULTI/EXEC transaction, so readers never see a partial update
     with redisc.pipeline() as pipe:
-        pipe.delete(urn)
-        pipe.set(urn, json.dumps(settings))
+        pipe.set(counter_key(urn), version)
+        pipe.set(version_key(urn, version), payload)
+        pipe.set(urn, payload)
+        pipe.set(current_key(urn), version)
+        pipe.lpush(versions_key(urn), version)
+        pipe.publish(changes_channel(urn), version)
         pipe.execute()
 
+    log.info("Stored settings '%s' version %s (%i bytes) in Redis DB %i at "
+             "%s:%s.", urn, version, len(payload), db, host, port)
+
+    old = redisc.lrange(versions_key(urn), max(keep, 1), -1)
+    if old:
+        with redisc.pipeline() as pipe:
+            for old_version in old:
+                pipe.delete(version_key(urn, _to_int(old_version)))
+            pipe.ltrim(versions_key(urn), 0, max(keep, 1) - 1)
+            pipe.execute()
+
+    return version
+
+
+def rollback_settings(urn, host, port, db=0, password=None, version=None,
+                      timeout=None):
+    """Make an older kept version of the settings the current one.
+
+    If version is None, the version before the current one is used. Returns
+    the version rolled back to. Raises SettingsError if there is no such
+    version.
+
+    """
+    redisc = _get_redis(host, port, db, password, timeout)
+    versions = [_to_int(v) for v in redisc.lrange(versions_key(urn), 0, -1)]
+    current = redisc.get(current_key(urn))
+
+    if version is None:
+        older = [v for v in versions
+                 if current is not None and v < _to_int(current)]
+        if not older:
+            raise SettingsError("No version of settings '%s' older than the "
+                                "current one kept." % urn)
+        version = older[0]
+
+    payload = redisc.get(version_key(urn, version))
+    if version not in versions or payload is None:
+        raise SettingsError("Version %s of settings '%s' not kept." %
+                            (version, urn))
+
+    with redisc.pipeline() as pipe:
+        pipe.set(urn, payload)
+        pipe.set(current_key(urn), version)
+        pipe.publish(changes_channel(urn), version)
+        pipe.execute()
+
+    log.info("Rolled back settings '%s' to version %s in Redis DB %i at "
+             "%s:%s.", urn, version, db, host, port)
+    return version
+
+
+def read_target_settings(config):
+    """Return (urn, settings) of a deployment target or None if it has none.
+
+    The settings are read from the file given by the ``settings`` option or,
+    if not set, from ``settings.conf`` if it exists. Raises SettingsError if
+    the file can not be read.
+
+    """
+    filename = config.get('settings')
+
+    if filename and not exists(filename):
+        raise SettingsError("Settings file '%s' not found." % filename)
+    elif not filename:
+        if not exists('settings.conf'):
+            return None
+        filename = 'settings.conf'
+
+    try:
+        return read_settings(filename)
+    except Exception as exc:
+        raise SettingsError("Could not load settings: %s" % exc)
+
+
+def get_target_writes(config):
+    """Return list of the writes of the settings of a deployment target.
+
+    Each write is a dictionary with the endpoint, its label, the timeout
+    and the parameters of ``write_settings_to_db``. Returns an empty list if
+    the target has no settings. Raises SettingsError or ValueError for
+    invalid options.
+
+    """
+    urn_settings = read_target_settings(config)
+
+    if urn_settings is None:
+        log.info("No settings file specified and no default file found.")
+        return []
+
+    encoding = config.get('settings_encoding') or 'json'
+    compression = config.get('settings_compression') or 'none'
+    check_codec(encoding, compression)
+
+    params = dict(
+        settings=urn_settings[1], urn=urn_settings[0],
+        keep=int(config.get('settings_keep') or KEEP_VERSIONS),
+        encoding=encoding, compression=compression,
+        threshold=int(config.get('settings_compress_threshold') or
+                      DEFAULT_THRESHOLD))
+    timeout = float(config.get('kvdb_timeout') or DEFAULT_TIMEOUT)
+
+    return [dict(label=endpoint_label(endpoint), endpoint=endpoint,
+                 params=params, timeout=timeout)
+            for endpoint in get_endpoints(config)]
+
+
+def collect_writes(config, targets):
+    """Return the writes of all targets and the quorum of each target.
+
+    Returns a tuple of an ordered dictionary mapping (endpoint label, urn)
+    to the write (see ``get_target_writes``) and an ordered dictionary
+    mapping targets to (quorum, list of their write keys). A write shared by
+    several targets is done once. Raises SettingsError if targets are not
+    defined or their options are invalid, or if targets have different
+    settings for the same URN, since a version number must denote the same
+    settings in all Redis DBs.
+
+    """
+    writes = OrderedDict()
+    target_writes = OrderedDict()
+    urn_params = {}
+
+    for target in targets:
+        if target not in config:
+            raise SettingsError("Deployment target '{}' not defined in "
+                                "deployment configuration.".format(target))
+
+        try:
+            target_list = get_target_writes(config[target])
+            quorum = get_quorum(config[target], len(target_list))
+        except (SettingsError, ValueError) as exc:
+            raise SettingsError("Target '{}': {}".format(target, exc))
+
+        if not target_list:
+            continue
+
+        params = target_list[0]['params']
+        if urn_params.setdefault(params['urn'], params) != params:
+            raise SettingsError(
+                "Target '{}': settings '{}' or their options differ from "
+                "those of another target.".format(target, params['urn']))
+
+        target_writes[target] = (quorum, [])
+
+        for write in target_list:
+            key = (write['label'], params['urn'])
+            log.debug("Redis endpoint for target '%s': %s", target,
+                      write['label'])
+            target_writes[target][1].append(key)
+
+            if key not in writes:
+                writes[key] = write
+            else:
+                log.debug("Redis endpoint %s shared with another target.",
+                          write['label'])
+
+    return writes, target_writes
+
+
+def _on_endpoint(action, write):
+    """Call action(write, host, port) and return result dictionary."""
+    start = time.time()
+    value = error = None
+
+    try:
+        host, port = resolve_endpoint(write['endpoint'], write['timeout'])
+        value = action(write, host, port)
+    except Exception as exc:
+        error = str(exc) or type(exc).__name__
+        log.error("Could not write settings '%s' to Redis endpoint %s: %s",
+                  write['params']['urn'], write['label'], error)
+
+    return dict(label=write['label'], urn=write['params']['urn'],
+                value=value, error=error, version=None,
+                elapsed=time.time() - start)
+
+
+def _get_versions(write, host, port):
+    endpoint = write['endpoint']
+    return read_versions(write['params']['urn'], host, port, endpoint['db'],
+                         endpoint['password'], write['timeout'])
+
+
+def _store(write, host, port):
+    endpoint, params = write['endpoint'], write['params']
+
+    if write['rollback']:
+        return rollback_settings(params['urn'], host, port, endpoint['db'],
+                                 endpoint['password'], write['version'],
+                                 write['timeout'])
+
+    return write_settings_to_db(
+        host=host, port=port, db=endpoint['db'],
+        password=endpoint['password'], timeout=write['timeout'],
+        version=write['version'], **params)
+
+
+def read_states(writes):
+    """Read the versions of all endpoints concurrently.
+
+    Returns the results of the reads (see ``_on_endpoint``) in the order of
+    writes and a dictionary mapping URNs to dictionaries mapping the keys of
+    the writes read successfully to the result of ``read_versions``.
+
+    """
+    results = run_concurrently(partial(_on_endpoint, _get_versions),
+                               list(writes.values()), len(writes))
+    states = {}
+
+    for key, res in zip(writes, results):
+        if not res['error']:
+            states.setdefault(res['urn'], OrderedDict())[key] = res['value']
+
+    return results, states
+
+
+def select_versions(states, results, rollback=False, to_version=None):
+    """Return dictionary mapping URNs to the version to store or roll back to.
+
+    New versions are one more than the highest version counter, so they
+    mean the same in all Redis DBs. For rollbacks, the version is selected
+    with ``select_rollback_version`` and, if that fails, the error is set in
+    the results of the URN.
+
+    """
+    if not rollback:
+        return dict((urn, max(state[0] for state in urn_states.values()) + 1)
+                    for urn, urn_states in states.items())
+
+    versions = {}
+
+    for urn, urn_states in states.items():
+        try:
+            versions[urn] = select_rollback_version(
+                urn, urn_states.values(), to_version)
+        except SettingsError as exc:
+            log.error("%s", exc)
+            for res in results:
+                if res['urn'] == urn:
+                    res['error'] = str(exc)
+
+    return versions
+
+
+def store_all(writes, results, versions, rollback=False):
+    """Store settings (or roll back) in all endpoints read successfully.
+
+    Returns the results of all writes in the order of writes.
+
+    """
+    pending = []
+
+    for write, res in zip(writes.values(), results):
+        if not res['error']:
+            pending.append(dict(write, rollback=rollback,
+                                version=versions[res['urn']]))
+
+    stored = run_concurrently(partial(_on_endpoint, _store), pending,
+                              len(pending))
+
+    for res in stored:
+        res['version'] = res['value']
+
+    by_key = dict(((res['label'], res['urn']), res) for res in stored)
+    return [by_key.get((res['label'], res['urn']), res) for res in results]
+
+
+def check_quorum(target_writes, results):
+    """Return list of problems for targets whose write quorum was not met."""
+    failed = set((res['label'], res['urn']) for res in results
+                 if res['error'])
+    problems = []
+
+    for target, (quorum, keys) in target_writes.items():
+        written = len([key for key in keys if key not in failed])
+        if written < quorum:
+            problems.append(
+                "Target '{}': settings written to {} of {} Redis endpoint(s), "
+                "quorum is {}.".format(target, written, len(keys), quorum))
+
+    return problems
+
 
 def main(args=None):
     """Main script entry point function.
@@ -70,6 +590,12 @@ def main(args=None):
         help="Enable verbose output")
     ap.add_argument('-c', '--config', default="deploy.conf",
         help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('--rollback', action="store_true",
+        help="Make the version before the current one (or the version given "
+             "with --to-version) the current version instead of storing "
+             "settings")
+    ap.add_argument('--to-version', type=int,
+        help="Version to roll back to")
     ap.add_argument('target', nargs="*",
         help="Deployment target(s) (default: all)")
 
@@ -94,57 +620,27 @@ def main(args=None):
         log.error(msg)
         return msg
 
-    redis_connections = set()
-
-    for target in targets:
-        if target not in config:
-            msg = ("Deployment target '{}' not defined in deployment "
-                   "configuration.".format(target))
-            log.error(msg)
-            return msg
-
-        settings_fn = config[target].get('settings')
-
-        if settings_fn:
-            if exists(settings_fn):
-                try:
-                    urn, settings = read_settings(settings_fn)
-                except Exception as exc:
-                    msg = "Could not load settings: %s" % exc
-                    log.error(msg)
-                    return(msg)
-            else:
-                msg = "Settings file '%s' not found. Aborting." % settings_fn
-                log.warn(msg)
-                return msg
-        elif exists('settings.conf'):
-            try:
-                urn, settings = read_settings('settings.conf')
-            except Exception as exc:
-                msg = "Could not load settings: %s" % exc
-                log.error(msg)
-                return(msg)
-        else:
-            log.info("No settings file specified and no default file found.")
-            continue
-
-        host = config[target].get('kvdb_host') or REDIS_HOST
-        port = int(config[target].get('kvdb_port') or REDIS_PORT)
-        db = int(config[target].get('kvdb_db') or 0)
-        password = config[target].get('kvdb_password') or None
-        log.debug("Redis connection settings: host='%s' port=%s db=%i",
-                  host, port, db)
-
-        if (host, port) not in redis_connections:
-            redis_connections.add((host, port, db))
-            try:
-                write_settings_to_db(settings, urn, host, port, db, password)
-            except redis.ResponseError as exc:
-                log.error("Could not write settings to Redis DB: %s", exc)
-                return 1
-        else:
-            log.info("Redis database %i at %s:%s already updated.",
-                     db, host, port)
+    try:
+        writes, target_writes = collect_writes(config, targets)
+    except SettingsError as exc:
+        log.error("%s", exc)
+        return str(exc)
+
+    if not writes:
+        return
+
+    # read the versions of all endpoints at once, then write to them at once
+    results, states = read_states(writes)
+    versions = select_versions(states, results, args.rollback,
+                               args.to_version)
+    results = store_all(writes, results, versions, args.rollback)
+    print_report(results)
+
+    problems = check_quorum(target_writes, results)
+    if problems:
+        for problem in problems:
+            log.error(problem)
+        return " ".join(problems)
 
 
 if __name__ == '__main__':
@@ -9,6 +9,10 @@ Run ``updatepassword -h`` for usage help.
 
 This script changes the password directly in the Zato ODB.
 
+With ``--batch FILE``, the passwords of all security definitions listed in
+the file (one ``secdef:password`` pair per line) are updated in a single
+transaction. Each security definition may only be listed once.
+
 """
 
 from __future__ import absolute_import, print_function
@@ -20,12 +24,10 @@ from os.path import join
 
 from bunch import bunchify
 
-import sqlalchemy
-
 from zato.cli import ManageCommand
 from zato.cli.zato_command import add_opts
-from zato.common.crypto import CryptoManager
-from zato.common.odb.model import HTTPBasicAuth
+
+from zatodeploy.setpassword import read_passwords
 
 
 def get_arg_parser(opts):
@@ -51,25 +53,42 @@ class UpdateSecDefPassword(ManageCommand):
         {
             'name': 'path',
             'help': 'Path to the Zato web-admin component'
-        },
-        {
-            'name': 'secdef',
-            'help': 'Name of security definition to change the password of'
-        },
-        {
-            'name': 'password',
-            'help': 'New password for security definition'
         }
     ]
 
     def __init__(self):
         """Initialize this zato.cli.ZatoCommand sub-class with command line."""
         parser = get_arg_parser(self.opts)
+        parser.add_argument('secdef', nargs='?',
+            help='Name of security definition to change the password of')
+        parser.add_argument('password', nargs='?',
+            help='New password for security definition')
+        parser.add_argument('--batch', metavar='FILE',
+            help="File with one 'secdef:password' pair per line")
         self.args = parser.parse_args()
+
+        if not self.args.batch and (self.args.secdef is None or
+                                    self.args.password is None):
+            parser.error("secdef and password or --batch are required.")
+
         super(UpdateSecDefPassword, self).__init__(self.args)
 
     def _on_web_admin(self, args):
-        """Load ODB using component config and update security definition."""
+        """Load ODB using component config and update security definitions."""
+        # imported here, since they are only needed once the command runs
+        import sqlalchemy
+        import sqlalchemy.orm
+        from zato.common.crypto import CryptoManager
+
+        if args.batch:
+            try:
+                passwords = dict(read_passwords(args.batch, unique=True))
+            except (IOError, ValueError) as exc:
+                self.logger.error("%s", exc)
+                return 1
+        else:
+            passwords = {args.secdef: args.password}
+
         config_file = join(self.config_dir, 'repo', 'web-admin.conf')
 
         with open(config_file) as fp:
@@ -89,28 +108,50 @@ class UpdateSecDefPassword(ManageCommand):
             c.DATABASE_NAME)
 
         engine = sqlalchemy.create_engine(engine_url)
-        session = self._get_session(engine)
 
-        if engine.dialect.has_table(engine.connect(), 'sec_basic_auth'):
-            try:
-                secdef = session.query(HTTPBasicAuth).filter(
-                    HTTPBasicAuth.name == args.secdef).one()
-            except sqlalchemy.orm.exc.NoResultFound:
+        try:
+            # use one connection for the table check, query and update
+            with engine.connect() as conn:
+                if not engine.dialect.has_table(conn, 'sec_basic_auth'):
+                    msg = "Zato ODB does not seem to have been set up yet."
+                    self.logger.error(msg)
+                    return self.SYS_ERROR.NO_ODB_FOUND
+
+                session = sqlalchemy.orm.Session(bind=conn)
+                try:
+                    return self._update_passwords(session, passwords)
+                finally:
+                    session.close()
+        finally:
+            engine.dispose()
+
+    def _update_passwords(self, session, passwords):
+        """Set passwords of security definitions in one transaction.
+
+        No password is changed if any of the security definitions does not
+        exist.
+
+        """
+        from zato.common.odb.model import HTTPBasicAuth
+
+        secdefs = session.query(HTTPBasicAuth).filter(
+            HTTPBasicAuth.name.in_(list(passwords))).all()
+
+        missing = set(passwords) - set(secdef.name for secdef in secdefs)
+        if missing:
+            for name in sorted(missing):
                 self.logger.error(
-                    "Security definition '%s' not found.", args.secdef)
-                return 1
+                    "Security definition '%s' not found.", name)
+            return 1
 
+        for secdef in secdefs:
             self.logger.info("Security definition: %s" % secdef.name)
             self.logger.info("Username: %s" % secdef.username)
-            self.logger.info("Old password: %s" % secdef.password)
             self.logger.info("Setting new password.")
-            secdef.password = args.password
-            session.commit()
-            self.logger.info('OK')
-        else:
-            msg = "Zato ODB does not seem to have been set up yet."
-            self.logger.error(msg)
-            return self.SYS_ERROR.NO_ODB_FOUND
+            secdef.password = passwords[secdef.name]
+
+        session.commit()
+        self.logger.info('OK (%i password(s) updated)', len(secdefs))
 
     def _on_lb(self, args):
         """Print error when wrong zato component is specified."""
@@ -9,19 +9,27 @@ from __future__ import absolute_import, print_function
 
 import argparse
 import base64
-import glob
 import logging
 import sys
+import time
 
-from os.path import basename, exists
+from functools import partial
+from os.path import basename, getsize
 
 # do not use relative import here, because this module should be executable
 # as a command line script
-from zatodeploy.common import json_call, read_ini_config
+from zatodeploy.common import get_service_list, json_call, read_ini_config
+from zatodeploy.executor import get_concurrency, run_concurrently
 
 
 log = logging.getLogger(__name__)
 
+# seconds to wait for uploaded services to appear in the cluster
+UPLOAD_WAIT_TIMEOUT = 30
+# seconds to wait when services of uploaded modules can not be predicted
+UPLOAD_WAIT_FALLBACK = 2
+POLL_INTERVAL = 0.5
+
 
 def upload_service(config, filename):
     """Make a JSON-HTTP call to Zato to upload a service module.
@@ -43,6 +51,133 @@ def upload_service(config, filename):
     log.info("Service module {} uploaded successfully.".format(filename))
 
 
+def wait_for_services(config, names, timeout=UPLOAD_WAIT_TIMEOUT):
+    """Wait until all named services are registered in the Zato cluster.
+
+    Returns the set of names still missing after the timeout (empty if all
+    services appeared).
+
+    """
+    deadline = time.time() + timeout
+    missing = set(names)
+
+    while missing:
+        existing = set(srv.name for srv in
+                       get_service_list(config, use_cache=False))
+        missing -= existing
+
+        if not missing or time.time() >= deadline:
+            break
+
+        log.debug("Waiting for services: %s", ", ".join(sorted(missing)))
+        time.sleep(POLL_INTERVAL)
+
+    return missing
+
+
+def wait_for_uploaded_services(config, modules, analyzer):
+    """Wait for the services the uploaded modules define to be registered.
+
+    The service names are predicted by static analysis of the modules. If
+    this is not possible for some module, a fixed time is waited instead.
+    This includes non-empty modules in which no services were found, e.g.
+    because their service base class is imported from another module.
+
+    Returns an error message if services did not appear in time.
+
+    """
+    names = set()
+    unpredictable = False
+
+    for module, module_names in analyzer.get_all_service_names(
+            modules).items():
+        if (module_names is None or None in module_names or
+                (not module_names and getsize(module) > 0)):
+            unpredictable = True
+        names.update(name for name in module_names or () if name)
+
+    analyzer.save()
+    timeout = float(config.get('upload_wait_timeout') or UPLOAD_WAIT_TIMEOUT)
+    missing = wait_for_services(config, names, timeout)
+
+    if missing:
+        msg = ("Services not registered after {} seconds: {}".format(
+            timeout, ", ".join(sorted(missing))))
+        log.error(msg)
+        return msg
+
+    if unpredictable:
+        # give asynchronous upload operation some time to finish
+        time.sleep(UPLOAD_WAIT_FALLBACK)
+
+
+def check_compile(modules, cache_dir=None):
+    """Check modules for syntax errors and log them.
+
+    Returns the number of modules which do not compile.
+
+    """
+    from zatodeploy.compilecheck import check_modules
+
+    errors = check_modules(modules, cache_dir)
+
+    for module, error in sorted(errors.items()):
+        log.error("Service module %s does not compile: %s", module, error)
+
+    return len(errors)
+
+
+def upload_changed_modules(config, targets, finder, changed, args,
+                           cache_dir, analyzer):
+    """Upload changed modules to the targets whose module patterns match."""
+    if not args.no_check and check_compile(changed, cache_dir):
+        return
+
+    uploaded = set()
+
+    for target in targets:
+        modules = set(finder.find(config[target].get('modules', '')))
+        cluster = (config[target].lb_host, config[target].lb_port,
+                   config[target].cluster)
+        pending = [module for module in changed if module in modules and
+                   (cluster, module) not in uploaded]
+
+        if pending:
+            run_concurrently(partial(upload_service, config[target]),
+                             pending, get_concurrency(config[target]))
+            uploaded.update((cluster, module) for module in pending)
+
+            if args.wait:
+                wait_for_uploaded_services(config[target], pending, analyzer)
+
+
+def watch_modules(config, targets, finder, args, cache_dir, analyzer):
+    """Upload changed service modules of the targets until interrupted."""
+    from zatodeploy.watcher import DEBOUNCE, ModuleWatcher
+
+    watcher = ModuleWatcher(
+        [config[target].get('modules', '') for target in targets], finder,
+        DEBOUNCE if args.debounce is None else args.debounce)
+    log.info("Watching service modules for changes (%s). Press Ctrl-C to "
+             "stop.", "inotify" if watcher.uses_inotify else "polling")
+
+    try:
+        for changed in watcher.changes():
+            log.info("Changed service module(s): %s", ", ".join(changed))
+            start = time.time()
+
+            try:
+                upload_changed_modules(config, targets, finder, changed, args,
+                                       cache_dir, analyzer)
+            except Exception as exc:
+                log.error("Upload of changed modules failed: %s", exc)
+            else:
+                log.info("Changes processed in %.2f seconds.",
+                         time.time() - start)
+    except KeyboardInterrupt:
+        log.info("Stopped watching service modules.")
+
+
 def main(args=None):
     """Main script entry point function.
 
@@ -56,6 +191,17 @@ def main(args=None):
         help="Enable verbose output")
     ap.add_argument('-c', '--config', default="deploy.conf",
         help="Deployment configuration settings file (default: %(default)s)")
+    ap.add_argument('-w', '--wait', action="store_true",
+        help="Wait until the services defined in the uploaded modules are "
+             "registered in the cluster")
+    ap.add_argument('--no-check', action="store_true",
+        help="Do not check modules for syntax errors before uploading")
+    ap.add_argument('--watch', action="store_true",
+        help="After uploading, keep watching the modules and upload "
+             "changed modules until interrupted")
+    ap.add_argument('--debounce', type=float,
+        help="Seconds without further changes before changed modules are "
+             "uploaded in watch mode (default: 0.2)")
     ap.add_argument('target', nargs="*",
         help="Deployment target(s) (default: all)")
 
@@ -80,6 +226,16 @@ def main(args=None):
         log.error(msg)
         return msg
 
+    # imported here, so the script starts quickly, e.g. for '-h'
+    from zatodeploy.analyzer import ServiceAnalyzer
+    from zatodeploy.discovery import ModuleFinder
+
+    finder = ModuleFinder()
+    uploaded = set()
+    cache_dir = config['zato'].get('cache_dir') if 'zato' in config else None
+    analyzer = ServiceAnalyzer(cache_dir)
+    target_modules = []
+
     for target in targets:
         if target not in config:
             msg = ("Deployment target '{}' not defined in deployment "
@@ -87,33 +243,51 @@ def main(args=None):
             log.error(msg)
             return msg
 
-        target_services = []
-        for srv in config[target].get('modules', '').split(','):
-            srv = srv.strip()
-
-            if not srv:
-                continue
-
-            target_services.extend(glob.glob(srv))
+        target_services = finder.find(config[target].get('modules', ''))
 
         log.debug("Service modules to deploy to target '{}': {}".format(
             target, ", ".join(target_services)))
+        target_modules.append((target, target_services))
 
+    # check all modules before uploading anything
+    failed = 0 if args.no_check else check_compile(
+        set(module for _, modules in target_modules for module in modules),
+        cache_dir)
+    if failed:
+        msg = ("{} service module(s) failed to compile. Aborting.".format(
+            failed))
+        log.error(msg)
+        return msg
+
+    for target, target_services in target_modules:
         config[target].setdefault('verbose', args.verbose)
 
+        # skip modules already uploaded to the same cluster for another target
+        cluster = (config[target].lb_host, config[target].lb_port,
+                   config[target].cluster)
+        pending = [module for module in target_services
+                   if (cluster, module) not in uploaded]
+        for module in set(target_services) - set(pending):
+            log.info("Service module {} already uploaded to cluster.".format(
+                module))
+
         if target_services:
-            for module in target_services:
-                if exists(module):
-                    upload_service(config[target], module)
-                else:
-                    msg = ("Service module file '{}' not found. "
-                           "Aborting.".format(module))
-                    log.error(msg)
+            run_concurrently(partial(upload_service, config[target]),
+                             pending, get_concurrency(config[target]))
+            uploaded.update((cluster, module) for module in pending)
+
+            if args.wait:
+                msg = wait_for_uploaded_services(config[target], pending,
+                                                 analyzer)
+                if msg:
                     return msg
         else:
             log.info(
                 "No service modules to deploy for target '{}'.".format(target))
 
+    if args.watch:
+        watch_modules(config, targets, finder, args, cache_dir, analyzer)
+
 
 if __name__ == '__main__':
     sys.exit(main(sys.argv[1:]) or 0)
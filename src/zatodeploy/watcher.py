@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# zatodeploy/watcher.py
+#
+"""Watch service module files for changes.
+
+If the optional ``pyinotify`` package is installed, the directories the
+module patterns refer to are monitored with inotify, otherwise the files are
+polled periodically. Bursts of changes, e.g. an editor saving several files,
+are coalesced: changes are only reported once no further change happened for
+the debounce period.
+
+"""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+# standard library
+import logging
+import os
+import time
+
+# optional third-party
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+# local modules
+from .discovery import ModuleFinder, pattern_root, split_patterns
+
+
+__all__ = (
+    'DEBOUNCE',
+    'POLL_INTERVAL',
+    'ModuleWatcher'
+)
+
+log = logging.getLogger(__name__)
+
+# seconds without further changes before changes are reported
+DEBOUNCE = 0.2
+# seconds between checks for changes when polling
+POLL_INTERVAL = 0.25
+
+
+class ModuleWatcher(object):
+    """Report changed files matching any of several lists of patterns.
+
+    Each list of patterns (e.g. the ``modules`` setting of one deployment
+    target) is matched on its own, so exclusions only apply within the list.
+
+    """
+
+    def __init__(self, pattern_lists, finder=None, debounce=DEBOUNCE,
+                 interval=POLL_INTERVAL, use_inotify=True):
+        """Set up watcher for files matching the given pattern lists."""
+        self.pattern_lists = [split_patterns(patterns)
+                              if not isinstance(patterns, list) else patterns
+                              for patterns in pattern_lists]
+        self.finder = finder or ModuleFinder()
+        self.debounce = debounce
+        self.interval = interval
+        self._notifier = None
+
+        if use_inotify and pyinotify:
+            self._setup_inotify()
+
+    @property
+    def uses_inotify(self):
+        """Return True if changes are detected with inotify."""
+        return self._notifier is not None
+
+    def _setup_inotify(self):
+        roots = set(pattern_root(pattern) for patterns in self.pattern_lists
+                    for pattern in patterns if not pattern.startswith('!'))
+        wm = pyinotify.WatchManager()
+        mask = (pyinotify.IN_CLOSE_WRITE | pyinotify.IN_CREATE |
+                pyinotify.IN_DELETE | pyinotify.IN_MOVED_FROM |
+                pyinotify.IN_MOVED_TO)
+
+        for root in roots:
+            if os.path.isdir(root):
+                wm.add_watch(root, mask, rec=True, auto_add=True)
+
+        self._notifier = pyinotify.Notifier(wm, lambda event: None)
+        log.debug("Watching directories with inotify: %s",
+                  ", ".join(sorted(roots)))
+
+    def _next_events(self, timeout):
+        """Wait up to timeout seconds (or forever) for inotify events."""
+        if self._notifier.check_events(
+                None if timeout is None else int(timeout * 1000)):
+            self._notifier.read_events()
+            self._notifier.process_events()
+            return True
+        return False
+
+    def snapshot(self):
+        """Return dictionary mapping matching files to (mtime, size)."""
+        self.finder.clear()
+        res = {}
+
+        for patterns in self.pattern_lists:
+            for filename in self.finder.find(patterns):
+                try:
+                    st = os.stat(filename)
+                except OSError:
+                    # removed in the meantime
+                    continue
+                res[filename] = (st.st_mtime, st.st_size)
+
+        return res
+
+    def _wait_until_quiet(self, current):
+        """Wait until no more changes happen and return the last snapshot."""
+        if self._notifier:
+            while self._next_events(self.debounce):
+                pass
+            return self.snapshot()
+
+        while True:
+            time.sleep(self.debounce)
+            newer = self.snapshot()
+            if newer == current:
+                return current
+            current = newer
+
+    def changes(self):
+        """Yield sorted lists of new or modified files, forever.
+
+        Removed files are not reported.
+
+        """
+        last = self.snapshot()
+
+        while True:
+            if self._notifier:
+                self._next_events(None)
+                current = None
+            else:
+                time.sleep(self.interval)
+                current = self.snapshot()
+                if current == last:
+                    continue
+
+            current = self._wait_until_quiet(current)
+            changed = sorted(filename for filename, stat in current.items()
+                             if last.get(filename) != stat)
+            last = current
+
+            if changed:
+                yield changed
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_adviseoutgoings.py
+#
+"""Unit tests for zatodeploy.adviseoutgoings."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from zatodeploy.adviseoutgoings import (MIN_TIMEOUT, merge_recommendations,
+    recommend, update_definitions)
+from zatodeploy.probe import ProbeResult
+
+
+OUTGOINGS_CONF = """\
+[include]
+files = more-outgoings.conf
+
+# first outgoing
+[og1]
+name: og1
+; the pool size
+pool_size: 10
+host: http://localhost
+
+[og2]
+name = og2
+timeout = 5
+
+"""
+
+
+class TestRecommend(unittest.TestCase):
+
+    def result(self, *latencies):
+        result = ProbeResult('og', 'http://localhost')
+        for latency in latencies:
+            result.add(latency)
+        return result
+
+    def test_recommend(self):
+        result = self.result(*([0.1] * 19 + [0.5]))
+        # 100 requests/s with p95 latency 0.1 s and headroom 1.5
+        self.assertEqual(recommend(result, 100.0, 1.5, 4.0), (15, 2))
+
+    def test_without_expected_rate(self):
+        self.assertEqual(recommend(self.result(0.01), None, 1.5, 4.0),
+                         (None, MIN_TIMEOUT))
+
+    def test_no_success(self):
+        self.assertIsNone(recommend(self.result(None, None), 10.0))
+
+
+class TestMergeRecommendations(unittest.TestCase):
+
+    def test_largest_values(self):
+        updates = {}
+        merge_recommendations(updates, {'og1': (10, 5), 'og2': (1, 1)})
+        merge_recommendations(updates, {'og1': (20, 2)})
+        self.assertEqual(updates, {'og1': dict(pool_size=20, timeout=5),
+                                   'og2': dict(pool_size=1, timeout=1)})
+
+
+class TestUpdateDefinitions(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'outgoings.conf')
+        with io.open(self.filename, 'w', encoding='utf-8') as fp:
+            fp.write(OUTGOINGS_CONF)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def read(self):
+        with io.open(self.filename, encoding='utf-8') as fp:
+            return fp.read()
+
+    def test_update(self):
+        not_found = update_definitions(self.filename, {
+            'og1': dict(pool_size=20, timeout=3),
+            'og2': dict(pool_size=5, timeout=7),
+            'og3': dict(pool_size=1, timeout=1)})
+
+        self.assertEqual(not_found, ['og3'])
+        self.assertEqual(self.read(), OUTGOINGS_CONF
+            .replace("pool_size: 10\nhost: http://localhost\n",
+                     "pool_size: 20\nhost: http://localhost\ntimeout: 3\n")
+            .replace("timeout = 5\n", "timeout: 7\npool_size: 5\n"))
+
+    def test_unchanged(self):
+        self.assertEqual(update_definitions(self.filename, {}), [])
+        self.assertEqual(self.read(), OUTGOINGS_CONF)
+
+
+if __name__ == '__main__':
+    unittest.main()
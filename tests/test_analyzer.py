@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_analyzer.py
+#
+"""Unit tests for zatodeploy.analyzer."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+
+from zatodeploy.analyzer import (ServiceAnalyzer, default_service_name,
+    find_service_names)
+
+
+MODULE = '''
+from zato.server.service import Service
+from zato.server import service as zs
+
+
+class GetUserDetails(Service):
+    pass
+
+
+class Named(Service):
+    name = 'my.named-service'
+
+
+class NamedByMethod(zs.Service):
+    @staticmethod
+    def get_name():
+        return 'my.method-name'
+
+
+class Dynamic(Service):
+    name = 'prefix.' + 'suffix'
+
+
+class DerivedFromNamed(Named):
+    pass
+
+
+class DerivedFromDefault(GetUserDetails):
+    pass
+
+
+class NotAService(object):
+    name = 'not.a-service'
+'''
+
+
+class TestDefaultServiceName(unittest.TestCase):
+
+    def test_default_names(self):
+        self.assertEqual(default_service_name('mymodule', 'MyService'),
+                         'mymodule.my-service')
+        self.assertEqual(default_service_name('my_pkg.my_mod', 'Get'),
+                         'my-pkg.my-mod.get')
+        self.assertEqual(default_service_name('m', 'HTTPRequest'),
+                         'm.http-request')
+        self.assertEqual(default_service_name('m', 'get_user'),
+                         'm.get_user')
+
+
+class TestFindServiceNames(unittest.TestCase):
+
+    def test_names(self):
+        self.assertEqual(find_service_names(MODULE, 'users'), [
+            'users.get-user-details',
+            'my.named-service',
+            'my.method-name',
+            None,
+            'my.named-service',
+            'users.derived-from-default',
+        ])
+
+    def test_no_services(self):
+        self.assertEqual(find_service_names('import os\n', 'm'), [])
+
+    def test_syntax_error(self):
+        self.assertRaises(SyntaxError, find_service_names, 'class (:', 'm')
+
+
+class TestServiceAnalyzer(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, name, source):
+        path = join(self.tmpdir, name)
+        with open(path, 'w') as fp:
+            fp.write(source)
+        return path
+
+    def test_same_source_in_different_modules(self):
+        source = 'from zato.server.service import Service\n' \
+                 'class Ping(Service):\n    pass\n'
+        analyzer = ServiceAnalyzer()
+        self.assertEqual(analyzer.get_service_names(self.write('a.py',
+                                                               source)),
+                         ['a.ping'])
+        self.assertEqual(analyzer.get_service_names(self.write('b.py',
+                                                               source)),
+                         ['b.ping'])
+
+    def test_disk_cache(self):
+        cache_dir = join(self.tmpdir, 'cache')
+        path = self.write('mod.py', MODULE)
+        analyzer = ServiceAnalyzer(cache_dir)
+        names = analyzer.get_service_names(path)
+        analyzer.save()
+        self.assertTrue(os.listdir(cache_dir))
+        self.assertEqual(ServiceAnalyzer(cache_dir).get_service_names(path),
+                         names)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_benchchannels.py
+#
+"""Unit tests for zatodeploy.benchchannels."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy import benchchannels
+from zatodeploy.benchchannels import (BenchResult, bench_channel,
+    compare_to_baseline)
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+class FakeSession(object):
+    """Session answering all requests with the given HTTP status."""
+
+    def __init__(self, status):
+        self.status = status
+
+    def request(self, method, url, **kwargs):
+        return Bunch(status_code=self.status)
+
+    def close(self):
+        pass
+
+
+def make_result(*latencies):
+    result = BenchResult('ch', 'http://localhost/ch')
+    for latency in latencies:
+        result.add(latency)
+    return result
+
+
+class TestCompareToBaseline(unittest.TestCase):
+
+    def test_no_regression(self):
+        baseline = {'ch': dict(p95=0.2, error_rate=0.0)}
+        self.assertEqual(
+            compare_to_baseline([make_result(0.1, 0.2)], baseline, 0.1), [])
+
+    def test_latency_regression(self):
+        baseline = {'ch': dict(p95=0.1, error_rate=0.0)}
+        regressions = compare_to_baseline([make_result(0.1, 0.5)], baseline,
+                                          0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertIn('p95 latency', regressions[0])
+
+    def test_error_rate_without_baseline_value(self):
+        baseline = {'ch': dict(p95=1.0)}
+        regressions = compare_to_baseline([make_result(0.1, None)], baseline,
+                                          0.1)
+        self.assertEqual(regressions,
+                         ["Channel 'ch' error rate 50.0%, baseline 0.0%"])
+
+    def test_unknown_channel(self):
+        self.assertEqual(
+            compare_to_baseline([make_result(None)], {}, 0.1), [])
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class TestBenchChannel(unittest.TestCase):
+
+    def setUp(self):
+        self.status = 200
+        self._make_session = benchchannels.make_session
+        benchchannels.make_session = lambda config: FakeSession(self.status)
+
+    def tearDown(self):
+        benchchannels.make_session = self._make_session
+
+    def bench(self, **channel):
+        config = Bunch(lb_host='localhost', lb_port='11223')
+        channel = Bunch(name='ch', url_path='/ch', **channel)
+        return bench_channel(config, channel, duration=0.05, concurrency=2)
+
+    def test_success(self):
+        result = self.bench()
+        self.assertTrue(result.requests)
+        self.assertEqual(result.errors, 0)
+
+    def test_client_errors_count(self):
+        self.status = 404
+        # probe_ok_status only applies to the probes of rolling deployments
+        result = self.bench(probe_ok_status='404')
+        self.assertTrue(result.requests)
+        self.assertEqual(result.error_rate, 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
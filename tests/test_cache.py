@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_cache.py
+#
+"""Unit tests for zatodeploy.cache."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from os.path import exists, join
+
+from bunch import Bunch
+
+from zatodeploy.cache import InventoryCache, get_inventory_cache
+
+
+SERVICE = 'zato.service.get-list'
+DATA = {'cluster_id': 1}
+RESPONSE = {'zato_service_get_list_response': [{'id': 1, 'name': 'svc'}]}
+
+
+class TestInventoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.directory = join(self.tmpdir, 'cache')
+        self.cache = InventoryCache(self.directory, 'lb:11223/1')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get(SERVICE, DATA))
+        self.cache.put(SERVICE, DATA, RESPONSE)
+        self.assertEqual(self.cache.get(SERVICE, DATA), RESPONSE)
+        self.assertIsNone(self.cache.get(SERVICE, {'cluster_id': 2}))
+        self.assertEqual(os.path.basename(self.cache.filename),
+                         'inventory-lb_11223_1.json')
+
+    def test_shared_between_instances(self):
+        self.cache.put(SERVICE, DATA, RESPONSE)
+        other = InventoryCache(self.directory, 'lb:11223/1')
+        self.assertEqual(other.get(SERVICE, DATA), RESPONSE)
+
+    def test_expiry(self):
+        cache = InventoryCache(self.directory, 'lb:11223/1', ttl=0.05)
+        cache.put(SERVICE, DATA, RESPONSE)
+        time.sleep(0.1)
+        self.assertIsNone(cache.get(SERVICE, DATA))
+
+    def test_invalidate(self):
+        self.cache.put(SERVICE, DATA, RESPONSE)
+        self.cache.invalidate()
+        self.assertFalse(exists(self.cache.filename))
+        self.assertTrue(exists(self.cache.marker))
+        self.assertIsNone(self.cache.get(SERVICE, DATA))
+
+    def test_put_after_invalidation_skipped(self):
+        started = time.time()
+        self.cache.put(SERVICE, DATA, RESPONSE)
+        self.cache.invalidate()
+        self.cache.put(SERVICE, DATA, RESPONSE, since=started)
+        self.assertIsNone(self.cache.get(SERVICE, DATA))
+
+        self.cache.put(SERVICE, DATA, RESPONSE, since=time.time() + 1)
+        self.assertEqual(self.cache.get(SERVICE, DATA), RESPONSE)
+
+    def test_invalidated(self):
+        self.assertEqual(self.cache.invalidated(), 0)
+        os.makedirs(self.directory)
+        before = time.time()
+        self.cache.invalidate()
+        self.assertTrue(self.cache.invalidated() >= before)
+
+    def test_unreadable_file_ignored(self):
+        os.makedirs(self.directory)
+        with open(self.cache.filename, 'w') as fp:
+            fp.write('{not json')
+        self.assertIsNone(self.cache.get(SERVICE, DATA))
+        self.cache.put(SERVICE, DATA, RESPONSE)
+        self.assertEqual(self.cache.get(SERVICE, DATA), RESPONSE)
+
+
+class TestGetInventoryCache(unittest.TestCase):
+
+    def test_disabled(self):
+        config = Bunch(lb_host='lb', lb_port=11223, cluster=1)
+        self.assertIsNone(get_inventory_cache(config))
+
+    def test_enabled(self):
+        config = Bunch(lb_host='lb', lb_port=11223, cluster=1,
+                       cache_dir='/tmp/zd-cache', inventory_cache_ttl='60')
+        cache = get_inventory_cache(config)
+        self.assertEqual(cache.directory, '/tmp/zd-cache')
+        self.assertEqual(cache.ttl, 60)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_compilecheck.py
+#
+"""Unit tests for zatodeploy.compilecheck."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import json
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+
+from os.path import join
+
+from zatodeploy import compilecheck
+from zatodeploy.compilecheck import CACHE_FILENAME, check_modules
+
+
+class TestCheckModules(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache_dir = join(self.tmpdir, 'cache')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def module(self, name, source):
+        filename = join(self.tmpdir, name)
+        with io.open(filename, 'w', encoding='utf-8') as fp:
+            fp.write(source)
+        return filename
+
+    def test_errors(self):
+        good = self.module('good.py', "x = 1\n")
+        bad = self.module('bad.py', "def f(:\n    pass\n")
+
+        errors = check_modules([good, bad], processes=2)
+        self.assertEqual(list(errors), [bad])
+        self.assertIn('SyntaxError', errors[bad])
+
+    def test_in_thread(self):
+        # the check runs in deployment stage threads
+        filenames = [self.module('m%i.py' % i, "x = %i\n" % i)
+                     for i in range(3)]
+        result = []
+        thread = threading.Thread(
+            target=lambda: result.append(check_modules(filenames)))
+        thread.start()
+        thread.join(60)
+        self.assertEqual(result, [{}])
+
+    def test_cache(self):
+        good = self.module('good.py', "x = 1\n")
+        bad = self.module('bad.py', "x = (\n")
+
+        check_modules([good, bad], self.cache_dir)
+        with open(join(self.cache_dir, CACHE_FILENAME)) as fp:
+            self.assertEqual(len(json.load(fp)), 1)
+
+        compiled = []
+        compile_all = compilecheck._compile_all
+        compilecheck._compile_all = lambda filenames, processes=None: (
+            compiled.extend(filenames) or compile_all(filenames, processes))
+        try:
+            self.assertEqual(list(check_modules([good, bad], self.cache_dir)),
+                             [bad])
+        finally:
+            compilecheck._compile_all = compile_all
+
+        self.assertEqual(compiled, [bad])
+
+    def test_cache_key_includes_interpreter(self):
+        key = compilecheck._source_hash(b"x = 1\n")
+        executable = sys.executable
+        sys.executable = executable + '-other'
+        try:
+            self.assertNotEqual(compilecheck._source_hash(b"x = 1\n"), key)
+        finally:
+            sys.executable = executable
+
+
+if __name__ == '__main__':
+    unittest.main()
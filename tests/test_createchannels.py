@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_createchannels.py
+#
+"""Unit tests for the channel validation of zatodeploy.createchannels."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy.common import HTTPSOAPIndex
+from zatodeploy.createchannels import prepare_channel_data, validate_channels
+from zatodeploy.records import HTTPSOAPRecord
+
+
+CONFIG = Bunch(cluster=1)
+SERVICES = set(['svc.one', 'svc.two'])
+SECDEFS = [Bunch(name='basic-auth', id=7)]
+
+
+def channel(name, url_path, service='svc.one', **kwargs):
+    kwargs.setdefault('transport', 'plain_http')
+    return Bunch(name=name, url_path=url_path, service=service, **kwargs)
+
+
+class TestPrepareChannelData(unittest.TestCase):
+
+    def test_defaults_and_security_id(self):
+        data = prepare_channel_data(CONFIG, channel(
+            'a', '/a', security_id='basic-auth', probe_data='{}'), update=3,
+            secdefs=SECDEFS)
+        self.assertEqual(data['security_id'], 7)
+        self.assertEqual(data['id'], 3)
+        self.assertEqual(data['data_format'], '')
+        self.assertFalse('probe_data' in data)
+
+    def test_invalid_transport(self):
+        self.assertRaises(ValueError, prepare_channel_data, CONFIG,
+                          channel('a', '/a', transport='amqp'))
+
+    def test_soap_defaults(self):
+        data = prepare_channel_data(CONFIG, channel(
+            'a', '/a', transport='soap', soap_action='x'))
+        self.assertEqual(data['data_format'], 'xml')
+        self.assertEqual(data['soap_version'], '1.1')
+
+
+class TestValidateChannels(unittest.TestCase):
+
+    def validate(self, channels, existing=()):
+        return validate_channels(CONFIG, channels, HTTPSOAPIndex(existing),
+                                 SERVICES, SECDEFS)
+
+    def test_valid(self):
+        self.assertEqual(self.validate([
+            channel('a', '/a', method='GET'), channel('b', '/b', 'svc.two'),
+            channel('c', '/a', method='POST', security_id='basic-auth')]),
+            [])
+
+    def test_duplicate_name(self):
+        problems = self.validate([channel('a', '/a'), channel('a', '/b')])
+        self.assertEqual(len(problems), 1)
+        self.assertTrue("more than one" in problems[0])
+
+    def test_unknown_service_and_secdef(self):
+        problems = self.validate([
+            channel('a', '/a', 'svc.missing'),
+            channel('b', '/b', security_id='missing')])
+        self.assertEqual(len(problems), 2)
+        self.assertTrue("unknown service 'svc.missing'" in problems[0])
+        self.assertTrue("'missing'" in problems[1])
+
+    def test_url_path_conflicts(self):
+        problems = self.validate([
+            channel('a', '/a', method='GET'), channel('b', '/a'),
+            channel('c', '/a', method='POST')])
+        self.assertEqual(len(problems), 2)
+        self.assertTrue(all("URL path '/a'" in p for p in problems))
+
+    def test_conflict_with_existing_channel(self):
+        existing = [HTTPSOAPRecord(dict(id=1, name='old', url_path='/a')),
+                    HTTPSOAPRecord(dict(id=2, name='a', url_path='/b'))]
+        problems = self.validate([channel('new', '/a'),
+                                  channel('a', '/b')], existing)
+        self.assertEqual(len(problems), 1)
+        self.assertTrue("existing channel 'old'" in problems[0])
+
+    def test_invalid_data_reported(self):
+        problems = self.validate([channel('a', '/a', transport='amqp'),
+                                  channel('b', None)])
+        self.assertEqual(len(problems), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_discovery.py
+#
+"""Unit tests for zatodeploy.discovery."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from os.path import join
+
+from zatodeploy.discovery import ModuleFinder, _translate, pattern_root
+
+
+class TestTranslate(unittest.TestCase):
+
+    def assertMatches(self, pattern, path, matches=True):
+        result = bool(_translate(pattern).match(path))
+        self.assertEqual(result, matches, "%r %s %r" % (
+            pattern, "should match" if matches else "should not match", path))
+
+    def test_wildcards(self):
+        self.assertMatches('*.py', 'a.py')
+        self.assertMatches('*.py', 'a/b.py', False)
+        self.assertMatches('?.py', 'a.py')
+        self.assertMatches('[ab].py', 'b.py')
+        self.assertMatches('[!ab].py', 'b.py', False)
+
+    def test_wildcards_skip_dotfiles(self):
+        self.assertMatches('*.py', '.hidden.py', False)
+        self.assertMatches('?hidden.py', '.hidden.py', False)
+        self.assertMatches('.*.py', '.hidden.py')
+        self.assertMatches('x*.py', 'x.py')
+
+    def test_double_star(self):
+        self.assertMatches('**/*.py', 'a.py')
+        self.assertMatches('**/*.py', 'a/b/c.py')
+        self.assertMatches('a/**/c.py', 'a/c.py')
+        self.assertMatches('a/**/c.py', 'a/b/b/c.py')
+        self.assertMatches('a/**', 'a/b/c.py')
+        self.assertMatches('a/**', 'a', False)
+
+    def test_double_star_skips_hidden_directories(self):
+        self.assertMatches('**/*.py', '.git/a.py', False)
+        self.assertMatches('**/*.py', 'a/.git/b.py', False)
+        self.assertMatches('a/**', 'a/.git/b.py', False)
+        self.assertMatches('**/.git/*.py', 'a/.git/b.py')
+
+    def test_pattern_root(self):
+        self.assertEqual(pattern_root('src/**/*.py'), 'src')
+        self.assertEqual(pattern_root('!src/a/*.py'), 'src/a')
+        self.assertEqual(pattern_root('*.py'), '.')
+        self.assertEqual(pattern_root('src/a.py'), 'src')
+
+
+class TestModuleFinder(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cwd = os.getcwd()
+        os.chdir(self.tmpdir)
+
+        for path in ('src/a.py', 'src/.hidden.py', 'src/sub/b.py',
+                     'src/.git/c.py', 'lib/d.py'):
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            open(path, 'w').close()
+
+        os.symlink(join(self.tmpdir, 'lib'), 'src/linked')
+        # link back to an ancestor, which must not be followed
+        os.symlink(join(self.tmpdir, 'src'), 'src/sub/loop')
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def test_find(self):
+        finder = ModuleFinder()
+        self.assertEqual(finder.find('src/*.py'), ['src/a.py'])
+        self.assertEqual(finder.find('src/**/*.py'), [
+            'src/a.py', 'src/linked/d.py', 'src/sub/b.py'])
+        self.assertEqual(finder.find('src/.*.py'), ['src/.hidden.py'])
+        self.assertEqual(finder.find('src/**/.git/*.py'), ['src/.git/c.py'])
+
+    def test_exclude(self):
+        finder = ModuleFinder()
+        self.assertEqual(finder.find('src/**/*.py, !src/sub/*.py'), [
+            'src/a.py', 'src/linked/d.py'])
+
+    def test_literal_path(self):
+        finder = ModuleFinder()
+        self.assertEqual(finder.find(['src/.hidden.py', 'src/missing.py']),
+                         ['src/.hidden.py'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_executor.py
+#
+"""Unit tests for zatodeploy.executor."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import threading
+import time
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy.executor import (Stage, StageError, get_concurrency,
+    order_stages, run_concurrently, run_stages)
+
+
+class TestGetConcurrency(unittest.TestCase):
+
+    def test_values(self):
+        self.assertEqual(get_concurrency(Bunch()), 1)
+        self.assertEqual(get_concurrency(Bunch(concurrency='4')), 4)
+        self.assertEqual(get_concurrency(Bunch(concurrency='0')), 1)
+        self.assertEqual(get_concurrency(Bunch(concurrency='auto')), 32)
+        self.assertEqual(get_concurrency(
+            Bunch(concurrency='auto', max_concurrency='8')), 8)
+
+
+class TestRunConcurrently(unittest.TestCase):
+
+    def test_results_in_order(self):
+        def func(item):
+            time.sleep(0.01 * (5 - item))
+            return item * 2
+
+        self.assertEqual(run_concurrently(func, range(5), 5),
+                         [0, 2, 4, 6, 8])
+
+    def test_concurrency_bound(self):
+        lock = threading.Lock()
+        state = dict(active=0, peak=0)
+
+        def func(item):
+            with lock:
+                state['active'] += 1
+                state['peak'] = max(state['peak'], state['active'])
+            time.sleep(0.02)
+            with lock:
+                state['active'] -= 1
+
+        run_concurrently(func, range(10), 3)
+        self.assertEqual(state['peak'], 3)
+
+    def test_sequential(self):
+        threads = set()
+        run_concurrently(lambda item: threads.add(threading.current_thread()),
+                         range(3), 1)
+        self.assertEqual(threads, set([threading.current_thread()]))
+
+    def test_exception_reraised(self):
+        def func(item):
+            if item == 2:
+                raise ValueError(item)
+
+        self.assertRaises(ValueError, run_concurrently, func, range(4), 4)
+
+
+class TestOrderStages(unittest.TestCase):
+
+    def test_dependencies_first(self):
+        stages = [Stage('c', None, requires=('a', 'b')),
+                  Stage('b', None, requires=('a',)), Stage('a', None)]
+        self.assertEqual([stage.name for stage in order_stages(stages)],
+                         ['a', 'b', 'c'])
+
+    def test_unknown_dependency(self):
+        self.assertRaises(StageError, order_stages,
+                          [Stage('a', None, requires=('x',))])
+
+    def test_cycle(self):
+        self.assertRaises(StageError, order_stages, [
+            Stage('a', None, requires=('b',)),
+            Stage('b', None, requires=('a',))])
+
+
+
+class TestRunStages(unittest.TestCase):
+
+    def test_independent_stages_in_parallel(self):
+        barrier = threading.Event()
+        started = []
+
+        def first(args):
+            started.append('a')
+            # only returns if 'b' is started while 'a' is still running
+            if not barrier.wait(5):
+                raise StageError("'b' did not run in parallel")
+
+        def second(args):
+            started.append('b')
+            barrier.set()
+
+        def last(args):
+            started.append('c')
+
+        stages = [Stage('a', first), Stage('b', second),
+                  Stage('c', last, requires=('a', 'b'))]
+
+        self.assertIsNone(run_stages(stages, Bunch()))
+        self.assertEqual(started[-1], 'c')
+
+    def test_failure_stops_later_stages(self):
+        called = []
+
+        stages = [Stage('a', lambda args: 'broken'),
+                  Stage('b', lambda args: called.append('b'),
+                        requires=('a',))]
+
+        self.assertEqual(run_stages(stages, Bunch()),
+                         "Stage 'a' failed: broken")
+        self.assertEqual(called, [])
+
+    def test_exit_is_reported(self):
+        def exit_stage(args):
+            raise SystemExit(2)
+
+        error = run_stages([Stage('a', exit_stage)], Bunch())
+        self.assertIn("Stage 'a' failed", error)
+
+    def test_order_error(self):
+        error = run_stages([Stage('a', None, requires=('x',))], Bunch())
+        self.assertIn('unknown', error)
+
+
+if __name__ == '__main__':
+    unittest.main()
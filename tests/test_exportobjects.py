@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_exportobjects.py
+#
+"""Unit tests for zatodeploy.exportobjects."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy.common import find_security_id, read_ini_config
+from zatodeploy.exportobjects import export_objects, ini_sections, write_ini
+from zatodeploy.records import SecDefRecord
+
+
+def inventory(**kwargs):
+    res = dict(channels=[], outgoings=[], secdefs=[], services=[])
+    res.update(kwargs)
+    return res
+
+
+class TestWriteIni(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'test.conf')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_round_trip(self):
+        definitions = [
+            dict(name='rate 100%', url_path='/api/%(x)s', method='GET'),
+            dict(name='list[1]', url_path='/list'),
+            dict(name='include', url_path='/include'),
+            dict(name='DEFAULT', url_path='/default'),
+        ]
+        write_ini(self.filename, definitions)
+
+        config = read_ini_config(self.filename)
+        self.assertEqual(
+            sorted((dict(section) for section in config.values()),
+                   key=lambda d: d['name']),
+            sorted(definitions, key=lambda d: d['name']))
+
+    def test_line_break(self):
+        self.assertRaises(ValueError, write_ini, self.filename,
+                          [dict(name='ch', soap_action='a\nb')])
+
+    def test_ini_sections(self):
+        self.assertEqual(ini_sections(['a]', 'a_', 'include', 'include-2']),
+                         ['a_', 'a_-2', 'include-2', 'include-2-2'])
+
+
+class TestExportObjects(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_secdef_names_resolved_exactly(self):
+        secdefs = [SecDefRecord(id=1, name='api', username='u1'),
+                   SecDefRecord(id=2, name='api-admin', username='u2')]
+        channels = [Bunch(name='ch', connection='channel',
+                          transport='plain_http', url_path='/ch',
+                          security_name='api', is_active=True,
+                          is_internal=False)]
+        export_objects(inventory(channels=channels, secdefs=secdefs),
+                       self.tmpdir)
+
+        channel = read_ini_config(os.path.join(self.tmpdir,
+                                               'channels.conf'))['ch']
+        self.assertEqual(channel.is_active, 'true')
+        self.assertEqual(find_security_id(channel.security_id, None, secdefs),
+                         1)
+        self.assertRaises(ValueError, find_security_id, 'ap', None, secdefs)
+        self.assertEqual(find_security_id('admin', None, secdefs), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
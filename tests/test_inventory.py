@@ -0,0 +1,205 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_inventory.py
+#
+"""Unit tests for the HTTP/SOAP inventory of zatodeploy.common."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy import common
+from zatodeploy.common import (HTTPSOAPIndex, JSONCallResponseError,
+    get_http_soap_inventory, get_http_soap_list)
+from zatodeploy.records import HTTPSOAPRecord
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+def record(name, url_path, service_name, **kwargs):
+    return HTTPSOAPRecord(dict(name=name, url_path=url_path,
+                               service_name=service_name, **kwargs))
+
+
+class TestHTTPSOAPIndex(unittest.TestCase):
+
+    def test_indexes(self):
+        a = record('a', '/a', 'svc.one')
+        b = record('b', '/shared', 'svc.one')
+        c = record('c', '/shared', 'svc.two')
+        index = HTTPSOAPIndex([a, b, c])
+
+        self.assertEqual(len(index), 3)
+        self.assertEqual(list(index), [a, b, c])
+        self.assertTrue('b' in index)
+        self.assertFalse('d' in index)
+        self.assertIs(index['a'], a)
+        self.assertIsNone(index.get('d'))
+        self.assertEqual(index.by_url_path['/shared'], [b, c])
+        self.assertEqual(index.by_service['svc.one'], [a, b])
+
+
+class TestGetHTTPSOAPInventory(unittest.TestCase):
+
+    def setUp(self):
+        self.iter_http_soap_list = common.iter_http_soap_list
+        self.calls = []
+        self.use_cache = set()
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+        common.iter_http_soap_list = self.fake_list
+
+    def tearDown(self):
+        common.iter_http_soap_list = self.iter_http_soap_list
+
+    def fake_list(self, config, connection, transport, use_cache=True):
+        with self.lock:
+            self.calls.append((connection, transport))
+            self.use_cache.add(use_cache)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+
+        # give the other listings time to start
+        time.sleep(0.05)
+
+        with self.lock:
+            self.active -= 1
+
+        for i in range(2):
+            yield record('%s-%s-%i' % (connection, transport, i),
+                         '/%s/%i' % (transport, i), 'svc',
+                         connection=connection, transport=transport)
+
+    def test_all_listings_fetched_concurrently(self):
+        inventory = get_http_soap_inventory(Bunch(cluster=1))
+
+        self.assertEqual(sorted(self.calls), [
+            ('channel', 'plain_http'), ('channel', 'soap'),
+            ('outgoing', 'plain_http'), ('outgoing', 'soap')])
+        self.assertEqual(self.max_active, 4)
+        self.assertEqual(sorted(inventory), ['channel', 'outgoing'])
+        self.assertEqual(len(inventory['channel']), 4)
+        self.assertTrue('outgoing-soap-1' in inventory['outgoing'])
+        self.assertFalse('outgoing-soap-1' in inventory['channel'])
+
+    def test_selected_connections(self):
+        inventory = get_http_soap_inventory(Bunch(cluster=1), ('outgoing',))
+        self.assertEqual(list(inventory), ['outgoing'])
+        self.assertEqual(len(inventory['outgoing']), 4)
+
+    def test_use_cache(self):
+        get_http_soap_inventory(Bunch(cluster=1))
+        self.assertEqual(self.use_cache, set([True]))
+
+        self.use_cache.clear()
+        get_http_soap_inventory(Bunch(cluster=1), use_cache=False)
+        self.assertEqual(self.use_cache, set([False]))
+
+
+
+class FakeResponse(object):
+    """Streamed response with body sent in small chunks."""
+
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.reason = 'Reason'
+        self.encoding = None
+        self.body = body
+        self.closed = False
+
+    def iter_content(self, chunk_size, decode_unicode=False):
+        for i in range(0, len(self.body), 7):
+            yield self.body[i:i + 7]
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession(object):
+
+    def __init__(self):
+        self.responses = []
+        self.posts = []
+
+    def post(self, url, data=None, stream=False):
+        self.posts.append((url, json.loads(data)))
+        return self.responses.pop(0)
+
+
+def listing(objects, result='ZATO_OK'):
+    return json.dumps({'zato_http_soap_get_list_response': objects,
+                       'zato_env': {'result': result}})
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class TestStreamList(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.session = FakeSession()
+        self._get_session = common._get_session
+        common._get_session = lambda address, auth: self.session
+        self.config = Bunch(lb_host='localhost', lb_port=11223, cluster=1,
+                            http_user='u', http_password='p')
+
+    def tearDown(self):
+        common._get_session = self._get_session
+        shutil.rmtree(self.tmpdir)
+
+    def test_records(self):
+        resp = FakeResponse(200, listing([dict(id=1, name='a'),
+                                          dict(id=2, name='b')]))
+        self.session.responses.append(resp)
+
+        records = get_http_soap_list(self.config, 'channel', 'plain_http')
+        self.assertEqual([record.name for record in records], ['a', 'b'])
+        self.assertTrue(resp.closed)
+        self.assertEqual(self.session.posts[0][1],
+                         dict(cluster_id=1, connection='channel',
+                              transport='plain_http'))
+
+    def test_http_error(self):
+        resp = FakeResponse(500, '')
+        self.session.responses.append(resp)
+        self.assertRaises(JSONCallResponseError, get_http_soap_list,
+                          self.config, 'channel', 'plain_http')
+        self.assertTrue(resp.closed)
+
+    def test_zato_error(self):
+        self.session.responses.append(
+            FakeResponse(200, listing([dict(id=1, name='a')], 'ZATO_ERROR')))
+        items = common.iter_http_soap_list(self.config, 'channel', 'soap')
+        self.assertEqual(next(items).name, 'a')
+        self.assertRaises(JSONCallResponseError, next, items)
+
+    def test_cache(self):
+        self.config.cache_dir = self.tmpdir
+        for _ in range(2):
+            self.session.responses.append(
+                FakeResponse(200, listing([dict(id=1, name='a')])))
+
+        get_http_soap_list(self.config, 'channel', 'soap')
+        records = get_http_soap_list(self.config, 'channel', 'soap')
+        self.assertEqual([record.name for record in records], ['a'])
+        self.assertEqual(len(self.session.posts), 1)
+
+        records = list(common.iter_http_soap_list(self.config, 'channel',
+                                                  'soap', use_cache=False))
+        self.assertEqual([record.name for record in records], ['a'])
+        self.assertEqual(len(self.session.posts), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_jsonstream.py
+#
+"""Unit tests for zatodeploy.jsonstream."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import unittest
+
+from zatodeploy.jsonstream import JSONArrayStream
+
+
+KEY = 'zato_service_get_list_response'
+ITEMS = [{'id': i, 'name': 'svc-%i' % i, 'tricky': '"],[{' * (i % 3)}
+         for i in range(20)] + [12345, -6.5e-3, True, False, None, 'x', []]
+DOCUMENT = json.dumps(
+    {'zato_env': {'result': 'ZATO_OK'}, KEY: ITEMS, 'after': [1, 2]},
+    indent=1)
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestJSONArrayStream(unittest.TestCase):
+
+    def test_all_chunk_sizes(self):
+        for size in list(range(1, 12)) + [64, len(DOCUMENT)]:
+            stream = JSONArrayStream(chunked(DOCUMENT, size), KEY)
+            self.assertEqual(list(stream), ITEMS, "chunk size %i" % size)
+            self.assertEqual(stream.find_member('zato_env'),
+                             {'result': 'ZATO_OK'})
+            self.assertEqual(stream.find_member('after'), [1, 2])
+
+    def test_number_split_across_chunks(self):
+        stream = JSONArrayStream(['{"a": [6', '.', '5', ', 1', '2]}'], 'a')
+        self.assertEqual(list(stream), [6.5, 12])
+
+    def test_empty_chunks_and_array(self):
+        stream = JSONArrayStream(['', '{"a":', '', ' []', '', '}'], 'a')
+        self.assertEqual(list(stream), [])
+        self.assertEqual(json.loads(stream.rest), {'a': None})
+
+    def test_missing_array(self):
+        stream = JSONArrayStream(chunked('{"b": [1]}', 3), 'a')
+        self.assertRaises(ValueError, list, stream)
+
+    def test_unterminated_array(self):
+        stream = JSONArrayStream(chunked('{"a": [1, {"b": 2}', 4), 'a')
+        self.assertRaises(ValueError, list, stream)
+
+    def test_malformed_item(self):
+        stream = JSONArrayStream(chunked('{"a": [1, {"b": ]}', 4), 'a')
+        self.assertRaises(ValueError, list, stream)
+
+
+if __name__ == '__main__':
+    unittest.main()
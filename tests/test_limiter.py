@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_limiter.py
+#
+"""Unit tests for zatodeploy.limiter."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy import limiter as limiter_module
+from zatodeploy.limiter import AdaptiveLimiter, get_limiter
+
+
+def saturate(limiter, latency=0.1, kind='svc'):
+    """Make as many calls as the limit allows, all with given latency."""
+    started = [limiter.acquire() for _ in range(int(limiter.limit))]
+    for start in started:
+        limiter.release(start, kind, latency)
+
+
+class TestAdaptiveLimiter(unittest.TestCase):
+
+    def test_additive_increase(self):
+        limiter = AdaptiveLimiter(2, max_limit=4)
+        saturate(limiter)
+        self.assertTrue(2 < limiter.limit < 3)
+
+        for _ in range(20):
+            saturate(limiter)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_no_increase_when_not_saturated(self):
+        limiter = AdaptiveLimiter(2, max_limit=4)
+        for _ in range(5):
+            limiter.release(limiter.acquire(), 'svc', 0.1)
+        self.assertEqual(limiter.limit, 2)
+
+    def test_decrease_on_overload(self):
+        limiter = AdaptiveLimiter(8, max_limit=8)
+        limiter.release(limiter.acquire(), 'svc', overload=True)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_decrease_on_latency(self):
+        limiter = AdaptiveLimiter(8, max_limit=8)
+        limiter.release(limiter.acquire(), 'svc', 0.1)
+
+        for _ in range(10):
+            limiter.release(limiter.acquire(), 'svc', 1.0)
+        self.assertTrue(limiter.limit < 8)
+
+    def test_latency_tracked_per_service(self):
+        limiter = AdaptiveLimiter(8, max_limit=8)
+        limiter.release(limiter.acquire(), 'fast', 0.01)
+        limiter.release(limiter.acquire(), 'slow', 1.0)
+        limiter.release(limiter.acquire(), 'slow', 1.0)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_one_decrease_per_overload(self):
+        limiter = AdaptiveLimiter(8, max_limit=8)
+        started = [limiter.acquire() for _ in range(3)]
+        for start in started:
+            limiter.release(start, 'svc', overload=True)
+        self.assertEqual(limiter.limit, 4)
+
+    def test_min_limit(self):
+        limiter = AdaptiveLimiter(1, max_limit=8)
+        limiter.release(limiter.acquire(), 'svc', overload=True)
+        self.assertEqual(limiter.limit, 1)
+
+    def test_unlimited_until_overload(self):
+        limiter = AdaptiveLimiter(None)
+        started = [limiter.acquire() for _ in range(6)]
+        self.assertEqual(limiter.in_flight, 6)
+
+        for start in started[:-1]:
+            limiter.release(start, 'svc', 0.1)
+        limiter.release(started[-1], 'svc', overload=True)
+        self.assertEqual(limiter.limit, 3)
+
+        saturate(limiter)
+        self.assertTrue(limiter.limit > 3)
+
+
+
+class TestGetLimiter(unittest.TestCase):
+
+    def setUp(self):
+        self._limiters = limiter_module._limiters
+        limiter_module._limiters = {}
+
+    def tearDown(self):
+        limiter_module._limiters = self._limiters
+
+    def config(self, **kwargs):
+        kwargs.setdefault('cluster', '1')
+        return Bunch(lb_host='localhost', lb_port='11223', **kwargs)
+
+    def test_numeric_concurrency_not_capped(self):
+        limiter = get_limiter(self.config(concurrency='64'))
+        self.assertIsNone(limiter.limit)
+        self.assertIsNone(limiter.max_limit)
+
+    def test_auto(self):
+        limiter = get_limiter(self.config(concurrency='auto',
+                                          max_concurrency='8'))
+        self.assertEqual(limiter.limit, 4)
+        self.assertEqual(limiter.max_limit, 8)
+
+    def test_shared_per_cluster(self):
+        self.assertIs(get_limiter(self.config()), get_limiter(self.config()))
+        self.assertIsNot(get_limiter(self.config()),
+                         get_limiter(self.config(cluster='2')))
+
+
+if __name__ == '__main__':
+    unittest.main()
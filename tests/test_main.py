@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_main.py
+#
+"""Unit tests for zatodeploy.main."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import argparse
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+from os.path import join, realpath
+
+from bunch import Bunch
+
+from zatodeploy import main, probe
+from zatodeploy.main import (EXTRA_PATHS_FILE, check_health,
+    get_manifest_path, read_manifest, rolling_deploy, sync_extra_paths)
+from zatodeploy.probe import ProbeResult
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+DEPLOY_CONF = """\
+[zato]
+cluster = 1
+lb_host = 127.0.0.1
+lb_port = 11223
+
+[canary]
+channels = ch
+
+[other]
+channels = ch
+"""
+
+CHANNELS_CONF = """\
+[ch]
+name = ch
+url_path = /ch
+method = GET
+"""
+
+
+class TestSyncExtraPaths(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = realpath(tempfile.mkdtemp())
+        self.project = join(self.tmpdir, 'project')
+        self.directory = join(self.tmpdir, 'zato_extra_paths')
+        self.manifest = get_manifest_path(self.directory)
+
+        for name in ('lib1', 'lib2'):
+            os.makedirs(join(self.project, name))
+
+        os.chdir(self.project)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def write_paths(self, *paths):
+        with open(EXTRA_PATHS_FILE, 'w') as fp:
+            fp.write(''.join(path + '\n' for path in paths))
+
+    def links(self):
+        return dict((name, os.readlink(join(self.directory, name)))
+                    for name in os.listdir(self.directory))
+
+    def test_create_and_record(self):
+        self.write_paths('lib1', 'lib2')
+        sync_extra_paths(directory=self.directory)
+
+        expected = {'lib1': join(self.project, 'lib1'),
+                    'lib2': join(self.project, 'lib2')}
+        self.assertEqual(self.links(), expected)
+        self.assertEqual(read_manifest(self.manifest),
+                         {self.project: expected})
+
+    def test_dry_run(self):
+        self.write_paths('lib1')
+        sync_extra_paths(dry_run=True, directory=self.directory)
+        self.assertFalse(os.path.exists(self.directory))
+        self.assertFalse(os.path.exists(self.manifest))
+
+    def test_remove_only_recorded_links(self):
+        self.write_paths('lib1', 'lib2')
+        sync_extra_paths(directory=self.directory)
+        # a link into the project tree not created by zato-deploy
+        os.symlink(join(self.project, 'lib1'), join(self.directory, 'other'))
+
+        self.write_paths('lib1')
+        sync_extra_paths(directory=self.directory)
+
+        self.assertEqual(sorted(self.links()), ['lib1', 'other'])
+        self.assertEqual(list(read_manifest(self.manifest)[self.project]),
+                         ['lib1'])
+
+    def test_keep_changed_links(self):
+        self.write_paths('lib1')
+        sync_extra_paths(directory=self.directory)
+        os.remove(join(self.directory, 'lib1'))
+        os.symlink(self.tmpdir, join(self.directory, 'lib1'))
+
+        self.write_paths('lib2')
+        sync_extra_paths(directory=self.directory)
+
+        self.assertEqual(self.links()['lib1'], self.tmpdir)
+
+    def test_other_projects_kept(self):
+        self.write_paths('lib1')
+        sync_extra_paths(directory=self.directory)
+
+        other = join(self.tmpdir, 'other')
+        os.makedirs(join(other, 'lib3'))
+        os.chdir(other)
+        self.write_paths('lib3')
+        sync_extra_paths(directory=self.directory)
+
+        self.assertEqual(sorted(self.links()), ['lib1', 'lib3'])
+        self.assertEqual(sorted(read_manifest(self.manifest)),
+                         sorted([self.project, other]))
+
+
+
+class TestCheckHealth(unittest.TestCase):
+
+    def result(self, *latencies):
+        result = ProbeResult('ch', 'http://localhost/ch')
+        for latency in latencies:
+            result.add(latency)
+        return result
+
+    def test_healthy(self):
+        self.assertEqual(check_health([self.result(0.1, 0.2)], 0.0, 1.0), [])
+
+    def test_error_rate(self):
+        problems = check_health([self.result(0.1, None)], 0.1, 1.0)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('error rate 50.0%', problems[0])
+
+    def test_latency(self):
+        problems = check_health([self.result(0.1, 2.0)], 0.0, 1.0)
+        self.assertEqual(len(problems), 1)
+        self.assertIn('latency', problems[0])
+
+
+class FakeSession(object):
+    """Session answering all requests with the given HTTP status."""
+
+    def __init__(self, status):
+        self.status = status
+
+    def request(self, method, url, **kwargs):
+        return Bunch(status_code=self.status)
+
+    def close(self):
+        pass
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class TestRollingDeploy(unittest.TestCase):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+        for filename, text in (('deploy.conf', DEPLOY_CONF),
+                               ('channels.conf', CHANNELS_CONF)):
+            with io.open(filename, 'w', encoding='utf-8') as fp:
+                fp.write(text)
+
+        self.deployed = []
+        self.status = 200
+        self._run_stages = main.run_stages
+        self._make_session = probe.make_session
+        main.run_stages = lambda stages, opts: self.deployed.append(
+            opts.targets)
+        probe.make_session = lambda config: FakeSession(self.status)
+
+    def tearDown(self):
+        main.run_stages = self._run_stages
+        probe.make_session = self._make_session
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def opts(self):
+        return argparse.Namespace(
+            config='deploy.conf', channels='channels.conf', targets=[],
+            batch_size=1, probe_count=3, max_error_rate=0.0, max_latency=10.0)
+
+    def test_healthy(self):
+        self.assertIsNone(rolling_deploy(self.opts()))
+        self.assertEqual(self.deployed, [['canary'], ['other']])
+
+    def test_server_error_stops_rollout(self):
+        self.status = 500
+        msg = rolling_deploy(self.opts())
+        self.assertEqual(self.deployed, [['canary']])
+        self.assertIn('Targets not deployed: other', msg)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_probe.py
+#
+"""Unit tests for zatodeploy.probe."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy.probe import (ProbeResult, channel_ok_status, is_ok_status,
+    request_channel)
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+
+class FakeSession(object):
+    """Session answering all requests with the given HTTP status."""
+
+    def __init__(self, status):
+        self.status = status
+        self.requests = []
+
+    def request(self, method, url, **kwargs):
+        self.requests.append((method, url))
+        return Bunch(status_code=self.status)
+
+    def close(self):
+        pass
+
+
+class TestStatus(unittest.TestCase):
+
+    def test_is_ok_status(self):
+        for status in (200, 204, 301, 304):
+            self.assertTrue(is_ok_status(status))
+        for status in (400, 404, 500, 501, 502, 503, 504):
+            self.assertFalse(is_ok_status(status))
+        self.assertTrue(is_ok_status(400, frozenset([400])))
+        self.assertFalse(is_ok_status(500, frozenset([400])))
+
+    def test_channel_ok_status(self):
+        self.assertEqual(channel_ok_status(Bunch()), frozenset())
+        self.assertEqual(channel_ok_status(Bunch(probe_ok_status='400, 404')),
+                         frozenset([400, 404]))
+        self.assertEqual(channel_ok_status(Bunch(probe_ok_status='405')),
+                         frozenset([405]))
+        self.assertRaises(ValueError, channel_ok_status,
+                          Bunch(name='ch', probe_ok_status='4xx'))
+
+
+@unittest.skipIf(requests is None, "requests is not installed")
+class TestRequestChannel(unittest.TestCase):
+
+    def test_success(self):
+        latency = request_channel(FakeSession(200), 'http://localhost/x')
+        self.assertIsNotNone(latency)
+
+    def test_errors(self):
+        for status in (400, 500, 503):
+            self.assertIsNone(
+                request_channel(FakeSession(status), 'http://localhost/x'))
+
+    def test_ok_status(self):
+        self.assertIsNotNone(request_channel(FakeSession(400),
+                                             'http://localhost/x',
+                                             ok_status=frozenset([400])))
+
+
+class TestProbeResult(unittest.TestCase):
+
+    def test_result(self):
+        result = ProbeResult('ch', 'http://localhost/x')
+        for latency in (0.1, None, 0.3, 0.2):
+            result.add(latency)
+
+        self.assertEqual(result.requests, 4)
+        self.assertEqual(result.errors, 1)
+        self.assertEqual(result.error_rate, 0.25)
+        self.assertEqual(result.percentile(50), 0.2)
+        self.assertEqual(result.percentile(95), 0.3)
+
+
+if __name__ == '__main__':
+    unittest.main()
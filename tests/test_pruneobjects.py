@@ -0,0 +1,105 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_pruneobjects.py
+#
+"""Unit tests for zatodeploy.pruneobjects."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy import pruneobjects
+from zatodeploy.pruneobjects import (find_orphans, get_desired_names,
+    get_snapshot)
+from zatodeploy.records import HTTPSOAPRecord, SecDefRecord
+
+
+def names(objs):
+    return [obj.name for obj in objs]
+
+
+class TestFindOrphans(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshot = dict(
+            channel=[HTTPSOAPRecord(id=1, name='app.ch1', security_id=10),
+                     HTTPSOAPRecord(id=2, name='app.ch2', security_id=11),
+                     HTTPSOAPRecord(id=3, name='other.ch', security_id=12)],
+            outgoing=[HTTPSOAPRecord(id=4, name='app.og', security_id=12)],
+            secdef=[SecDefRecord(id=10, name='app.sec1'),
+                    SecDefRecord(id=11, name='app.sec2'),
+                    SecDefRecord(id=12, name='app.sec3')])
+
+    def test_orphans(self):
+        desired = dict(channel=set(['app.ch1']), outgoing=set(),
+                       secdef=set())
+        orphans = find_orphans(self.snapshot, desired, ['app.*'])
+
+        self.assertEqual(names(orphans['channel']), ['app.ch2'])
+        self.assertEqual(names(orphans['outgoing']), ['app.og'])
+        # app.sec1 is used by a remaining channel, app.sec3 by a channel
+        # not owned by the target
+        self.assertEqual(names(orphans['secdef']), ['app.sec2'])
+
+    def test_nothing_owned(self):
+        desired = dict(channel=set(), outgoing=set(), secdef=set())
+        orphans = find_orphans(self.snapshot, desired, ['myapp.*'])
+        self.assertFalse(any(orphans.values()))
+
+
+class TestGetDesiredNames(unittest.TestCase):
+
+    def test_names(self):
+        definitions = dict(ch1=Bunch(name='app.ch1'), ch2=Bunch())
+        self.assertEqual(get_desired_names(Bunch(channels='ch1, ch2'),
+                                           definitions, 'channels'),
+                         set(['app.ch1', 'ch2']))
+        self.assertEqual(get_desired_names(Bunch(channels='*'), definitions,
+                                           'channels'),
+                         set(['app.ch1', 'ch2']))
+        self.assertEqual(get_desired_names(Bunch(), None, 'channels'), set())
+
+    def test_missing(self):
+        self.assertRaises(KeyError, get_desired_names, Bunch(channels='ch3'),
+                          dict(ch1=Bunch()), 'channels')
+        self.assertRaises(KeyError, get_desired_names, Bunch(channels='ch1'),
+                          None, 'channels')
+
+
+class TestGetSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self._get_http_soap_inventory = pruneobjects.get_http_soap_inventory
+        self._get_basic_auth_list = pruneobjects.get_basic_auth_list
+        pruneobjects.get_http_soap_inventory = self.http_soap_inventory
+        pruneobjects.get_basic_auth_list = self.basic_auth_list
+
+    def tearDown(self):
+        pruneobjects.get_http_soap_inventory = self._get_http_soap_inventory
+        pruneobjects.get_basic_auth_list = self._get_basic_auth_list
+
+    def http_soap_inventory(self, config, use_cache=True):
+        self.calls.append(('http_soap', use_cache))
+        return dict(
+            channel=[HTTPSOAPRecord(name='ch', is_internal=False),
+                     HTTPSOAPRecord(name='admin.ch', is_internal=True)],
+            outgoing=[])
+
+    def basic_auth_list(self, config, use_cache=True):
+        self.calls.append(('secdefs', use_cache))
+        return [SecDefRecord(name='sec')]
+
+    def test_fresh_listings(self):
+        snapshot = get_snapshot(Bunch())
+        self.assertEqual(sorted(self.calls),
+                         [('http_soap', False), ('secdefs', False)])
+        self.assertEqual(names(snapshot['channel']), ['ch'])
+        self.assertEqual(names(snapshot['secdef']), ['sec'])
+
+
+if __name__ == '__main__':
+    unittest.main()
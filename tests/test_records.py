@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_records.py
+#
+"""Unit tests for zatodeploy.records."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import unittest
+
+from zatodeploy.records import HTTPSOAPRecord, SecDefRecord, ServiceRecord
+
+
+class TestRecord(unittest.TestCase):
+
+    def setUp(self):
+        self.data = dict(id=1, name='svc', impl_name='app.Service',
+                         is_active=True, may_be_deleted=False)
+        self.record = ServiceRecord(self.data)
+
+    def test_access(self):
+        record = self.record
+        self.assertEqual(record.name, 'svc')
+        self.assertEqual(record['impl_name'], 'app.Service')
+        self.assertEqual(record.may_be_deleted, False)
+        self.assertEqual(record['may_be_deleted'], False)
+        self.assertEqual(record.get('id'), 1)
+        self.assertEqual(record.get('slow_threshold', 99), 99)
+        self.assertTrue('name' in record)
+        self.assertTrue('may_be_deleted' in record)
+        self.assertFalse('slow_threshold' in record)
+
+    def test_missing_fields(self):
+        self.assertRaises(AttributeError, getattr, self.record,
+                          'slow_threshold')
+        self.assertRaises(AttributeError, getattr, self.record, 'unknown')
+        self.assertRaises(KeyError, lambda: self.record['slow_threshold'])
+        self.assertRaises(KeyError, lambda: self.record['unknown'])
+
+    def test_dict(self):
+        self.assertEqual(dict(self.record), self.data)
+        self.assertEqual(self.record.as_dict(), self.data)
+        self.assertEqual(len(self.record), 5)
+        self.assertEqual(sorted(self.record), sorted(self.data))
+        self.assertEqual(self.record, self.data)
+        self.assertEqual(self.record, ServiceRecord(**self.data))
+        self.assertNotEqual(self.record, ServiceRecord(id=2))
+
+    def test_no_extra(self):
+        record = SecDefRecord(id=1, name='sec')
+        self.assertIsNone(record._extra)
+        self.assertEqual(record.as_dict(), dict(id=1, name='sec'))
+        self.assertRaises(AttributeError, getattr, record, 'password')
+
+    def test_compact(self):
+        # records keep their fields in slots, not in a dictionary
+        record = HTTPSOAPRecord(id=1, name='ch')
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertRaises(TypeError, hash, record)
+
+
+if __name__ == '__main__':
+    unittest.main()
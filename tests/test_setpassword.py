@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_setpassword.py
+#
+"""Unit tests for zatodeploy.setpassword."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from json import dumps, loads
+
+from zatodeploy import setpassword
+from zatodeploy.setpassword import (parse_invoke_output, read_passwords,
+    set_passwords)
+
+
+class TestParseInvokeOutput(unittest.TestCase):
+
+    def test_json(self):
+        self.assertEqual(parse_invoke_output(b'[{"id": 1, "name": "x"}]'),
+                         [{'id': 1, 'name': 'x'}])
+
+    def test_python_literal(self):
+        self.assertEqual(
+            parse_invoke_output("[{u'id': 1, u'is_active': True}]\n"),
+            [{'id': 1, 'is_active': True}])
+
+    def test_no_code_evaluated(self):
+        self.assertRaises(ValueError, parse_invoke_output,
+                          "__import__('os').getcwd()")
+
+
+class TestReadPasswords(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'passwords.txt')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def write(self, text):
+        with io.open(self.filename, 'w', encoding='utf-8') as fp:
+            fp.write(text)
+
+    def test_pairs(self):
+        self.write("# comment\n\n alice :secret\nbob:pass:word\n")
+        self.assertEqual(read_passwords(self.filename),
+                         [('alice', 'secret'), ('bob', 'pass:word')])
+
+    def test_invalid_line(self):
+        self.write("alice:secret\nbob\n")
+        self.assertRaises(ValueError, read_passwords, self.filename)
+
+    def test_duplicates(self):
+        self.write("alice:secret\nalice:other\n")
+        self.assertEqual(len(read_passwords(self.filename)), 2)
+        self.assertRaises(ValueError, read_passwords, self.filename,
+                          unique=True)
+
+
+class TestSetPasswords(unittest.TestCase):
+
+    def setUp(self):
+        self.calls = []
+        self._zato_invoke = setpassword.zato_invoke
+        setpassword.zato_invoke = self.zato_invoke
+
+    def tearDown(self):
+        setpassword.zato_invoke = self._zato_invoke
+
+    def zato_invoke(self, server_path, service, payload):
+        self.calls.append((service, loads(dumps(payload))))
+        if service == 'zato.security.get-list':
+            return dumps([dict(id=1, username='alice'),
+                          dict(id=2, username='bob')]).encode('utf-8')
+        return b''
+
+    def test_list_fetched_once(self):
+        errors = set_passwords('/srv/zato', 1, [('alice', 'a'), ('bob', 'b'),
+                                                ('carol', 'c')])
+        self.assertEqual(len(errors), 1)
+        self.assertIn('carol', errors[0])
+        services = [service for service, payload in self.calls]
+        self.assertEqual(services.count('zato.security.get-list'), 1)
+        self.assertEqual(
+            [payload['id'] for service, payload in self.calls
+             if service == 'zato.security.basic-auth.change-password'],
+            [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
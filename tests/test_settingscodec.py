@@ -0,0 +1,78 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_settingscodec.py
+#
+"""Unit tests for zatodeploy.settingscodec."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import struct
+import unittest
+
+from zatodeploy import settingscodec
+from zatodeploy.settingscodec import (MAGIC, check_codec, decode_settings,
+    encode_settings)
+
+
+SETTINGS = {
+    'name': 'Zato äöü',
+    'hosts': ['a.example.com', 'b.example.com'] * 100,
+    'timeout': 10,
+    'nested': {'enabled': True, 'ratio': 0.5, 'none': None},
+}
+
+
+class TestSettingsCodec(unittest.TestCase):
+
+    def test_plain_json_has_no_header(self):
+        payload = encode_settings(SETTINGS)
+        self.assertFalse(payload.startswith(MAGIC))
+        self.assertEqual(json.loads(payload.decode('utf-8')), SETTINGS)
+        self.assertEqual(decode_settings(payload), SETTINGS)
+
+    def test_decode_legacy_json_text(self):
+        self.assertEqual(decode_settings(json.dumps(SETTINGS)), SETTINGS)
+
+    def test_zlib_round_trip(self):
+        payload = encode_settings(SETTINGS, compression='zlib', threshold=0)
+        self.assertTrue(payload.startswith(MAGIC))
+        self.assertEqual(decode_settings(payload), SETTINGS)
+
+    def test_small_document_not_compressed(self):
+        payload = encode_settings({'a': 1}, compression='zlib')
+        self.assertEqual(payload, b'{"a":1}')
+        self.assertEqual(decode_settings(payload), {'a': 1})
+
+    @unittest.skipIf(settingscodec.msgpack is None, "msgpack not installed")
+    def test_msgpack_round_trip(self):
+        for compression in ('none', 'zlib'):
+            payload = encode_settings(SETTINGS, 'msgpack', compression, 0)
+            self.assertTrue(payload.startswith(MAGIC))
+            self.assertEqual(decode_settings(payload), SETTINGS)
+
+    @unittest.skipIf(settingscodec.zstandard is None,
+                     "zstandard not installed")
+    def test_zstd_round_trip(self):
+        payload = encode_settings(SETTINGS, compression='zstd', threshold=0)
+        self.assertTrue(payload.startswith(MAGIC))
+        self.assertEqual(decode_settings(payload), SETTINGS)
+
+    def test_unsupported_format_version(self):
+        payload = encode_settings(SETTINGS, compression='zlib', threshold=0)
+        payload = payload[:3] + struct.pack(str('B'), 99) + payload[4:]
+        self.assertRaises(ValueError, decode_settings, payload)
+
+    def test_unsupported_flags(self):
+        payload = MAGIC + struct.pack(str('BB'), 1, 0xff) + b'{}'
+        self.assertRaises(ValueError, decode_settings, payload)
+
+    def test_check_codec(self):
+        check_codec('json', 'zlib')
+        self.assertRaises(ValueError, check_codec, 'yaml', 'none')
+        self.assertRaises(ValueError, check_codec, 'json', 'lzma')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_settingsreader.py
+#
+"""Unit tests for zatodeploy.settingsreader."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import json
+import unittest
+
+from zatodeploy.settingskeys import current_key, version_key
+from zatodeploy.settingsreader import SettingsReader
+
+
+URN = 'urn:test:settings'
+
+
+class FakeRedis(object):
+    """Minimal Redis client counting the keys read."""
+
+    def __init__(self):
+        self.data = {}
+        self.reads = []
+
+    def get(self, key):
+        self.reads.append(key)
+        return self.data.get(key)
+
+    def store(self, urn, version, settings):
+        payload = json.dumps(settings).encode('utf-8')
+        self.data[version_key(urn, version)] = payload
+        self.data[urn] = payload
+        self.data[current_key(urn)] = str(version).encode('ascii')
+
+
+class TestSettingsReader(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.redis.store(URN, 1, dict(n=1))
+
+    def test_cached(self):
+        reader = SettingsReader(self.redis, ttl=60)
+        self.assertEqual(reader.get(URN), dict(n=1))
+        self.assertEqual(self.redis.reads,
+                         [current_key(URN), version_key(URN, 1)])
+
+        del self.redis.reads[:]
+        self.assertIs(reader.get(URN), reader.get(URN))
+        self.assertEqual(self.redis.reads, [])
+
+    def test_version_checked_after_ttl(self):
+        reader = SettingsReader(self.redis, ttl=0)
+        settings = reader.get(URN)
+
+        del self.redis.reads[:]
+        self.assertIs(reader.get(URN), settings)
+        self.assertEqual(self.redis.reads, [current_key(URN)])
+
+        self.redis.store(URN, 2, dict(n=2))
+        self.assertEqual(reader.get(URN), dict(n=2))
+
+    def test_invalidate(self):
+        reader = SettingsReader(self.redis, ttl=60)
+        reader.get(URN)
+        self.redis.store(URN, 2, dict(n=2))
+        self.assertEqual(reader.get(URN), dict(n=1))
+
+        reader.invalidate(URN)
+        self.assertEqual(reader.get(URN), dict(n=2))
+
+    def test_unversioned_and_missing(self):
+        self.redis.data['urn:plain'] = b'{"plain": true}'
+        reader = SettingsReader(self.redis)
+        self.assertEqual(reader.get('urn:plain'), dict(plain=True))
+        self.assertEqual(reader.get('urn:missing', {}), {})
+
+    def test_eviction(self):
+        for i in range(3):
+            self.redis.store('urn:%i' % i, 1, dict(i=i))
+
+        reader = SettingsReader(self.redis, max_entries=2)
+        for urn in ('urn:0', 'urn:1', 'urn:0', 'urn:2'):
+            reader.get(urn)
+
+        # urn:1 was the least recently used one
+        del self.redis.reads[:]
+        reader.get('urn:0')
+        reader.get('urn:2')
+        self.assertEqual(self.redis.reads, [])
+        reader.get('urn:1')
+        self.assertTrue(self.redis.reads)
+
+
+if __name__ == '__main__':
+    unittest.main()
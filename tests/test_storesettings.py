@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tests/test_storesettings.py
+#
+"""Unit tests for zatodeploy.storesettings."""
+
+from __future__ import absolute_import, print_function, unicode_literals
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from bunch import Bunch
+
+from zatodeploy import storesettings
+from zatodeploy.settingscodec import decode_settings
+from zatodeploy.settingskeys import current_key, version_key, versions_key
+from zatodeploy.storesettings import (SettingsError, collect_writes,
+    read_versions, rollback_settings, select_rollback_version,
+    write_settings_to_db)
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+
+URN = 'urn:test:settings'
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestVersionedSettings(unittest.TestCase):
+
+    def setUp(self):
+        self.redis = fakeredis.FakeStrictRedis()
+        self._get_redis = storesettings._get_redis
+        storesettings._get_redis = lambda *args, **kwargs: self.redis
+
+    def tearDown(self):
+        storesettings._get_redis = self._get_redis
+
+    def write(self, n, **kwargs):
+        return write_settings_to_db(dict(n=n), URN, 'localhost', 6379,
+                                    **kwargs)
+
+    def current(self):
+        return decode_settings(self.redis.get(URN))
+
+    def test_versions(self):
+        pubsub = self.redis.pubsub()
+        pubsub.subscribe(URN + ':changes')
+        pubsub.get_message()
+
+        self.assertEqual([self.write(n) for n in range(3)], [1, 2, 3])
+        self.assertEqual(self.current(), dict(n=2))
+        self.assertEqual(int(self.redis.get(current_key(URN))), 3)
+        self.assertEqual(decode_settings(self.redis.get(version_key(URN, 1))),
+                         dict(n=0))
+        self.assertEqual(int(pubsub.get_message()['data']), 1)
+
+        counter, current, kept = read_versions(URN, 'localhost', 6379)
+        self.assertEqual((counter, current, sorted(kept)), (3, 3, [1, 2, 3]))
+
+    def test_keep(self):
+        for n in range(4):
+            self.write(n, keep=2)
+
+        self.assertEqual(self.redis.lrange(versions_key(URN), 0, -1),
+                         [b'4', b'3'])
+        self.assertIsNone(self.redis.get(version_key(URN, 2)))
+
+    def test_given_version(self):
+        self.assertEqual(self.write(0, version=7), 7)
+        self.assertEqual(self.write(1), 8)
+
+    def test_rollback(self):
+        for n in range(3):
+            self.write(n)
+
+        self.assertEqual(rollback_settings(URN, 'localhost', 6379), 2)
+        self.assertEqual(self.current(), dict(n=1))
+        self.assertEqual(rollback_settings(URN, 'localhost', 6379,
+                                           version=1), 1)
+        self.assertEqual(self.current(), dict(n=0))
+        self.assertRaises(SettingsError, rollback_settings, URN, 'localhost',
+                          6379)
+        self.assertRaises(SettingsError, rollback_settings, URN, 'localhost',
+                          6379, version=9)
+
+        # writing after a rollback still takes the next version number
+        self.assertEqual(self.write(3), 4)
+
+
+
+class TestSelectRollbackVersion(unittest.TestCase):
+
+    def test_newest_older_version_kept_everywhere(self):
+        states = [(5, 5, {5: 'e', 4: 'd', 3: 'c'}),
+                  (5, 5, {5: 'e', 3: 'c', 2: 'b'})]
+        self.assertEqual(select_rollback_version(URN, states), 3)
+
+    def test_given_version(self):
+        states = [(5, 5, {5: 'e', 2: 'b'}), (5, 5, {5: 'e', 2: 'b'})]
+        self.assertEqual(select_rollback_version(URN, states, 2), 2)
+
+    def test_current_versions_differ(self):
+        states = [(5, 5, {5: 'e', 4: 'd'}), (5, 4, {5: 'e', 4: 'd'})]
+        self.assertRaises(SettingsError, select_rollback_version, URN,
+                          states)
+
+    def test_no_older_version(self):
+        self.assertRaises(SettingsError, select_rollback_version, URN,
+                          [(1, 1, {1: 'a'})])
+        self.assertRaises(SettingsError, select_rollback_version, URN,
+                          [(0, None, {})])
+
+    def test_version_not_kept(self):
+        states = [(5, 5, {5: 'e', 2: 'b'}), (5, 5, {5: 'e'})]
+        self.assertRaises(SettingsError, select_rollback_version, URN,
+                          states, 2)
+
+    def test_settings_differ(self):
+        states = [(5, 5, {5: 'e', 4: 'd'}), (5, 5, {5: 'e', 4: 'x'})]
+        self.assertRaises(SettingsError, select_rollback_version, URN,
+                          states)
+
+
+class SettingsFilesMixin(object):
+
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.tmpdir)
+
+    def settings_file(self, filename, urn, settings):
+        with open(filename, 'w') as fp:
+            json.dump(dict(version='1.0', urn=urn, settings=settings), fp)
+        return filename
+
+
+class TestCollectWrites(SettingsFilesMixin, unittest.TestCase):
+
+    def test_urns_sharing_endpoint(self):
+        config = dict(
+            a=Bunch(settings=self.settings_file('a.json', 'urn:a', {})),
+            b=Bunch(settings=self.settings_file('b.json', 'urn:b', {}),
+                    kvdb_endpoints='localhost:6379, other:6380'),
+            c=Bunch())
+        writes, target_writes = collect_writes(config, ['a', 'b', 'c'])
+
+        self.assertEqual(list(writes), [
+            ('localhost:6379/0', 'urn:a'), ('localhost:6379/0', 'urn:b'),
+            ('other:6380/0', 'urn:b')])
+        self.assertEqual(list(target_writes), ['a', 'b'])
+        self.assertEqual(target_writes['b'][0], 2)
+
+    def test_shared_write(self):
+        filename = self.settings_file('a.json', 'urn:a', dict(x=1))
+        config = dict(a=Bunch(settings=filename), b=Bunch(settings=filename))
+        writes, target_writes = collect_writes(config, ['a', 'b'])
+        self.assertEqual(len(writes), 1)
+        self.assertEqual(len(target_writes), 2)
+
+    def test_different_settings_for_urn(self):
+        config = dict(
+            a=Bunch(settings=self.settings_file('a.json', 'urn:a', dict(x=1)),
+                    kvdb_db='1'),
+            b=Bunch(settings=self.settings_file('b.json', 'urn:a',
+                                                dict(x=2))))
+        self.assertRaises(SettingsError, collect_writes, config, ['a', 'b'])
+
+    def test_errors(self):
+        self.assertRaises(SettingsError, collect_writes, {}, ['a'])
+        self.assertRaises(SettingsError, collect_writes,
+                          dict(a=Bunch(settings='missing.json')), ['a'])
+        config = dict(a=Bunch(settings=self.settings_file('a.json', 'urn:a',
+                                                          {}),
+                              settings_encoding='xml'))
+        self.assertRaises(SettingsError, collect_writes, config, ['a'])
+
+
+@unittest.skipIf(fakeredis is None, "fakeredis is not installed")
+class TestMain(SettingsFilesMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestMain, self).setUp()
+        self.servers = {}
+        self._get_redis = storesettings._get_redis
+        storesettings._get_redis = self.get_redis
+
+        with io.open('deploy.conf', 'w', encoding='utf-8') as fp:
+            fp.write("[zato]\nkvdb_endpoints = r1:6379, r2:6379, r3:6379\n"
+                     "\n[a]\nsettings = a.json\n"
+                     "\n[b]\nsettings = b.json\nkvdb_write_quorum = 2\n")
+
+        self.settings_file('a.json', 'urn:a', dict(a=1))
+        self.settings_file('b.json', 'urn:b', dict(b=1))
+
+    def tearDown(self):
+        storesettings._get_redis = self._get_redis
+        super(TestMain, self).tearDown()
+
+    def get_redis(self, host, port, db=0, password=None, timeout=None):
+        if host == 'down':
+            raise IOError('Connection refused')
+        server = self.servers.setdefault(host, fakeredis.FakeServer())
+        return fakeredis.FakeStrictRedis(server=server, db=db)
+
+    def current(self, host, urn):
+        return self.get_redis(host, 6379).get(current_key(urn))
+
+    def test_store_and_rollback(self):
+        self.assertIsNone(storesettings.main([]))
+        self.assertIsNone(storesettings.main([]))
+
+        # both URNs are written to every endpoint
+        for host in ('r1', 'r2', 'r3'):
+            self.assertEqual(self.current(host, 'urn:a'), b'2')
+            self.assertEqual(self.current(host, 'urn:b'), b'2')
+
+        self.assertIsNone(storesettings.main(['--rollback', 'a']))
+        self.assertEqual(self.current('r2', 'urn:a'), b'1')
+        self.assertEqual(self.current('r2', 'urn:b'), b'2')
+
+    def test_quorum(self):
+        with io.open('deploy.conf', 'a', encoding='utf-8') as fp:
+            fp.write("\n[c]\nsettings = a.json\n"
+                     "kvdb_endpoints = r1:6379, down:6379\n")
+
+        msg = storesettings.main(['b', 'c'])
+        self.assertIn("Target 'c'", msg)
+        self.assertNotIn("Target 'b'", msg)
+        self.assertEqual(self.current('r1', 'urn:a'), b'1')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# tools/importtime.py
+#
+"""Measure import time of the zatodeploy console script modules.
+
+Imports each module of the ``console_scripts`` entry points in ``setup.py``
+in a fresh interpreter and reports the time the import takes. Fails if
+importing a module loads one of the heavy dependencies, which must only be
+imported when the code needing them actually runs, or if the import takes
+longer than ``--max-ms`` milliseconds.
+
+Works with Python 2.7 and 3. Use ``--python`` to measure with another
+interpreter than the one running this script, e.g. the Python 2.7 the
+package is deployed with.
+
+Run from the repository root, e.g. via ``make importtime``.
+
+"""
+
+from __future__ import absolute_import, print_function
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+
+# modules of the console scripts must not import any of these
+HEAVY_MODULES = ('redis', 'requests', 'sqlalchemy', 'zato.client', 'zato.cli')
+ENTRY_POINT_RX = re.compile(r"""['"][\w-]+\s*=\s*([\w.]+):\w+['"]""")
+# run in the measuring interpreter; prints import time and loaded modules
+MEASURE_CODE = """\
+import json, sys, time
+start = time.time()
+import {module}
+elapsed = time.time() - start
+print(json.dumps([elapsed * 1000.0, sorted(sys.modules)]))
+"""
+
+
+def script_modules(setup_file='setup.py'):
+    """Return sorted list of modules of the console scripts in setup_file."""
+    with open(setup_file) as fp:
+        setup = fp.read()
+
+    section = setup[setup.index('console_scripts'):]
+    section = section[:section.index(']')]
+    return sorted(set(ENTRY_POINT_RX.findall(section)))
+
+
+def measure(module, python=sys.executable):
+    """Import module in subprocess and return import time [ms] and modules.
+
+    Raises RuntimeError if the import fails.
+
+    """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+        p for p in ('src', env.get('PYTHONPATH')) if p)
+    proc = subprocess.Popen(
+        [python, '-c', MEASURE_CODE.format(module=module)],
+        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True)
+    out, err = proc.communicate()
+
+    if proc.returncode:
+        raise RuntimeError((err.strip().splitlines() or ['unknown error'])[-1])
+
+    elapsed, modules = json.loads(out.strip().splitlines()[-1])
+    return elapsed, modules
+
+
+def main(args=None):
+    """Measure all script modules and return error message on failures."""
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument('--max-ms', type=float,
+        help="Maximum import time per module in milliseconds")
+    ap.add_argument('--python', default=sys.executable,
+        help="Python interpreter to measure with (default: %(default)s)")
+    ap.add_argument('modules', nargs='*',
+        help="Modules to measure (default: all console script modules)")
+
+    args = ap.parse_args(args if args is not None else sys.argv[1:])
+
+    modules = args.modules or script_modules()
+    problems = []
+    print("{:<32} {:>10}".format("Module", "Time [ms]"))
+
+    for module in modules:
+        try:
+            total, loaded = measure(module, args.python)
+        except RuntimeError as exc:
+            problems.append("Importing {} failed: {}".format(module, exc))
+            continue
+
+        print("{:<32} {:>10.1f}".format(module, total))
+
+        for name in HEAVY_MODULES:
+            if name in loaded:
+                problems.append("{} imports {} at import time".format(
+                    module, name))
+
+        if args.max_ms and total > args.max_ms:
+            problems.append("{} takes {:.1f} ms to import (max. {} ms)".format(
+                module, total, args.max_ms))
+
+    for problem in problems:
+        print(problem, file=sys.stderr)
+
+    if problems:
+        return "{} problem(s) found.".format(len(problems))
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]) or 0)